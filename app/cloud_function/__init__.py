@@ -1,5 +1,5 @@
 # app/cloud_function/__init__.py
 
-from .main import trigger_processing
+from .main import trigger_processing, flush_pending
 
-__all__ = ['trigger_processing']
\ No newline at end of file
+__all__ = ['trigger_processing', 'flush_pending']
\ No newline at end of file
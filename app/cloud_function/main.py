@@ -1,39 +1,160 @@
 # app/cloud_function/main.py
 
-from google.cloud import run_v2
+from google.cloud import firestore, run_v2
+from google.api_core.exceptions import AlreadyExists
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+import json
+import math
 import os
 
-def trigger_processing(event, context):
-    """TRIGGERED BY A CHANGE TO A GOOGLE DRIVE FILE"""
-    file = event
-    
-    # get file information
-    file_id = file.get('id')
-    file_name = file.get('name')
-    file_path = f"gs://{file['bucket']}/{file_name}"
-    
-    # create cloud run job client
-    client = run_v2.JobsClient()
-    
-    # configure job
-    job = run_v2.Job(
-        template=run_v2.ExecutionTemplate(
-            containers=[{
-                "image": f"gcr.io/{os.getenv('PROJECT_ID')}/document-indexer",
-                "env": [
-                    {"name": "FILE_ID", "value": file_id},
-                    {"name": "FILE_PATH", "value": file_path}
-                ]
-            }],
-            max_retries=3,  # retry failed jobs
-            timeout_seconds=600  # 10 minute timeout
-        )
+from .utils import get_drive_file, should_process_file
+
+# events for the same file inside this window are collapsed into one
+DEBOUNCE_SECONDS = int(os.getenv('DEBOUNCE_SECONDS', '30'))
+# upper bound on files per job execution (they travel in one env var)
+MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', '200'))
+# files handled by each task of the job execution
+FILES_PER_TASK = int(os.getenv('FILES_PER_TASK', '10'))
+JOB_NAME = os.getenv('JOB_NAME', 'document-indexer')
+PENDING_COLLECTION = 'pending_file_events'
+
+# clients are kept across invocations on a warm instance
+_db = None
+_jobs_client = None
+
+def _get_db() -> firestore.Client:
+    global _db
+    if _db is None:
+        _db = firestore.Client(project=os.getenv('PROJECT_ID'))
+    return _db
+
+def _get_jobs_client() -> run_v2.JobsClient:
+    global _jobs_client
+    if _jobs_client is None:
+        _jobs_client = run_v2.JobsClient()
+    return _jobs_client
+
+def _pending_key(file: Dict[str, Any]) -> str:
+    """ONE ENTRY PER USER AND DRIVE FILE, FIRESTORE DOCUMENT IDS CANNOT CONTAIN SLASHES"""
+    return f"{file['user_id']}__{file['file_id']}".replace('/', '__')
+
+def enqueue_event(file: Dict[str, str]) -> str:
+    """RECORD A FILE EVENT IN THE PENDING SET, KEYED BY USER AND FILE ID"""
+    doc_ref = _get_db().collection(PENDING_COLLECTION).document(_pending_key(file))
+    entry = {
+        'file_id': file['file_id'],
+        'user_id': file['user_id'],
+        'updated': firestore.SERVER_TIMESTAMP
+    }
+    try:
+        # first event for the file opens its debounce window
+        doc_ref.create({**entry, 'queued_at': firestore.SERVER_TIMESTAMP})
+    except AlreadyExists:
+        doc_ref.update(entry)
+    return file['file_id']
+
+@firestore.transactional
+def _claim_batch(transaction, force: bool) -> List[Dict[str, Any]]:
+    """
+    TAKE A BATCH OF PENDING FILES IF IT IS READY
+
+    a batch is ready once it is full or its oldest event has aged past the
+    debounce window; claimed entries are deleted in the same transaction so
+    concurrent invocations never dispatch the same file twice
+    """
+    query = (
+        _get_db().collection(PENDING_COLLECTION)
+        .order_by('queued_at')
+        .limit(MAX_BATCH_SIZE)
     )
-    
-    # execute job
-    operation = client.create_job(
-        parent=f"projects/{os.getenv('PROJECT_ID')}/locations/{os.getenv('REGION')}",
-        job=job
+    snapshots = list(transaction.get(query))
+    if not snapshots:
+        return []
+
+    oldest = snapshots[0].get('queued_at')
+    window_open = (
+        oldest is not None and
+        datetime.now(timezone.utc) - oldest < timedelta(seconds=DEBOUNCE_SECONDS)
+    )
+    if not force and window_open and len(snapshots) < MAX_BATCH_SIZE:
+        return []
+
+    for snapshot in snapshots:
+        transaction.delete(snapshot.reference)
+    return [snapshot.to_dict() for snapshot in snapshots]
+
+def dispatch_batch(files: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """RUN THE DEPLOYED INDEXER JOB ONCE FOR A BATCH OF FILES"""
+    # each file is indexed with its own user's credentials and namespace
+    batch = [{'file_id': file['file_id'], 'user_id': file['user_id']} for file in files]
+    task_count = math.ceil(len(batch) / FILES_PER_TASK)
+
+    env = [run_v2.EnvVar(name="FILES", value=json.dumps(batch))]
+
+    request = run_v2.RunJobRequest(
+        name=f"projects/{os.getenv('PROJECT_ID')}/locations/{os.getenv('REGION')}/jobs/{JOB_NAME}",
+        overrides=run_v2.RunJobRequest.Overrides(
+            task_count=task_count,
+            container_overrides=[
+                run_v2.RunJobRequest.Overrides.ContainerOverride(env=env)
+            ]
+        )
     )
-    
-    return operation.result()
\ No newline at end of file
+
+    # start the execution, do not wait for it to complete
+    operation = _get_jobs_client().run_job(request=request)
+    return {
+        "dispatched": len(batch),
+        "task_count": task_count,
+        "operation": operation.operation.name
+    }
+
+def requeue(files: List[Dict[str, Any]]) -> None:
+    """
+    PUT CLAIMED FILES BACK IN THE PENDING SET
+
+    entries keep their original queued_at so they go out with the next
+    batch; a file that got a new event meanwhile already has an entry
+    """
+    collection = _get_db().collection(PENDING_COLLECTION)
+    for file in files:
+        try:
+            collection.document(_pending_key(file)).create({
+                **file,
+                'queued_at': file.get('queued_at') or firestore.SERVER_TIMESTAMP,
+                'updated': firestore.SERVER_TIMESTAMP
+            })
+        except AlreadyExists:
+            pass
+
+def flush_pending(event=None, context=None, force: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    DISPATCH PENDING FILES WHOSE DEBOUNCE WINDOW HAS CLOSED
+
+    also deployed on a schedule so the tail of a burst is dispatched even
+    when no further events arrive
+    """
+    transaction = _get_db().transaction()
+    files = _claim_batch(transaction, force)
+    if not files:
+        return None
+    try:
+        return dispatch_batch(files)
+    except Exception:
+        # the claim removed them from the pending set, do not lose them
+        requeue(files)
+        raise
+
+def trigger_processing(event, context):
+    """TRIGGERED BY A CHANGE TO A GOOGLE DRIVE FILE"""
+    if not should_process_file(event):
+        return None
+
+    file = get_drive_file(event)
+    if file is None:
+        # not written by the drive mirror, there is no drive file to index
+        return None
+
+    enqueue_event(file)
+    return flush_pending()
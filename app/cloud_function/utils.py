@@ -1,7 +1,7 @@
 # app/cloud_function/utils.py
 
 from google.cloud import storage
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import json
 
 def get_file_metadata(event: Dict[str, Any]) -> Dict[str, Any]:
@@ -18,6 +18,18 @@ def get_file_metadata(event: Dict[str, Any]) -> Dict[str, Any]:
     except Exception as e:
         raise ValueError(f"invalid event data: {str(e)}")
 
+def get_drive_file(event: Dict[str, Any]) -> Optional[Dict[str, str]]:
+    """
+    GET THE DRIVE FILE AND USER AN OBJECT WAS MIRRORED FROM
+
+    the mirror sets them as custom metadata on the storage object; the
+    object key itself means nothing to drive
+    """
+    metadata = event.get("metadata") or {}
+    if not (metadata.get("drive_file_id") and metadata.get("user_id")):
+        return None
+    return {"file_id": metadata["drive_file_id"], "user_id": metadata["user_id"]}
+
 def is_supported_file_type(content_type: str) -> bool:
     """CHECK IF FILE TYPE IS SUPPORTED"""
     supported_types = [
@@ -31,7 +43,7 @@ def is_supported_file_type(content_type: str) -> bool:
 def should_process_file(event: Dict[str, Any]) -> bool:
     """DETERMINE IF FILE SHOULD BE PROCESSED"""
     metadata = get_file_metadata(event)
-    return (
+    return bool(
         metadata.get("content_type") and
         is_supported_file_type(metadata["content_type"])
     )
\ No newline at end of file
@@ -22,11 +22,115 @@ class Settings(BaseSettings):
     PINECONE_API_KEY: str
     PINECONE_ENVIRONMENT: str
     PINECONE_INDEX_NAME: str
+    # "user" keeps each user's chunks in their own namespace, "shared" puts
+    # every chunk in the default namespace
+    PINECONE_NAMESPACE_MODE: str = "user"
+    # embedding model of PINECONE_INDEX_NAME; text-embedding-3 models can
+    # be shortened to a smaller EMBEDDING_DIMENSION
+    EMBEDDING_MODEL: str = "text-embedding-3-large"
+    EMBEDDING_DIMENSION: int = 3072
+
+    # Embedding Migration (app.migrate_embeddings): re-embeds the stored
+    # chunk texts into EMBEDDING_MIGRATION_TARGET_INDEX at
+    # EMBEDDING_MIGRATION_VECTORS_PER_MINUTE, and switches reads to it once
+    # recall@EMBEDDING_MIGRATION_RECALL_K of EMBEDDING_MIGRATION_RECALL_SAMPLES
+    # sampled chunk queries against the current index reaches
+    # EMBEDDING_MIGRATION_MIN_RECALL. serving instances pick up the switch
+    # every INDEX_STATE_POLL_INTERVAL seconds (0 only at startup)
+    EMBEDDING_MIGRATION_TARGET_INDEX: str = ""
+    EMBEDDING_MIGRATION_TARGET_MODEL: str = "text-embedding-3-large"
+    EMBEDDING_MIGRATION_TARGET_DIMENSION: int = 3072
+    EMBEDDING_MIGRATION_VECTORS_PER_MINUTE: int = 20000
+    EMBEDDING_MIGRATION_BATCH_SIZE: int = 100
+    EMBEDDING_MIGRATION_RECALL_K: int = 10
+    EMBEDDING_MIGRATION_RECALL_SAMPLES: int = 50
+    EMBEDDING_MIGRATION_MIN_RECALL: float = 0.9
+    # wait after the switch before copying what writers still sent to the
+    # previous index
+    EMBEDDING_MIGRATION_SETTLE_SECONDS: float = 120.0
+    INDEX_STATE_POLL_INTERVAL: float = 60.0
 
     # Application Settings
     APP_PORT: int = 8080
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 200
+    # tiktoken encoding (e.g. "cl100k_base") to size chunks in tokens,
+    # chunk size and overlap are in characters when empty
+    CHUNK_TOKENIZER: str = ""
+    # chunks in flight between pipeline stages, and concurrent context calls
+    PIPELINE_QUEUE_SIZE: int = 64
+    PIPELINE_CONTEXT_WORKERS: int = 4
+    # worker processes for extraction, splitting and BM25 tokenization (0
+    # runs them in the serving process); texts from
+    # CPU_POOL_SHARED_MEMORY_THRESHOLD characters on go through shared memory
+    CPU_POOL_WORKERS: int = 2
+    CPU_POOL_SHARED_MEMORY_THRESHOLD: int = 1048576
+    # shared keep-alive connection pools of the Anthropic, OpenAI and Drive
+    # clients; HTTP/2 needs the h2 package. at most
+    # HTTP_MAX_CONNECTIONS_PER_HOST requests run against one host at once
+    HTTP_HTTP2: bool = True
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_MAX_CONNECTIONS_PER_HOST: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 60.0
+    HTTP_CONNECT_TIMEOUT: float = 10.0
+    HTTP_READ_TIMEOUT: float = 600.0
+    # cpu and memory profiles of process_file and hybrid search: requests
+    # with an X-Profile header (when PROFILING_HEADER_ENABLED) and a
+    # PROFILING_SAMPLE_RATE share of the rest, kept for PROFILING_MAX_REPORTS
+    # request ids and served on /admin/profiles
+    PROFILING_HEADER_ENABLED: bool = False
+    PROFILING_SAMPLE_RATE: float = 0.0
+    PROFILING_INTERVAL: float = 0.005
+    PROFILING_TOP: int = 25
+    PROFILING_MAX_REPORTS: int = 100
+
+    # Context Generation: chunks of single-chunk documents and chunks under
+    # CONTEXT_MIN_CHUNK_CHARS get no context; short or non-prose chunks and
+    # chunks of documents from CONTEXT_SMALL_MODEL_DOCUMENT_CHARS on use the
+    # small model
+    CONTEXT_MODEL: str = "claude-3-5-sonnet-latest"
+    CONTEXT_SMALL_MODEL: str = "claude-3-5-haiku-latest"
+    CONTEXT_POLICY_ENABLED: bool = True
+    CONTEXT_MIN_CHUNK_CHARS: int = 80
+    CONTEXT_SMALL_CHUNK_CHARS: int = 300
+    CONTEXT_SMALL_MODEL_DOCUMENT_CHARS: int = 200000
+
+    # Near-Duplicate Chunks: duplicates of chunks stored by this process
+    # (estimated jaccard similarity >= DEDUP_THRESHOLD) reuse their
+    # embedding, repeated documents reuse contexts and embeddings
+    DEDUP_ENABLED: bool = True
+    DEDUP_THRESHOLD: float = 0.85
+    # about 2 KB per chunk remembered
+    DEDUP_MAX_ENTRIES: int = 50000
+
+    # Provider Rate Limits (shared scheduler for LLM, embedding and upsert calls)
+    ANTHROPIC_REQUESTS_PER_MINUTE: int = 50
+    ANTHROPIC_TOKENS_PER_MINUTE: int = 80000
+    ANTHROPIC_MAX_CONCURRENCY: int = 8
+    ANTHROPIC_LATENCY_TARGET: float = 30.0
+    OPENAI_REQUESTS_PER_MINUTE: int = 3000
+    OPENAI_TOKENS_PER_MINUTE: int = 1000000
+    OPENAI_MAX_CONCURRENCY: int = 8
+    OPENAI_LATENCY_TARGET: float = 10.0
+    PINECONE_REQUESTS_PER_MINUTE: int = 6000
+    PINECONE_VECTORS_PER_MINUTE: int = 600000
+    PINECONE_MAX_CONCURRENCY: int = 8
+    PINECONE_LATENCY_TARGET: float = 5.0
+    RATE_LIMIT_MAX_RETRIES: int = 6
+    # interactive (/process) and bulk (sync, batch jobs) calls share each
+    # provider's slots by weight; bulk never takes the reserved share
+    PRIORITY_INTERACTIVE_WEIGHT: float = 4.0
+    PRIORITY_BULK_WEIGHT: float = 1.0
+    PRIORITY_INTERACTIVE_RESERVED_SHARE: float = 0.25
+
+    # Metrics (Prometheus on /metrics, optional push to Cloud Monitoring)
+    METRICS_EXPORT_CLOUD_MONITORING: bool = False
+    METRICS_EXPORT_INTERVAL: int = 60
+
+    # Pipeline Checkpoints ("firestore", "local" or "none")
+    CHECKPOINT_BACKEND: str = "firestore"
+    CHECKPOINT_DIR: str = "/tmp/document-indexer/checkpoints"
 
     class Config:
         env_file = ".env"
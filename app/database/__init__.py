@@ -1,11 +1,22 @@
 # app/database/__init__.py
 
-from .vector_store import VectorStore
+from .vector_store import IndexBinding, VectorStore
 from .metadata_store import MetadataStore
 from .hybrid_search import HybridSearch
+from .checkpoint_store import (
+    CheckpointStore,
+    FirestoreCheckpointStore,
+    LocalCheckpointStore,
+    get_checkpoint_store
+)
 
 __all__ = [
+    'IndexBinding',
     'VectorStore',
     'MetadataStore',
-    'HybridSearch'
+    'HybridSearch',
+    'CheckpointStore',
+    'FirestoreCheckpointStore',
+    'LocalCheckpointStore',
+    'get_checkpoint_store'
 ]
\ No newline at end of file
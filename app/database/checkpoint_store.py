@@ -0,0 +1,153 @@
+# app/database/checkpoint_store.py
+
+from google.cloud import firestore
+from typing import Any, Dict, Optional
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+
+class CheckpointStore:
+    """
+    PER-STAGE, PER-CHUNK PIPELINE CHECKPOINTS
+
+    results are keyed by document and content hash so a retried job resumes
+    where the previous attempt stopped, while a changed file starts over.
+    the base class keeps nothing and is used when checkpointing is disabled
+    """
+
+    @staticmethod
+    def make_key(document_id: str, content: str) -> str:
+        """CHECKPOINT KEY FOR A DOCUMENT REVISION"""
+        content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+        return f"{document_id}_{content_hash}"
+
+    async def load(self, key: str, stage: str) -> Dict[int, Any]:
+        """LOADS COMPLETED RESULTS OF A STAGE, BY CHUNK INDEX"""
+        return {}
+
+    async def save(self, key: str, stage: str, chunk_index: int, value: Any) -> None:
+        """RECORDS THE RESULT OF A STAGE FOR ONE CHUNK"""
+
+    async def save_many(self, key: str, stage: str, values: Dict[int, Any]) -> None:
+        """RECORDS THE RESULTS OF A STAGE FOR SEVERAL CHUNKS AT ONCE"""
+        for chunk_index, value in values.items():
+            await self.save(key, stage, chunk_index, value)
+
+    async def clear(self, key: str) -> None:
+        """DROPS ALL CHECKPOINTS OF A DOCUMENT REVISION"""
+
+class FirestoreCheckpointStore(CheckpointStore):
+    """
+    CHECKPOINTS IN FIRESTORE, SHARED ACROSS JOB ATTEMPTS AND INSTANCES
+
+    the client is blocking, every call runs in a worker thread so the
+    pipeline stages sharing the event loop keep going
+    """
+
+    # firestore commits at most 500 writes in one batch
+    MAX_BATCH_WRITES = 500
+
+    def __init__(self, project_id: str, client: Optional[firestore.Client] = None):
+        self.db = client or firestore.Client(project=project_id)
+        self.collection = self.db.collection('pipeline_checkpoints')
+
+    def _stage(self, key: str, stage: str):
+        return self.collection.document(key).collection(stage)
+
+    async def load(self, key: str, stage: str) -> Dict[int, Any]:
+        def load():
+            return {
+                int(doc.id): doc.to_dict().get('value')
+                for doc in self._stage(key, stage).stream()
+            }
+        return await asyncio.to_thread(load)
+
+    async def save(self, key: str, stage: str, chunk_index: int, value: Any) -> None:
+        doc_ref = self._stage(key, stage).document(str(chunk_index))
+        await asyncio.to_thread(doc_ref.set, {'value': value})
+
+    async def save_many(self, key: str, stage: str, values: Dict[int, Any]) -> None:
+        def save_many():
+            stage_ref = self._stage(key, stage)
+            items = list(values.items())
+            for i in range(0, len(items), self.MAX_BATCH_WRITES):
+                batch = self.db.batch()
+                for chunk_index, value in items[i:i + self.MAX_BATCH_WRITES]:
+                    batch.set(stage_ref.document(str(chunk_index)), {'value': value})
+                batch.commit()
+        if values:
+            await asyncio.to_thread(save_many)
+
+    async def clear(self, key: str) -> None:
+        def clear():
+            doc_ref = self.collection.document(key)
+            references = [
+                doc.reference
+                for stage_ref in doc_ref.collections()
+                for doc in stage_ref.stream()
+            ]
+            references.append(doc_ref)
+            for i in range(0, len(references), self.MAX_BATCH_WRITES):
+                batch = self.db.batch()
+                for reference in references[i:i + self.MAX_BATCH_WRITES]:
+                    batch.delete(reference)
+                batch.commit()
+        await asyncio.to_thread(clear)
+
+class LocalCheckpointStore(CheckpointStore):
+    """CHECKPOINTS AS APPEND-ONLY JSON LINES ON LOCAL DISK, WRITTEN FROM A WORKER THREAD"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, key: str, stage: str) -> str:
+        return os.path.join(self.directory, key, f"{stage}.jsonl")
+
+    def _load(self, key: str, stage: str) -> Dict[int, Any]:
+        results = {}
+        path = self._path(key, stage)
+        if not os.path.exists(path):
+            return results
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # last line may be cut short by a crash mid-write
+                    continue
+                results[entry["i"]] = entry["v"]
+        return results
+
+    def _append(self, key: str, stage: str, values: Dict[int, Any]) -> None:
+        path = self._path(key, stage)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a+", encoding="utf-8") as f:
+            # terminate a line left incomplete by a crash before appending
+            if f.tell() > 0:
+                f.seek(f.tell() - 1)
+                if f.read(1) != "\n":
+                    f.write("\n")
+            f.write("".join(json.dumps({"i": i, "v": value}) + "\n" for i, value in values.items()))
+
+    async def load(self, key: str, stage: str) -> Dict[int, Any]:
+        return await asyncio.to_thread(self._load, key, stage)
+
+    async def save(self, key: str, stage: str, chunk_index: int, value: Any) -> None:
+        await asyncio.to_thread(self._append, key, stage, {chunk_index: value})
+
+    async def save_many(self, key: str, stage: str, values: Dict[int, Any]) -> None:
+        if values:
+            await asyncio.to_thread(self._append, key, stage, values)
+
+    async def clear(self, key: str) -> None:
+        await asyncio.to_thread(shutil.rmtree, os.path.join(self.directory, key), ignore_errors=True)
+
+def get_checkpoint_store(settings) -> CheckpointStore:
+    """CREATE THE CHECKPOINT STORE CONFIGURED IN SETTINGS"""
+    if settings.CHECKPOINT_BACKEND == "firestore":
+        return FirestoreCheckpointStore(settings.PROJECT_ID)
+    if settings.CHECKPOINT_BACKEND == "local":
+        return LocalCheckpointStore(settings.CHECKPOINT_DIR)
+    return CheckpointStore()
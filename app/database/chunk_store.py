@@ -0,0 +1,230 @@
+# app/database/chunk_store.py
+
+from array import array
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Optional
+import numpy as np
+from langchain.schema import Document
+
+# code of a chunk without a value in a metadata column
+MISSING = -1
+
+def _intern_key(value: Any) -> Hashable:
+    """DICT KEY FOR A METADATA VALUE, PINECONE ALLOWS LISTS OF STRINGS"""
+    if isinstance(value, list):
+        return ("list", tuple(value))
+    if isinstance(value, bool):
+        # 1 == True would share a slot otherwise
+        return ("bool", value)
+    if isinstance(value, (int, float)):
+        # pinecone returns integers as floats, 3 and 3.0 are the same value
+        return ("number", value)
+    return (type(value).__name__, value)
+
+class _Column:
+    """ONE METADATA KEY: DISTINCT VALUES AND A CODE PER CHUNK"""
+    __slots__ = ("values", "index", "codes")
+
+    def __init__(self, rows: int):
+        self.values: List[Any] = []
+        self.index: Dict[Hashable, int] = {}
+        self.codes = array("i", [MISSING]) * rows
+
+    def append(self, value: Any):
+        key = _intern_key(value)
+        code = self.index.get(key)
+        if code is None:
+            code = self.index[key] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+    def copy(self, codes: Optional[array] = None) -> "_Column":
+        """A COLUMN THAT CAN BE APPENDED TO WITHOUT CHANGING THIS ONE"""
+        column = _Column.__new__(_Column)
+        column.values = list(self.values)
+        column.index = dict(self.index)
+        column.codes = array("i", self.codes) if codes is None else codes
+        return column
+
+class ChunkView:
+    """READ-ONLY VIEW OF ONE CHUNK OF A ChunkStore"""
+    __slots__ = ("store", "index")
+
+    def __init__(self, store: "ChunkStore", index: int):
+        self.store = store
+        self.index = index
+
+    @property
+    def id(self) -> Optional[str]:
+        return self.store.id(self.index)
+
+    @property
+    def page_content(self) -> str:
+        return self.store.text(self.index)
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        return self.store.metadata(self.index)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.store.value(self.index, key, default)
+
+    def to_document(self) -> Document:
+        return Document(id=self.id, page_content=self.page_content, metadata=self.metadata)
+
+class ChunkStore:
+    """
+    COMPACT IN-MEMORY STORAGE OF CHUNK TEXTS AND METADATA
+
+    texts are concatenated into one utf-8 arena indexed by an offsets array,
+    and each metadata key is a column of int32 codes into its distinct
+    values, so a chunk costs a few bytes beyond its text instead of a
+    Document, a dict and a string per field. Documents are only built for
+    chunks that are read
+    """
+
+    def __init__(
+        self,
+        arena: bytes,
+        offsets: np.ndarray,
+        columns: Dict[str, _Column],
+        ids: Optional[List[Optional[str]]] = None
+    ):
+        self._arena = arena
+        self._offsets = offsets
+        self._columns = columns
+        self._ids = ids
+        self._codes = {key: np.frombuffer(column.codes, dtype=np.int32) for key, column in columns.items()}
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Document]) -> "ChunkStore":
+        return cls._build(bytearray(), array("q", [0]), {}, [], documents)
+
+    @classmethod
+    def _build(
+        cls,
+        arena: bytearray,
+        offsets: array,
+        columns: Dict[str, _Column],
+        ids: List[Optional[str]],
+        documents: Iterable[Document]
+    ) -> "ChunkStore":
+        """APPEND documents TO THE GIVEN ARENA AND COLUMNS AND WRAP THEM"""
+        rows = len(offsets) - 1
+        for doc in documents:
+            arena += doc.page_content.encode("utf-8")
+            offsets.append(len(arena))
+            ids.append(getattr(doc, "id", None))
+            for key, value in doc.metadata.items():
+                column = columns.get(key)
+                if column is None:
+                    column = columns[key] = _Column(rows)
+                column.append(value)
+            rows += 1
+            for column in columns.values():
+                if len(column.codes) < rows:
+                    column.codes.append(MISSING)
+        return cls(
+            bytes(arena),
+            np.frombuffer(offsets, dtype=np.int64),
+            columns,
+            ids if any(i is not None for i in ids) else None
+        )
+
+    def extend(self, documents: Iterable[Document]) -> "ChunkStore":
+        """NEW STORE WITH documents APPENDED, THIS ONE IS LEFT AS IT IS"""
+        return self._build(
+            bytearray(self._arena),
+            array("q", self._offsets.tobytes()),
+            {key: column.copy() for key, column in self._columns.items()},
+            list(self._ids) if self._ids is not None else [None] * len(self),
+            documents
+        )
+
+    def take(self, keep: np.ndarray) -> "ChunkStore":
+        """
+        NEW STORE OF THE CHUNKS WHERE THE BOOLEAN MASK keep IS SET, IN ORDER
+
+        texts are copied a run of consecutive kept chunks at a time. values
+        no longer used stay in the columns until the store is rebuilt
+        """
+        kept = np.flatnonzero(keep)
+        # starts and ends of runs of consecutive kept chunks
+        breaks = np.flatnonzero(np.diff(kept) != 1) + 1
+        starts = kept[np.concatenate(([0], breaks))] if len(kept) else kept
+        ends = kept[np.concatenate((breaks - 1, [len(kept) - 1]))] + 1 if len(kept) else kept
+        arena = b"".join(self._arena[self._offsets[a]:self._offsets[b]] for a, b in zip(starts, ends))
+        lengths = np.diff(self._offsets)[kept]
+        offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+        columns = {}
+        for key, column in self._columns.items():
+            taken = _Column.__new__(_Column)
+            # codes are only appended to, through copies made by extend
+            taken.values, taken.index = column.values, column.index
+            taken.codes = array("i", self._codes[key][kept].tobytes())
+            columns[key] = taken
+        ids = [self._ids[i] for i in kept] if self._ids is not None else None
+        return ChunkStore(arena, offsets, columns, ids)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> ChunkView:
+        return ChunkView(self, int(index))
+
+    def __iter__(self) -> Iterator[ChunkView]:
+        return (ChunkView(self, i) for i in range(len(self)))
+
+    @property
+    def nbytes(self) -> int:
+        """APPROXIMATE SIZE OF THE ARENA, OFFSETS AND CODE COLUMNS"""
+        return (
+            len(self._arena)
+            + self._offsets.nbytes
+            + sum(codes.nbytes for codes in self._codes.values())
+        )
+
+    def text(self, index: int) -> str:
+        return self._arena[self._offsets[index]:self._offsets[index + 1]].decode("utf-8")
+
+    def texts(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self.text(i)
+
+    def id(self, index: int) -> Optional[str]:
+        return self._ids[index] if self._ids is not None else None
+
+    def value(self, index: int, key: str, default: Any = None) -> Any:
+        codes = self._codes.get(key)
+        if codes is None or codes[index] == MISSING:
+            return default
+        return self._columns[key].values[codes[index]]
+
+    def metadata(self, index: int) -> Dict[str, Any]:
+        metadata = {}
+        for key, codes in self._codes.items():
+            code = codes[index]
+            if code != MISSING:
+                value = self._columns[key].values[code]
+                # callers may mutate what they get back
+                metadata[key] = list(value) if isinstance(value, list) else value
+        return metadata
+
+    def document(self, index: int) -> Document:
+        return self[index].to_document()
+
+    def mask(self, filters: Dict[str, Any]) -> np.ndarray:
+        """CHUNKS WHOSE METADATA EQUALS EVERY filters VALUE"""
+        mask = np.ones(len(self), dtype=bool)
+        for key, value in filters.items():
+            codes = self._codes.get(key)
+            if codes is None:
+                # a chunk without the key only matches None
+                if value is not None:
+                    mask[:] = False
+                continue
+            code = self._columns[key].index.get(_intern_key(value))
+            matches = codes == code if code is not None else np.zeros(len(self), dtype=bool)
+            if value is None:
+                matches |= codes == MISSING
+            mask &= matches
+        return mask
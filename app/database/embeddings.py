@@ -1,14 +1,86 @@
 # app/database/embeddings.py
 
 from langchain_openai import OpenAIEmbeddings
+from langchain_core.embeddings import Embeddings
+from typing import Any, List, Optional
+from ..utils.http import HttpTransport
+from ..utils.rate_limiter import RateLimitScheduler, OPENAI, estimate_tokens
 
-def get_embeddings(api_key: str = None):
+DEFAULT_EMBEDDING_MODEL = "text-embedding-3-large"
+
+# output size of each model when no dimensions are requested
+NATIVE_DIMENSIONS = {
+    "text-embedding-3-large": 3072,
+    "text-embedding-3-small": 1536,
+    "text-embedding-ada-002": 1536,
+}
+
+class ScheduledEmbeddings(Embeddings):
+    """
+    ROUTES ASYNC EMBEDDING CALLS THROUGH THE SHARED RATE LIMIT SCHEDULER
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        scheduler: RateLimitScheduler,
+        provider: str = OPENAI
+    ):
+        self.embeddings = embeddings
+        self.scheduler = scheduler
+        self.provider = provider
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.scheduler.run(
+            self.provider,
+            lambda: self.embeddings.aembed_documents(texts),
+            tokens=sum(estimate_tokens(text) for text in texts)
+        )
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.scheduler.run(
+            self.provider,
+            lambda: self.embeddings.aembed_query(text),
+            tokens=estimate_tokens(text)
+        )
+
+def openai_embeddings(
+    api_key: str,
+    model: str = DEFAULT_EMBEDDING_MODEL,
+    dimension: Optional[int] = None,
+    http_transport: Optional[HttpTransport] = None,
+    **kwargs: Any
+) -> OpenAIEmbeddings:
+    """
+    OPENAI EMBEDDINGS OF model, SHORTENED TO dimension WHEN IT DIFFERS FROM
+    THE MODEL'S NATIVE SIZE (text-embedding-3 models only)
+    """
+    if dimension and dimension != NATIVE_DIMENSIONS.get(model):
+        kwargs["dimensions"] = dimension
+    if http_transport:
+        kwargs.update(http_transport.openai_kwargs())
+    return OpenAIEmbeddings(model=model, openai_api_key=api_key, **kwargs)
+
+def get_embeddings(
+    api_key: str = None,
+    http_transport: Optional[HttpTransport] = None,
+    model: str = DEFAULT_EMBEDDING_MODEL,
+    dimension: Optional[int] = None
+):
     """
     CREATE AND CONFIGURE OPENAI EMBEDDINGS INSTANCE
     """
-    return OpenAIEmbeddings(
-        model="text-embedding-3-large",  # latest model
-        openai_api_key=api_key,
+    return openai_embeddings(
+        api_key,
+        model,
+        dimension,
+        http_transport,
         chunk_size=1000,  # process 1000 texts at a time when batching
         max_retries=3,    # retry failed requests up to 3 times
-    )
\ No newline at end of file
+    )
@@ -1,44 +1,150 @@
 # app/database/hybrid_search.py
 
-from typing import List, Dict, Any, Optional
+from dataclasses import dataclass
+from typing import List, Dict, Any, Iterable, Optional, Sequence
+import asyncio
 import numpy as np
 from langchain.schema import Document
 from ..processor.embedding_generator import EmbeddingGenerator
-from ..processor.bm25_processor import BM25Processor
+from ..processor.bm25_processor import BM25Index, BM25Processor, tokenize
+from ..utils.metrics import span
+from ..utils.process_pool import CpuPool
+from ..utils.profiling import Profiler
+from .chunk_store import ChunkStore
+from .vector_store import VectorStore
+
+PIPELINE = "hybrid_search"
+
+@dataclass(frozen=True)
+class SearchGeneration:
+    """ONE VERSION OF THE INDEX: CHUNKS, THEIR EMBEDDINGS AND BM25, NEVER CHANGED IN PLACE"""
+    version: int
+    store: ChunkStore
+    embeddings: np.ndarray
+    bm25: BM25Index
+
+    def __len__(self) -> int:
+        return len(self.store)
 
 class HybridSearch:
     """
     IMPLEMENTS HYBRID SEARCH COMBINING SEMANTIC SEARCH (EMBEDDINGS) 
     AND LEXICAL SEARCH (BM25)
+
+    searches run against the generation that was current when they started.
+    reindexing and deltas build the next generation on the side and swap
+    it in with one assignment, so searches neither wait for them nor see
+    chunks, embeddings and BM25 scores of different generations
     """
     
     def __init__(
         self,
         embedding_generator: EmbeddingGenerator,
         bm25_processor: BM25Processor,
-        alpha: float = 0.5
+        alpha: float = 0.5,
+        cpu_pool: Optional[CpuPool] = None,
+        profiler: Optional[Profiler] = None
     ):
         self.embedding_generator = embedding_generator
         self.bm25_processor = bm25_processor
         self.alpha = alpha
-        self.documents: Optional[List[Document]] = None
-        
-    async def index_documents(self, documents: List[Document]):
-        """INDEX DOCUMENTS FOR BOTH SEMANTIC AND LEXICAL SEARCH"""
-        self.documents = documents
-        texts = [doc.page_content for doc in documents]
-        
-        # index for BM25
-        self.bm25_processor.index_documents(texts)
+        # tokenizes for BM25 off the event loop's process when given
+        self.cpu_pool = cpu_pool
+        # off unless a request asks for a profile
+        self.profiler = profiler or Profiler()
+        self.generation: Optional[SearchGeneration] = None
+        # serializes writers, created on first use inside the event loop
+        self._write_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def store(self) -> Optional[ChunkStore]:
+        return self.generation.store if self.generation is not None else None
+
+    @property
+    def embeddings(self) -> Optional[np.ndarray]:
+        return self.generation.embeddings if self.generation is not None else None
+
+    def _lock(self) -> asyncio.Lock:
+        if self._write_lock is None:
+            self._write_lock = asyncio.Lock()
+        return self._write_lock
+
+    def _swap(self, store: ChunkStore, embeddings: np.ndarray, bm25: BM25Index) -> SearchGeneration:
+        version = self.generation.version + 1 if self.generation is not None else 1
+        generation = SearchGeneration(version, store, embeddings, bm25)
+        self.generation = generation
+        # the processor's own searches follow the same generation
+        self.bm25_processor.bm25 = bm25
+        return generation
+
+    async def _embed(self, texts: List[str], dimension: int = 0) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, dimension), dtype=np.float32)
+        embeddings = await self.embedding_generator.generate_embeddings(texts)
+        return np.asarray(embeddings, dtype=np.float32)
         
-        # generate embeddings
-        self.embeddings = await self.embedding_generator.generate_embeddings(texts)
+    async def index_documents(self, documents: List[Document]) -> SearchGeneration:
+        """
+        INDEX DOCUMENTS FOR BOTH SEMANTIC AND LEXICAL SEARCH
+
+        the documents are copied into a compact ChunkStore and not kept;
+        results rebuild Documents for the returned hits only. the current
+        generation keeps serving searches until the new one is complete
+        """
+        async with self._lock():
+            texts = [doc.page_content for doc in documents]
+            
+            # index for BM25
+            bm25 = await self.bm25_processor.build_index(texts, pool=self.cpu_pool)
+            
+            # generate embeddings
+            embeddings = await self._embed(texts)
+            return self._swap(ChunkStore.from_documents(documents), embeddings, bm25)
+
+    async def apply_delta(
+        self,
+        documents: Sequence[Document] = (),
+        removed_drive_ids: Iterable[str] = ()
+    ) -> SearchGeneration:
+        """
+        REMOVE THE CHUNKS OF removed_drive_ids AND ADD documents
+
+        only the added chunks are embedded and tokenized; the kept chunks'
+        texts, embeddings and postings are copied into the next generation.
+        re-indexing a changed file is removing its drive id and adding its
+        new chunks. meant for small changes, index_documents for large ones
+        """
+        async with self._lock():
+            current = self.generation
+            if current is None:
+                texts = [doc.page_content for doc in documents]
+                return self._swap(
+                    ChunkStore.from_documents(documents),
+                    await self._embed(texts),
+                    BM25Index(tokenize(text) for text in texts)
+                )
+
+            keep = np.ones(len(current), dtype=bool)
+            for drive_id in removed_drive_ids:
+                keep &= ~current.store.mask({"drive_id": drive_id})
+            texts = [doc.page_content for doc in documents]
+            added = await self._embed(texts, current.embeddings.shape[1])
+
+            store, embeddings, bm25 = current.store, current.embeddings, current.bm25
+            if not keep.all():
+                store, embeddings, bm25 = store.take(keep), embeddings[keep], bm25.take(keep)
+            if texts:
+                store = store.extend(documents)
+                embeddings = np.concatenate((embeddings, added))
+                bm25 = bm25.extend(tokenize(text) for text in texts)
+            return self._swap(store, embeddings, bm25)
     
     async def search(
         self,
         query: str,
         k: int = 3,
-        filter_metadata: Optional[Dict[str, Any]] = None
+        filter_metadata: Optional[Dict[str, Any]] = None,
+        collapse_duplicates: bool = False
     ) -> List[Dict[str, Any]]:
         """
         PERFORM HYBRID SEARCH
@@ -47,39 +153,60 @@ class HybridSearch:
             query: search query
             k: number of results to return
             filter_metadata: optional metadata filters
+            collapse_duplicates: return only the best hit of each
+                near-duplicate cluster (duplicate_cluster metadata)
         returns:
             list of results with scores
         """
-        if not self.documents:
+        generation = self.generation
+        if not generation:
             raise ValueError("no documents indexed, call index_documents first")
+        with self.profiler.session(PIPELINE, k=k):
+            return await self._search(generation, query, k, filter_metadata, collapse_duplicates)
+
+    async def _search(
+        self,
+        generation: SearchGeneration,
+        query: str,
+        k: int,
+        filter_metadata: Optional[Dict[str, Any]],
+        collapse_duplicates: bool
+    ) -> List[Dict[str, Any]]:
+        store = generation.store
             
         # get semantic search scores
-        query_embedding = await self.embedding_generator.generate_query_embedding(query)
-        semantic_scores = np.dot(self.embeddings, query_embedding)
+        with span(PIPELINE, "query_embedding"):
+            query_embedding = await self.embedding_generator.generate_query_embedding(query)
+        with span(PIPELINE, "semantic"):
+            semantic_scores = np.dot(generation.embeddings, query_embedding)
         
         # get bm25 scores
-        bm25_results = self.bm25_processor.search(query, k=len(self.documents))
-        bm25_scores = [result["score"] for result in bm25_results]
-        
-        # normalize scores
-        semantic_scores = self._normalize_scores(semantic_scores)
-        bm25_scores = self._normalize_scores(bm25_scores)
-        
-        # combine scores
-        combined_scores = self.alpha * semantic_scores + (1 - self.alpha) * bm25_scores
+        with span(PIPELINE, "bm25"):
+            bm25_scores = self.bm25_processor.get_scores(query, generation.bm25)
         
-        # apply metadata filters if provided
-        if filter_metadata:
-            mask = self._apply_metadata_filters(filter_metadata)
-            combined_scores = combined_scores * mask
+        with span(PIPELINE, "fuse"):
+            # normalize scores
+            semantic_scores = self._normalize_scores(semantic_scores)
+            bm25_scores = self._normalize_scores(bm25_scores)
+            
+            # combine scores
+            combined_scores = self.alpha * semantic_scores + (1 - self.alpha) * bm25_scores
+            
+            # apply metadata filters if provided
+            if filter_metadata:
+                combined_scores = combined_scores * store.mask(filter_metadata)
         
         # get top k results
         results = []
-        top_k_indices = np.argsort(combined_scores)[-k:][::-1]
+        with span(PIPELINE, "rank"):
+            if collapse_duplicates:
+                top_k_indices = self._collapse(store, np.argsort(combined_scores)[::-1], k)
+            else:
+                top_k_indices = np.argsort(combined_scores)[-k:][::-1]
         
         for idx in top_k_indices:
             results.append({
-                "document": self.documents[idx],
+                "document": store.document(idx),
                 "score": {
                     "combined": float(combined_scores[idx]),
                     "semantic": float(semantic_scores[idx]),
@@ -89,6 +216,26 @@ class HybridSearch:
         
         return results
     
+    def _collapse(self, store: ChunkStore, ranked: np.ndarray, k: int) -> List[int]:
+        """FIRST k INDICES OF ranked WITH AT MOST ONE PER DUPLICATE CLUSTER"""
+        seen = set()
+        kept = []
+        for idx in ranked:
+            chunk = store[idx]
+            cluster = chunk.get("duplicate_cluster") or chunk.id
+            drive_id, chunk_index = chunk.get("drive_id"), chunk.get("chunk_index")
+            if cluster is None and drive_id is not None and chunk_index is not None:
+                cluster = VectorStore.chunk_id(drive_id, chunk_index)
+            if cluster is None:
+                cluster = idx
+            if cluster in seen:
+                continue
+            seen.add(cluster)
+            kept.append(idx)
+            if len(kept) == k:
+                break
+        return kept
+    
     def _normalize_scores(self, scores: np.ndarray) -> np.ndarray:
         """NORMALIZE SCORES TO RANGE [0,1]"""
         min_score = np.min(scores)
@@ -96,12 +243,3 @@ class HybridSearch:
         if max_score == min_score:
             return np.ones_like(scores)
         return (scores - min_score) / (max_score - min_score)
-    
-    def _apply_metadata_filters(self, filters: Dict[str, Any]) -> np.ndarray:
-        """APPLY METADATA FILTERS TO DOCUMENTS"""
-        mask = np.ones(len(self.documents), dtype=bool)
-        for key, value in filters.items():
-            for i, doc in enumerate(self.documents):
-                if doc.metadata.get(key) != value:
-                    mask[i] = False
-        return mask
\ No newline at end of file
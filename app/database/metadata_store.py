@@ -1,16 +1,18 @@
 # app/database/metadata_store.py
 
 from google.cloud import firestore
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import datetime
 from ..models.metadata import DocumentMetadata
 
 class MetadataStore:
     """HANDLES DOCUMENT METADATA STORAGE IN FIRESTORE"""
     
-    def __init__(self, project_id: str):
-        self.db = firestore.Client(project=project_id)
+    def __init__(self, project_id: str, client: Optional[firestore.Client] = None):
+        self.db = client or firestore.Client(project=project_id)
         self.collection = self.db.collection('document_metadata')
+        self.sync_collection = self.db.collection('drive_sync_state')
+        self.index_collection = self.db.collection('vector_index_state')
     
     async def create(self, metadata: DocumentMetadata) -> str:
         """CREATES A NEW DOCUMENT METADATA ENTRY"""
@@ -22,13 +24,18 @@ class MetadataStore:
                 'path': metadata.drive_path,
                 'size': metadata.file_size,
                 'created_at': metadata.created_at,
-                'modified_at': metadata.modified_at
+                'modified_at': metadata.modified_at,
+                'md5_checksum': metadata.md5_checksum,
+                'modified_time': metadata.modified_time,
+                'head_revision_id': metadata.head_revision_id
             },
             'processing': {
                 'status': metadata.status,
                 'chunk_count': metadata.chunk_count,
                 'last_processed': firestore.SERVER_TIMESTAMP,
-                'error': metadata.error
+                'error': metadata.error,
+                'namespace': metadata.namespace,
+                'user_id': metadata.user_id
             }
         })
         return metadata.document_id
@@ -37,7 +44,10 @@ class MetadataStore:
                           chunk_count: Optional[int] = None,
                           error: Optional[str] = None,
                           file_name: Optional[str] = None,
-                          file_size: Optional[int] = None) -> None:
+                          file_size: Optional[int] = None,
+                          llm_calls_avoided: Optional[int] = None,
+                          llm_calls_downgraded: Optional[int] = None,
+                          embeddings_reused: Optional[int] = None) -> None:
         """UPDATES DOCUMENT METADATA"""
         doc_ref = self.collection.document(doc_id)
         update_data = {
@@ -53,11 +63,139 @@ class MetadataStore:
             update_data['original_file.name'] = file_name
         if file_size is not None:
             update_data['original_file.size'] = file_size
+        if llm_calls_avoided is not None:
+            update_data['processing.llm_calls_avoided'] = llm_calls_avoided
+        if llm_calls_downgraded is not None:
+            update_data['processing.llm_calls_downgraded'] = llm_calls_downgraded
+        if embeddings_reused is not None:
+            update_data['processing.embeddings_reused'] = embeddings_reused
         
         doc_ref.update(update_data)
     
+    async def update_revision(self, doc_id: str,
+                              md5_checksum: Optional[str] = None,
+                              modified_time: Optional[str] = None,
+                              head_revision_id: Optional[str] = None) -> None:
+        """RECORDS THE DRIVE REVISION A DOCUMENT WAS INDEXED AT"""
+        doc_ref = self.collection.document(doc_id)
+        doc_ref.update({
+            'original_file.md5_checksum': md5_checksum,
+            'original_file.modified_time': modified_time,
+            'original_file.head_revision_id': head_revision_id
+        })
+    
+    async def update_content(self, doc_id: str, content_hash: str, namespace: str,
+                             user_id: Optional[str] = None) -> None:
+        """RECORDS WHAT CONTENT WAS INDEXED, IN WHICH NAMESPACE AND FOR WHICH USER"""
+        doc_ref = self.collection.document(doc_id)
+        doc_ref.update({
+            'original_file.content_hash': content_hash,
+            'processing.namespace': namespace,
+            'processing.user_id': user_id
+        })
+    
+    async def mark_user_deleted(self, user_id: str, namespace: Optional[str] = None) -> int:
+        """
+        MARKS EVERY DOCUMENT INDEXED FOR A USER AS DELETED
+
+        their chunks are gone, so the records must not be reused as repeats
+        or let a sync skip the files. records written before the user was
+        recorded are found by their namespace when it is the user's own
+        """
+        queries = [self.collection.where('processing.user_id', '==', user_id)]
+        if namespace:
+            queries.append(self.collection.where('processing.namespace', '==', namespace))
+        marked = set()
+        for query in queries:
+            for doc in query.stream():
+                if doc.id in marked:
+                    continue
+                doc.reference.update({
+                    'processing.status': 'deleted',
+                    'processing.chunk_count': 0,
+                    'processing.last_processed': firestore.SERVER_TIMESTAMP,
+                    'original_file.content_hash': None
+                })
+                marked.add(doc.id)
+        return len(marked)
+    
+    async def get_user_drive_ids(self, user_id: str, namespace: str) -> List[str]:
+        """RETRIEVES THE DRIVE FILE IDS INDEXED FOR A USER IN A NAMESPACE"""
+        query = (
+            self.collection
+            .where('processing.user_id', '==', user_id)
+            .where('processing.namespace', '==', namespace)
+        )
+        drive_ids = {doc.get('original_file.drive_id') for doc in query.stream()}
+        return sorted(drive_id for drive_id in drive_ids if drive_id)
+    
+    async def get_by_content_hash(self, content_hash: str, namespace: str) -> Optional[Dict[str, Any]]:
+        """RETRIEVES A COMPLETED DOCUMENT WITH THE SAME CONTENT IN A NAMESPACE"""
+        query = (
+            self.collection
+            .where('original_file.content_hash', '==', content_hash)
+            .where('processing.namespace', '==', namespace)
+            .where('processing.status', '==', 'completed')
+            .limit(1)
+        )
+        for doc in query.stream():
+            return {**doc.to_dict(), 'document_id': doc.id}
+        return None
+    
     async def get_document(self, doc_id: str) -> Optional[Dict[str, Any]]:
         """RETRIEVES DOCUMENT METADATA BY ID"""
         doc_ref = self.collection.document(doc_id)
         doc = doc_ref.get()
-        return doc.to_dict() if doc.exists else None
\ No newline at end of file
+        return doc.to_dict() if doc.exists else None
+    
+    async def get_by_drive_id(self, drive_id: str, namespace: Optional[str] = None,
+                              user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        RETRIEVES DOCUMENT METADATA BY GOOGLE DRIVE FILE ID
+
+        a file shared between users has one record per namespace it is
+        indexed in; pass the namespace, or the user it was indexed for, to
+        get that one
+        """
+        query = self.collection.where('original_file.drive_id', '==', drive_id)
+        if namespace is not None:
+            query = query.where('processing.namespace', '==', namespace)
+        if user_id is not None:
+            query = query.where('processing.user_id', '==', user_id)
+        query = query.limit(1)
+        for doc in query.stream():
+            return {**doc.to_dict(), 'document_id': doc.id}
+        return None
+    
+    async def get_sync_token(self, user_id: str) -> Optional[str]:
+        """RETRIEVES THE STORED DRIVE CHANGES PAGE TOKEN FOR A USER"""
+        doc = self.sync_collection.document(user_id).get()
+        return doc.to_dict().get('page_token') if doc.exists else None
+    
+    async def get_failed_changes(self, user_id: str) -> List[Dict[str, Any]]:
+        """RETRIEVES THE DRIVE CHANGES A USER'S LAST SYNC PASS FAILED TO APPLY"""
+        doc = self.sync_collection.document(user_id).get()
+        return doc.to_dict().get('failed_changes', []) if doc.exists else []
+    
+    async def save_sync_token(self, user_id: str, page_token: str,
+                              failed_changes: Optional[List[Dict[str, Any]]] = None) -> None:
+        """STORES THE DRIVE CHANGES PAGE TOKEN FOR A USER AND THE CHANGES TO RETRY"""
+        self.sync_collection.document(user_id).set({
+            'page_token': page_token,
+            'failed_changes': failed_changes or [],
+            'updated_at': firestore.SERVER_TIMESTAMP
+        })
+    
+    async def get_active_index(self) -> Optional[Dict[str, Any]]:
+        """RETRIEVES THE PINECONE INDEX AND EMBEDDING MODEL READS GO TO, IF ONE WAS SWITCHED TO"""
+        doc = self.index_collection.document('active').get()
+        return doc.to_dict() if doc.exists else None
+    
+    async def set_active_index(self, index_name: str, embedding_model: str, embedding_dimension: int) -> None:
+        """RECORDS THE PINECONE INDEX AND EMBEDDING MODEL READS GO TO"""
+        self.index_collection.document('active').set({
+            'index_name': index_name,
+            'embedding_model': embedding_model,
+            'embedding_dimension': embedding_dimension,
+            'updated_at': firestore.SERVER_TIMESTAMP
+        })
\ No newline at end of file
@@ -1,49 +1,157 @@
 # app/database/vector_store.py
 
+import asyncio
+from dataclasses import dataclass
 from langchain_pinecone import PineconeVectorStore  # Updated import
-from langchain_openai import OpenAIEmbeddings
 from pinecone import Pinecone as PineconeClient, ServerlessSpec
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from .embeddings import ScheduledEmbeddings, openai_embeddings
+from ..utils.http import HttpTransport
 from ..utils.logger import setup_logger
+from ..utils.rate_limiter import PINECONE, RateLimitScheduler
 
 logger = setup_logger(__name__)
 
+@dataclass(frozen=True)
+class IndexBinding:
+    """A PINECONE INDEX AND THE EMBEDDING MODEL ITS VECTORS WERE MADE WITH"""
+    name: str
+    model: str
+    dimension: int
+    index: Any
+    embeddings: Embeddings
+    vector_store: PineconeVectorStore
+
 class VectorStore:
-    def __init__(self, settings):
-        """Initialize vector store with Pinecone"""
+    DELETE_BATCH_SIZE = 1000
+    UPSERT_BATCH_SIZE = 100
+    FETCH_BATCH_SIZE = 100
+
+    def __init__(
+        self,
+        settings,
+        scheduler: Optional[RateLimitScheduler] = None,
+        client=None,
+        embeddings: Optional[Embeddings] = None,
+        http_transport: Optional[HttpTransport] = None
+    ):
+        """Initialize vector store with Pinecone
+
+        client and embeddings replace the Pinecone client and the OpenAI
+        embeddings, e.g. with the local stand-ins used by the benchmarks.
+        OpenAI calls go through http_transport when given; the Pinecone
+        client keeps its own urllib3 pool, sized to the same per-host limit.
+        The index and embedding model come from PINECONE_INDEX_NAME,
+        EMBEDDING_MODEL and EMBEDDING_DIMENSION until use_index switches
+        them, e.g. after an embedding migration.
+        """
         self.settings = settings
-        
-        # Initialize OpenAI embeddings
-        self.embeddings = OpenAIEmbeddings(
-            openai_api_key=settings.OPENAI_API_KEY,
-            model="text-embedding-3-large"
-        )
+        self.http_transport = http_transport
+        self.scheduler = scheduler
+        # upserts are scheduled too when the scheduler has a Pinecone limiter
+        self.schedule_upserts = scheduler is not None and PINECONE in scheduler.limiters
+        # namespace for chunks without a user, and for everything in shared mode
+        self.namespace = "default"
+        self.per_user_namespaces = settings.PINECONE_NAMESPACE_MODE == "user"
         
         # Initialize Pinecone client
-        self.pc = PineconeClient(api_key=settings.PINECONE_API_KEY)
-        
-        # Setup index
-        self.index = self.setup_pinecone_index()
+        self.pc = client or PineconeClient(api_key=settings.PINECONE_API_KEY)
         
-        # Initialize vector store
-        self.vector_store = PineconeVectorStore(  # Updated class
-            index=self.index,
-            embedding=self.embeddings,
-            text_key="text",
-            namespace="default"
+        # Setup index and embeddings
+        self.binding = self.bind(
+            settings.PINECONE_INDEX_NAME,
+            settings.EMBEDDING_MODEL,
+            settings.EMBEDDING_DIMENSION,
+            embeddings
+        )
+
+    # the current binding's parts; methods that use more than one read
+    # self.binding once so a concurrent use_index cannot mix two of them
+    @property
+    def index(self):
+        return self.binding.index
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.binding.embeddings
+
+    @property
+    def vector_store(self) -> PineconeVectorStore:
+        return self.binding.vector_store
+
+    def make_embeddings(self, model: str, dimension: int) -> Embeddings:
+        """OpenAI embeddings of model, through the scheduler when there is one"""
+        embeddings = openai_embeddings(
+            self.settings.OPENAI_API_KEY,
+            model,
+            dimension,
+            self.http_transport,
+            max_retries=0 if self.scheduler else 2
+        )
+        return self.scheduled(embeddings)
+
+    def scheduled(self, embeddings: Embeddings) -> Embeddings:
+        if self.scheduler and not isinstance(embeddings, ScheduledEmbeddings):
+            return ScheduledEmbeddings(embeddings, self.scheduler)
+        return embeddings
+
+    def bind(self, name: str, model: str, dimension: int, embeddings: Optional[Embeddings] = None) -> IndexBinding:
+        """Open (creating if needed) an index and pair it with its embeddings"""
+        embeddings = self.scheduled(embeddings) if embeddings else self.make_embeddings(model, dimension)
+        index = self.setup_pinecone_index(name, dimension)
+        return IndexBinding(
+            name=name,
+            model=model,
+            dimension=dimension,
+            index=index,
+            embeddings=embeddings,
+            vector_store=PineconeVectorStore(  # Updated class
+                index=index,
+                embedding=embeddings,
+                text_key="text",
+                namespace=self.namespace
+            )
         )
 
-    def setup_pinecone_index(self):
+    def use_index(self, binding: IndexBinding):
+        """Serve reads and writes from binding from now on
+
+        One assignment, so every call sees either the old or the new index
+        with its own embedding model, never a mix.
+        """
+        previous, self.binding = self.binding, binding
+        logger.info(f"Switched vector index from {previous.name} ({previous.model}) to {binding.name} ({binding.model})")
+
+    async def sync_active_index(self, metadata_store) -> bool:
+        """Switch to the index recorded as active, e.g. by a migration
+
+        Returns whether the index changed.
+        """
+        state = await metadata_store.get_active_index()
+        if not state or state.get('index_name') == self.binding.name:
+            return False
+        binding = await asyncio.to_thread(
+            self.bind, state['index_name'], state['embedding_model'], int(state['embedding_dimension'])
+        )
+        self.use_index(binding)
+        return True
+
+    def setup_pinecone_index(self, name: Optional[str] = None, dimension: Optional[int] = None):
         """Setup Pinecone index"""
+        name = name or self.settings.PINECONE_INDEX_NAME
+        dimension = dimension or self.settings.EMBEDDING_DIMENSION
         try:
             # List existing indexes
             existing_indexes = [index.name for index in self.pc.list_indexes()]
             
             # Create index if it doesn't exist
-            if self.settings.PINECONE_INDEX_NAME not in existing_indexes:
-                logger.info(f"Creating new Pinecone index: {self.settings.PINECONE_INDEX_NAME}")
+            if name not in existing_indexes:
+                logger.info(f"Creating new Pinecone index: {name}")
                 self.pc.create_index(
-                    name=self.settings.PINECONE_INDEX_NAME,
-                    dimension=3072,  # openai embeddings dimension
+                    name=name,
+                    dimension=dimension,
                     metric="cosine",
                     spec=ServerlessSpec(
                         cloud="aws",
@@ -52,24 +160,210 @@ class VectorStore:
                 )
             
             # Get the index
-            return self.pc.Index(self.settings.PINECONE_INDEX_NAME)
+            if self.http_transport:
+                return self.pc.Index(name, **self.http_transport.pinecone_kwargs())
+            return self.pc.Index(name)
             
         except Exception as e:
             logger.error(f"Error setting up Pinecone index: {str(e)}")
             raise
 
-    async def add_documents(self, documents):
+    @staticmethod
+    def chunk_id(drive_id: str, chunk_index: int) -> str:
+        """Deterministic vector ID for a chunk of a Drive file"""
+        return f"{drive_id}#{chunk_index}"
+
+    def namespace_for(self, user_id: Optional[str] = None) -> str:
+        """Namespace holding a user's chunks"""
+        if user_id and self.per_user_namespaces:
+            return user_id
+        return self.namespace
+
+    async def add_documents(self, documents, ids: Optional[List[str]] = None, namespace: Optional[str] = None):
         """Add documents to vector store"""
         try:
-            return await self.vector_store.aadd_documents(documents)
+            return await self.vector_store.aadd_documents(
+                documents, ids=ids, namespace=namespace or self.namespace
+            )
         except Exception as e:
             logger.error(f"Error adding documents to vector store: {str(e)}")
             raise
 
-    async def similarity_search(self, query: str, k: int = 3):
-        """Search for similar documents"""
+    async def embed_documents(self, texts: List[str], binding: Optional[IndexBinding] = None) -> List[List[float]]:
+        """Embed texts with the embedding model of binding, the current one by default"""
+        try:
+            return await (binding or self.binding).embeddings.aembed_documents(texts)
+        except Exception as e:
+            logger.error(f"Error embedding documents: {str(e)}")
+            raise
+
+    async def add_embeddings(
+        self,
+        documents,
+        embeddings: List[List[float]],
+        ids: List[str],
+        namespace: Optional[str] = None,
+        binding: Optional[IndexBinding] = None
+    ):
+        """Upsert documents whose embeddings were computed already
+
+        binding is the index the embeddings were made for, so a batch
+        embedded before use_index still lands next to vectors of its model.
+        """
+        try:
+            vectors = [
+                (vector_id, embedding, {**doc.metadata, "text": doc.page_content})
+                for vector_id, embedding, doc in zip(ids, embeddings, documents)
+            ]
+            index = (binding or self.binding).index
+            for i in range(0, len(vectors), self.UPSERT_BATCH_SIZE):
+                await self.upsert(index, vectors[i:i + self.UPSERT_BATCH_SIZE], namespace or self.namespace)
+            return ids
+        except Exception as e:
+            logger.error(f"Error adding embeddings to vector store: {str(e)}")
+            raise
+
+    async def upsert(self, index, vectors: List[Tuple[str, List[float], Dict[str, Any]]], namespace: str):
+        """Upsert one batch into index, scheduled when upserts are"""
+        # off the event loop, like every index call, so concurrent requests
+        # and scheduled upserts overlap with the round trip
+        if not self.schedule_upserts:
+            await asyncio.to_thread(index.upsert, vectors=vectors, namespace=namespace)
+            return
+        await self.scheduler.run(
+            PINECONE,
+            lambda: asyncio.to_thread(index.upsert, vectors=vectors, namespace=namespace),
+            tokens=len(vectors)
+        )
+
+    async def fetch(
+        self,
+        ids: List[str],
+        namespace: Optional[str] = None,
+        binding: Optional[IndexBinding] = None
+    ) -> Dict[str, Tuple[List[float], Dict[str, Any]]]:
+        """Stored vectors and metadata by ID; missing IDs are left out"""
+        try:
+            index = (binding or self.binding).index
+            found = {}
+            for i in range(0, len(ids), self.FETCH_BATCH_SIZE):
+                response = await asyncio.to_thread(
+                    index.fetch,
+                    ids=ids[i:i + self.FETCH_BATCH_SIZE],
+                    namespace=namespace or self.namespace
+                )
+                for vector_id, vector in response.vectors.items():
+                    found[vector_id] = (list(vector.values), dict(vector.metadata or {}))
+            return found
+        except Exception as e:
+            logger.error(f"Error fetching vectors: {str(e)}")
+            raise
+
+    async def delete_chunks(
+        self,
+        drive_id: str,
+        start: int,
+        end: int,
+        namespace: Optional[str] = None,
+        binding: Optional[IndexBinding] = None
+    ):
+        """Delete chunks [start, end) of a Drive file"""
+        if end <= start:
+            return
+        try:
+            index = (binding or self.binding).index
+            ids = [self.chunk_id(drive_id, i) for i in range(start, end)]
+            for i in range(0, len(ids), self.DELETE_BATCH_SIZE):
+                await asyncio.to_thread(
+                    index.delete,
+                    ids=ids[i:i + self.DELETE_BATCH_SIZE],
+                    namespace=namespace or self.namespace
+                )
+        except Exception as e:
+            logger.error(f"Error deleting chunks for {drive_id}: {str(e)}")
+            raise
+
+    async def delete_file(self, drive_id: str, namespace: Optional[str] = None):
+        """Delete every chunk of a Drive file"""
+        namespace = namespace or self.namespace
+        try:
+            index = self.index
+            # ids are prefixed with the drive id, so serverless indexes
+            # can be purged without a metadata filter
+            pages = index.list(prefix=f"{drive_id}#", namespace=namespace)
+            while True:
+                # each page is a request, fetched off the event loop
+                ids = await asyncio.to_thread(next, pages, None)
+                if ids is None:
+                    break
+                if ids:
+                    await asyncio.to_thread(index.delete, ids=ids, namespace=namespace)
+        except Exception as e:
+            logger.error(f"Error deleting vectors for {drive_id}: {str(e)}")
+            raise
+
+    async def delete_namespace(self, namespace: str):
+        """Delete every vector in a namespace, e.g. when offboarding a user"""
+        try:
+            await asyncio.to_thread(self.index.delete, delete_all=True, namespace=namespace)
+        except Exception as e:
+            logger.error(f"Error deleting namespace {namespace}: {str(e)}")
+            raise
+
+    async def delete_user(self, user_id: str, drive_ids: Optional[Iterable[str]] = None):
+        """Delete every chunk indexed for a user
+
+        In shared namespace mode the chunks are found through the user's
+        Drive file ids, drive_ids, as serverless indexes cannot delete by
+        metadata filter.
+        """
+        if self.per_user_namespaces:
+            await self.delete_namespace(self.namespace_for(user_id))
+            return
+        if drive_ids is None:
+            raise ValueError(
+                f"Deleting user {user_id} from the shared namespace needs the drive ids of their files"
+            )
+        for drive_id in drive_ids:
+            await self.delete_file(drive_id, namespace=self.namespace)
+
+    async def similarity_search(
+        self,
+        query: str,
+        k: int = 3,
+        filter: Optional[Dict[str, Any]] = None,
+        user_id: Optional[str] = None
+    ):
+        """Search for similar documents
+
+        Searches only the user's namespace when one is given; filter is a
+        Pinecone metadata filter and is applied by the index, so k matches
+        are returned even when most chunks are filtered out.
+        """
+        namespace = self.namespace_for(user_id)
+        if user_id and not self.per_user_namespaces:
+            # shared namespace, tenants are separated by the chunk metadata
+            filter = {"$and": [filter, {"user_id": user_id}]} if filter else {"user_id": user_id}
         try:
-            return await self.vector_store.asimilarity_search(query, k=k)
+            # query the index we already hold, the langchain async path opens
+            # a new async index client for every search
+            binding = self.binding
+            embedding = await binding.embeddings.aembed_query(query)
+            results = await asyncio.to_thread(
+                binding.index.query,
+                vector=embedding,
+                top_k=k,
+                include_metadata=True,
+                namespace=namespace,
+                filter=filter
+            )
+            documents = []
+            for match in results["matches"]:
+                metadata = dict(match["metadata"] or {})
+                text = metadata.pop("text", None)
+                if text is not None:
+                    documents.append(Document(id=match["id"], page_content=text, metadata=metadata))
+            return documents
         except Exception as e:
             logger.error(f"Error searching vector store: {str(e)}")
             raise
\ No newline at end of file
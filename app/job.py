@@ -0,0 +1,60 @@
+# app/job.py
+
+import asyncio
+import json
+import os
+import sys
+from typing import Dict, List
+
+from .main import drive_sync, metadata_store, token_storage, vector_store
+from .utils.logger import setup_logger
+from .utils.rate_limiter import BULK, priority_scope
+
+logger = setup_logger(__name__)
+
+async def run_task() -> int:
+    """Process this task's share of the files in a batched job execution
+
+    FILES lists {"file_id", "user_id"} entries; each file is indexed with
+    its user's credentials into its user's namespace. Files whose current
+    revision is already indexed are skipped, so when a failed task is
+    retried only the files that did not complete are processed again.
+    The task exits nonzero only if there is work a retry can redo.
+    """
+    # settings name the index the job was deployed with; a migration may
+    # have switched to another one since, so write where reads go
+    await vector_store.sync_active_index(metadata_store)
+
+    files = json.loads(os.getenv("FILES", "[]"))
+    task_index = int(os.getenv("CLOUD_RUN_TASK_INDEX", "0"))
+    task_count = int(os.getenv("CLOUD_RUN_TASK_COUNT", "1"))
+
+    # tasks take interleaved slices so they stay balanced for any batch size
+    task_files = files[task_index::task_count]
+    logger.info(f"Task {task_index}/{task_count} processing {len(task_files)} files")
+
+    by_user: Dict[str, List[str]] = {}
+    for file in task_files:
+        by_user.setdefault(file["user_id"], []).append(file["file_id"])
+
+    failed = 0
+    # batched backfills yield to interactive work
+    with priority_scope(BULK):
+        for user_id, file_ids in by_user.items():
+            credentials = await token_storage.get_token(user_id)
+            if not credentials:
+                # a retry cannot fix this, the user has to authorize again
+                logger.error(f"No credentials for user {user_id}, skipping {len(file_ids)} files")
+                continue
+            for file_id in file_ids:
+                try:
+                    if not await drive_sync.index_file(user_id, file_id, credentials):
+                        logger.info(f"Skipped {file_id}: already indexed, trashed or unsupported")
+                except Exception as e:
+                    logger.error(f"Failed to process {file_id}: {str(e)}")
+                    failed += 1
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run_task()))
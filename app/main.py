@@ -1,20 +1,29 @@
 # app/main.py
 
 from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, Response
 from pydantic import BaseModel
-from typing import Optional, Dict
+from typing import Literal, Optional, Dict
+import asyncio
 import logging
+import uuid
 
 from .processor.document_processor import DocumentProcessor
 from .database.vector_store import VectorStore
 from .database.metadata_store import MetadataStore
+from .database.checkpoint_store import get_checkpoint_store
 from .processor.context_generator import ContextGenerator
 from .processor.chunk_processor import ChunkProcessor
+from .processor.drive_sync import DriveSync
 from .config.settings import get_settings
 from .auth.google_auth import GoogleDriveAuth
 from .auth.token_storage import TokenStorage
 from .models.auth import TokenData, UserAuth
+from .utils.rate_limiter import INTERACTIVE, RateLimitScheduler, priority_scope
+from .utils.http import HttpTransport
+from .utils.process_pool import CpuPool
+from .utils.profiling import PROFILE_HEADER, REQUEST_ID_HEADER, Profiler, profile_request
+from .utils.metrics import CloudMonitoringExporter, register_cpu_pool, register_scheduler, render_latest
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -31,13 +40,31 @@ app = FastAPI(
 settings = get_settings()
 
 # Initialize components
-vector_store = VectorStore(settings)
+# all LLM and embedding calls share one rate limit scheduler
+scheduler = RateLimitScheduler.from_settings(settings)
+register_scheduler(scheduler)
+# and one set of keep-alive connection pools, as do Drive downloads
+http_transport = HttpTransport.from_settings(settings)
+vector_store = VectorStore(settings, scheduler=scheduler, http_transport=http_transport)
 metadata_store = MetadataStore(settings.PROJECT_ID)
-context_generator = ContextGenerator()
-chunk_processor = ChunkProcessor(
-    chunk_size=settings.CHUNK_SIZE,
-    chunk_overlap=settings.CHUNK_OVERLAP
+context_generator = ContextGenerator(
+    scheduler=scheduler,
+    model=settings.CONTEXT_MODEL,
+    small_model=settings.CONTEXT_SMALL_MODEL,
+    http_transport=http_transport
 )
+chunk_processor = ChunkProcessor.from_settings(settings)
+# extraction, splitting and tokenization run in worker processes so large
+# files do not hold the GIL of the process serving requests
+cpu_pool = CpuPool.from_settings(settings)
+register_cpu_pool(cpu_pool)
+profiler = Profiler.from_settings(settings)
+
+if settings.METRICS_EXPORT_CLOUD_MONITORING:
+    CloudMonitoringExporter(
+        settings.PROJECT_ID,
+        interval=settings.METRICS_EXPORT_INTERVAL
+    ).start()
 
 # Initialize auth components
 google_auth = GoogleDriveAuth(
@@ -53,23 +80,51 @@ document_processor = DocumentProcessor(
     metadata_store=metadata_store,
     context_generator=context_generator,
     chunk_processor=chunk_processor,
-    settings=settings
+    settings=settings,
+    checkpoint_store=get_checkpoint_store(settings),
+    cpu_pool=cpu_pool if cpu_pool.enabled else None,
+    http_transport=http_transport,
+    profiler=profiler
+)
+drive_sync = DriveSync(
+    document_processor=document_processor,
+    metadata_store=metadata_store,
+    vector_store=vector_store
 )
 
+@app.middleware("http")
+async def profile_requested(request: Request, call_next):
+    """Profile the pipeline runs of requests sent with the profile header"""
+    if not (settings.PROFILING_HEADER_ENABLED and request.headers.get(PROFILE_HEADER)):
+        return await call_next(request)
+    request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+    # background tasks of the request run in this context too
+    with profile_request(request_id):
+        response = await call_next(request)
+    response.headers[REQUEST_ID_HEADER] = request_id
+    return response
+
 # Request/Response Models
 class ProcessDocumentRequest(BaseModel):
     file_id: str
     user_id: str
+    # "bulk" for backfills, so they do not hold up interactive requests
+    priority: Literal["interactive", "bulk"] = INTERACTIVE
     
 class ProcessResponse(BaseModel):
     document_id: str
     status: str = "processing"
     
+class SyncRequest(BaseModel):
+    user_id: str
+
 class StatusResponse(BaseModel):
     document_id: str
     status: str
     chunk_count: Optional[int] = None
     error: Optional[str] = None
+    llm_calls_avoided: Optional[int] = None
+    llm_calls_downgraded: Optional[int] = None
 
 # Auth Endpoints
 @app.get("/auth/google")
@@ -107,10 +162,12 @@ async def process_document(request: ProcessDocumentRequest):
         if not credentials:
             raise HTTPException(status_code=401, detail="User not authenticated")
 
-        doc_id = await document_processor.process_file(
-            file_id=request.file_id,
-            credentials=credentials
-        )
+        with priority_scope(request.priority):
+            doc_id = await document_processor.process_file(
+                file_id=request.file_id,
+                credentials=credentials,
+                user_id=request.user_id
+            )
         logger.info(f"Started processing document: {doc_id}")
         return ProcessResponse(document_id=doc_id)
         
@@ -118,6 +175,40 @@ async def process_document(request: ProcessDocumentRequest):
         logger.error(f"Processing Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/sync")
+async def sync_drive(request: SyncRequest, background_tasks: BackgroundTasks):
+    """Index only the files that changed in the user's drive since the last sync"""
+    try:
+        credentials = await token_storage.get_token(request.user_id)
+        if not credentials:
+            raise HTTPException(status_code=401, detail="User not authenticated")
+
+        background_tasks.add_task(drive_sync.sync, request.user_id, credentials)
+        logger.info(f"Started drive sync for user: {request.user_id}")
+        return {"user_id": request.user_id, "status": "syncing"}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Sync Error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/users/{user_id}/index")
+async def delete_user_index(user_id: str):
+    """Remove every chunk indexed for a user (offboarding)
+
+    Their document records are marked deleted too, so a later sync or a
+    repeat of the same content indexes the files again instead of pointing
+    at the deleted chunks.
+    """
+    try:
+        await drive_sync.delete_user(user_id)
+        logger.info(f"Deleted index data for user: {user_id}")
+        return {"user_id": user_id, "status": "deleted"}
+    except Exception as e:
+        logger.error(f"Delete Error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/status/{doc_id}", response_model=StatusResponse)
 async def get_status(doc_id: str):
     """Get document processing status"""
@@ -128,12 +219,69 @@ async def get_status(doc_id: str):
                 status_code=404,
                 detail=f"Document {doc_id} not found"
             )
-        return StatusResponse(**status)
+        processing = status.get('processing', {})
+        return StatusResponse(
+            document_id=doc_id,
+            status=processing.get('status'),
+            chunk_count=processing.get('chunk_count'),
+            error=processing.get('error'),
+            llm_calls_avoided=processing.get('llm_calls_avoided'),
+            llm_calls_downgraded=processing.get('llm_calls_downgraded')
+        )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Status Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/rate-limits")
+async def rate_limits():
+    """Per-provider rate limit and concurrency utilization"""
+    return scheduler.utilization()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics"""
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/admin/profiles")
+async def list_profiles():
+    """Profiled requests, newest first"""
+    return profiler.summary()
+
+@app.get("/admin/profiles/{request_id}")
+async def get_profiles(request_id: str):
+    """CPU and memory profiles of a request, one per profiled run"""
+    reports = profiler.reports(request_id)
+    if reports is None:
+        raise HTTPException(status_code=404, detail="No profile for this request")
+    return reports
+
+async def _poll_active_index():
+    while True:
+        await asyncio.sleep(settings.INDEX_STATE_POLL_INTERVAL)
+        try:
+            await vector_store.sync_active_index(metadata_store)
+        except Exception as e:
+            logger.error(f"Error reading the active vector index: {str(e)}")
+
+@app.on_event("startup")
+async def sync_active_index():
+    """Serve from the index an embedding migration switched to, and follow later switches"""
+    await vector_store.sync_active_index(metadata_store)
+    if settings.INDEX_STATE_POLL_INTERVAL > 0:
+        asyncio.create_task(_poll_active_index())
+
+@app.on_event("shutdown")
+def stop_cpu_pool():
+    cpu_pool.shutdown()
+
+@app.on_event("shutdown")
+async def close_http_transport():
+    await http_transport.aclose()
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
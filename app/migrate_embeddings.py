@@ -0,0 +1,31 @@
+# app/migrate_embeddings.py
+
+import asyncio
+import sys
+
+from .main import metadata_store, settings, vector_store
+from .database.checkpoint_store import get_checkpoint_store
+from .processor.embedding_migration import EmbeddingMigration
+from .utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+async def run_migration() -> int:
+    """Re-embed the active index into EMBEDDING_MIGRATION_TARGET_INDEX and switch reads to it"""
+    # resume from a switch a previous attempt already made
+    await vector_store.sync_active_index(metadata_store)
+    if vector_store.binding.name == settings.EMBEDDING_MIGRATION_TARGET_INDEX:
+        logger.info(f"{vector_store.binding.name} is already the active index")
+        return 0
+    migration = EmbeddingMigration.from_settings(
+        settings,
+        vector_store,
+        metadata_store,
+        checkpoint_store=get_checkpoint_store(settings)
+    )
+    stats = await migration.run()
+    logger.info(f"Embedding migration finished: {stats}")
+    return 0 if stats["switched"] else 1
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run_migration()))
@@ -16,4 +16,9 @@ class DocumentMetadata:
     modified_at: datetime
     status: str = "pending"
     chunk_count: int = 0
-    error: Optional[str] = None
\ No newline at end of file
+    error: Optional[str] = None
+    md5_checksum: Optional[str] = None
+    modified_time: Optional[str] = None
+    head_revision_id: Optional[str] = None
+    namespace: Optional[str] = None
+    user_id: Optional[str] = None
\ No newline at end of file
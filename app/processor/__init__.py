@@ -1,15 +1,20 @@
 # app/processor/__init__.py
 
 from .chunk_processor import ChunkProcessor
-from .context_generator import ContextGenerator
+from .context_generator import ContextGenerator, ContextPolicy
 from .document_processor import DocumentProcessor
 from .embedding_generator import EmbeddingGenerator
 from .bm25_processor import BM25Processor
+from .drive_sync import DriveSync
+from .embedding_migration import EmbeddingMigration
 
 __all__ = [
     'ChunkProcessor',
     'ContextGenerator',
+    'ContextPolicy',
     'DocumentProcessor',
     'EmbeddingGenerator',
-    'BM25Processor'
+    'BM25Processor',
+    'DriveSync',
+    'EmbeddingMigration'
 ]
\ No newline at end of file
@@ -1,38 +1,163 @@
 # app/processor/bm25_processor.py
-from rank_bm25 import BM25Okapi
-from typing import List, Dict, Any
+from array import array
+from collections import Counter
+from typing import List, Dict, Any, Iterable, Optional, Tuple
 import numpy as np
 
+from ..utils.process_pool import CpuPool, TextsRef, resolve_texts
+
+def tokenize(text: str) -> List[str]:
+    return text.lower().split()
+
+def _count_terms(
+    corpus: Iterable[List[str]],
+    vocabulary: Dict[str, int],
+    first_doc: int = 0
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """TERM, DOCUMENT AND FREQUENCY OF EVERY POSTING, AND DOCUMENT LENGTHS"""
+    terms, docs, freqs = array("i"), array("i"), array("i")
+    doc_len = array("i")
+    for doc_id, tokens in enumerate(corpus, first_doc):
+        doc_len.append(len(tokens))
+        for token, freq in Counter(tokens).items():
+            terms.append(vocabulary.setdefault(token, len(vocabulary)))
+            docs.append(doc_id)
+            freqs.append(freq)
+    return tuple(np.frombuffer(a, dtype=np.int32) for a in (terms, docs, freqs, doc_len))
+
+class BM25Index:
+    """
+    BM25 OKAPI SCORES OVER COMPACT POSTINGS
+
+    scores match rank_bm25.BM25Okapi (atire idf floored at epsilon times the
+    average idf), but term frequencies are held as one postings array per
+    term instead of a dict per document, and a query only touches the
+    documents containing its terms. an index is not changed once built,
+    extend and take return new indexes without tokenizing its documents again
+    """
+
+    def __init__(self, corpus: Iterable[List[str]], k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        vocabulary: Dict[str, int] = {}
+        self._finish(vocabulary, *_count_terms(corpus, vocabulary))
+
+    def _finish(self, vocabulary: Dict[str, int], terms: np.ndarray, docs: np.ndarray, freqs: np.ndarray, doc_len: np.ndarray):
+        self.vocabulary = vocabulary
+        self.corpus_size = len(doc_len)
+        self.doc_len = doc_len
+        lengths = doc_len.astype(np.float64)
+        self.avgdl = float(lengths.mean()) if self.corpus_size else 0.0
+
+        # postings sorted by term, term t spans indptr[t]:indptr[t + 1]
+        order = np.argsort(terms, kind="stable")
+        self.doc_ids = docs[order]
+        self.freqs = freqs[order]
+        doc_freq = np.bincount(terms, minlength=len(vocabulary))
+        self.indptr = np.concatenate(([0], np.cumsum(doc_freq)))
+
+        idf = np.log(self.corpus_size - doc_freq + 0.5) - np.log(doc_freq + 0.5)
+        # terms whose documents were all taken out do not count
+        present = doc_freq > 0
+        if present.any():
+            idf[idf < 0] = self.epsilon * idf[present].mean()
+        self.idf = idf
+        # per-document part of the denominator
+        k1 = self.k1
+        self.norm = k1 * (1 - self.b + self.b * lengths / self.avgdl) if self.avgdl else np.full(self.corpus_size, k1)
+
+    def _derived(self, vocabulary: Dict[str, int], *postings: np.ndarray) -> "BM25Index":
+        index = BM25Index.__new__(BM25Index)
+        index.k1, index.b, index.epsilon = self.k1, self.b, self.epsilon
+        index._finish(vocabulary, *postings)
+        return index
+
+    def _posting_terms(self) -> np.ndarray:
+        return np.repeat(np.arange(len(self.vocabulary), dtype=np.int32), np.diff(self.indptr))
+
+    def extend(self, corpus: Iterable[List[str]]) -> "BM25Index":
+        """NEW INDEX WITH corpus APPENDED AFTER THE INDEXED DOCUMENTS"""
+        vocabulary = dict(self.vocabulary)
+        terms, docs, freqs, doc_len = _count_terms(corpus, vocabulary, first_doc=self.corpus_size)
+        return self._derived(
+            vocabulary,
+            np.concatenate((self._posting_terms(), terms)),
+            np.concatenate((self.doc_ids, docs)),
+            np.concatenate((self.freqs, freqs)),
+            np.concatenate((self.doc_len, doc_len))
+        )
+
+    def take(self, keep: np.ndarray) -> "BM25Index":
+        """NEW INDEX OF THE DOCUMENTS WHERE THE BOOLEAN MASK keep IS SET, IN ORDER"""
+        renumbered = (np.cumsum(keep) - 1).astype(np.int32)
+        kept = keep[self.doc_ids]
+        return self._derived(
+            # only extend adds terms, and it copies the vocabulary first
+            self.vocabulary,
+            self._posting_terms()[kept],
+            renumbered[self.doc_ids[kept]],
+            self.freqs[kept],
+            self.doc_len[keep]
+        )
+
+    def get_scores(self, query: List[str]) -> np.ndarray:
+        scores = np.zeros(self.corpus_size)
+        for token in query:
+            term = self.vocabulary.get(token)
+            if term is None:
+                continue
+            start, end = self.indptr[term], self.indptr[term + 1]
+            docs = self.doc_ids[start:end]
+            freqs = self.freqs[start:end]
+            scores[docs] += self.idf[term] * (freqs * (self.k1 + 1) / (freqs + self.norm[docs]))
+        return scores
+
+def _build_bm25(documents: TextsRef) -> BM25Index:
+    """CPU POOL JOB: TOKENIZE DOCUMENTS AND BUILD THE BM25 INDEX"""
+    return BM25Index(tokenize(doc) for doc in resolve_texts(documents))
+
 class BM25Processor:
     def __init__(self):
-        self.bm25 = None
-        self.corpus = None
-        
+        # texts are not kept, results refer to documents by position
+        self.bm25: Optional[BM25Index] = None
+
     def index_documents(self, documents: List[str]):
         """INDEX DOCUMENTS USING BM25"""
-        # tokenize documents
-        tokenized_corpus = [doc.lower().split() for doc in documents]
-        self.corpus = documents
-        self.bm25 = BM25Okapi(tokenized_corpus)
-    
-    def search(self, query: str, k: int = 3) -> List[Dict[str, Any]]:
-        """SEARCH DOCUMENTS USING BM25"""
-        if not self.bm25:
+        self.bm25 = _build_bm25(documents)
+
+    async def build_index(self, documents: List[str], pool: Optional[CpuPool] = None) -> BM25Index:
+        """BM25 INDEX OF documents, TOKENIZED IN A WORKER PROCESS OF pool; THE CURRENT INDEX IS KEPT"""
+        if pool is None:
+            return _build_bm25(documents)
+        shared = pool.share_texts(documents)
+        try:
+            return await pool.run(_build_bm25, shared)
+        finally:
+            pool.release(shared)
+
+    async def aindex_documents(self, documents: List[str], pool: Optional[CpuPool] = None):
+        """INDEX DOCUMENTS USING BM25, TOKENIZING IN A WORKER PROCESS OF pool"""
+        self.bm25 = await self.build_index(documents, pool)
+
+    def get_scores(self, query: str, index: Optional[BM25Index] = None) -> np.ndarray:
+        """BM25 SCORE OF EVERY DOCUMENT OF index, THE CURRENT ONE BY DEFAULT"""
+        index = index or self.bm25
+        if not index:
             raise Exception("no documents indexed")
-            
-        # tokenize query
-        tokenized_query = query.lower().split()
-        
-        # get scores
-        scores = self.bm25.get_scores(tokenized_query)
-        
+        return index.get_scores(tokenize(query))
+
+    def search(self, query: str, k: int = 3) -> List[Dict[str, Any]]:
+        """SEARCH DOCUMENTS USING BM25, RETURNS POSITIONS OF THE TOP k"""
+        scores = self.get_scores(query)
+
         # get top k documents
         top_k = np.argsort(scores)[-k:][::-1]
-        
+
         return [
             {
-                "document": self.corpus[idx],
+                "index": int(idx),
                 "score": scores[idx]
             }
             for idx in top_k
-        ]
\ No newline at end of file
+        ]
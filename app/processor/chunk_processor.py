@@ -1,20 +1,76 @@
 # app/processor/chunk_processor.py
 
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from typing import List
+from typing import Callable, Dict, Iterator, List, Optional, TextIO, Tuple
 from langchain.docstore.document import Document
+from .token_chunker import TokenChunker, tiktoken_counter
+from ..utils.process_pool import CpuPool, TextRef, resolve_text
+
+def _chunk_offsets(splitter: TokenChunker, text: TextRef) -> List[Tuple[int, int]]:
+    """CPU POOL JOB: CHUNK BOUNDARIES OF A TEXT"""
+    return [
+        (start_index, start_index + len(chunk))
+        for start_index, chunk in splitter.iter_chunks(resolve_text(text))
+    ]
 
 class ChunkProcessor:
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
-        self.text_splitter = RecursiveCharacterTextSplitter(
+    def __init__(
+        self,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        tokenizer: Optional[Callable[[str], int]] = None,
+        split_on_headings: bool = True
+    ):
+        # sizes are in tokens with a tokenizer, in characters without one
+        self.text_splitter = TokenChunker(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
-            add_start_index=True,  # tracks position in original document
+            tokenizer=tokenizer,
+            split_on_headings=split_on_headings
+        )
+
+    @classmethod
+    def from_settings(cls, settings) -> "ChunkProcessor":
+        tokenizer = tiktoken_counter(settings.CHUNK_TOKENIZER) if settings.CHUNK_TOKENIZER else None
+        return cls(
+            chunk_size=settings.CHUNK_SIZE,
+            chunk_overlap=settings.CHUNK_OVERLAP,
+            tokenizer=tokenizer
         )
-    
+
+    def iter_chunks(self, document: Document) -> Iterator[Document]:
+        """LAZILY SPLIT A DOCUMENT INTO CHUNKS"""
+        for start_index, text in self.text_splitter.iter_chunks(document.page_content):
+            yield Document(
+                page_content=text,
+                # tracks position in original document
+                metadata={**document.metadata, "start_index": start_index}
+            )
+
+    def iter_stream_chunks(self, stream: TextIO, metadata: Optional[Dict] = None) -> Iterator[Document]:
+        """LAZILY SPLIT A TEXT STREAM INTO CHUNKS"""
+        for start_index, text in self.text_splitter.iter_stream(stream):
+            yield Document(
+                page_content=text,
+                metadata={**(metadata or {}), "start_index": start_index}
+            )
+
+    def chunk_offsets(self, document: Document) -> List[Tuple[int, int]]:
+        """(start, end) OF EACH CHUNK, CHUNKS ARE SLICES OF THE DOCUMENT TEXT"""
+        return _chunk_offsets(self.text_splitter, document.page_content)
+
+    async def achunk_offsets(self, document: Document, pool: Optional[CpuPool] = None) -> List[Tuple[int, int]]:
+        """chunk_offsets IN A WORKER PROCESS OF pool, INLINE WITHOUT ONE"""
+        if pool is None:
+            return self.chunk_offsets(document)
+        text = pool.share_text(document.page_content)
+        try:
+            return await pool.run(_chunk_offsets, self.text_splitter, text)
+        finally:
+            pool.release(text)
+
     async def split_document(self, document: Document) -> List[Document]:
         """SPLIT A DOCUMENT INTO CHUNKS"""
-        return self.text_splitter.split_documents([document])
+        return list(self.iter_chunks(document))
 
     def get_document_text(self, document: Document) -> str:
         """GET FULL TEXT CONTENT FROM DOCUMENT"""
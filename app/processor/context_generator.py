@@ -1,13 +1,113 @@
 # app/processor/context_generator.py
 
+from functools import cached_property
+import anthropic
 from langchain_anthropic import ChatAnthropic
+from langchain_core.language_models import BaseChatModel
+from pydantic import Field
+from typing import Any, Dict, Optional
+from ..utils.http import HttpTransport
+from ..utils.rate_limiter import RateLimitScheduler, ANTHROPIC, estimate_tokens
 
-class ContextGenerator:
-    def __init__(self):
-        self.llm = ChatAnthropic(
-            model="claude-3-5-sonnet-latest",
-            temperature=0,
+class PooledChatAnthropic(ChatAnthropic):
+    """
+    ChatAnthropic SENDING THROUGH THE SHARED HTTP TRANSPORT
+
+    ChatAnthropic builds its anthropic clients on httpx clients of its own,
+    these use the pooled clients of http_transport instead
+    """
+    http_transport: Any = Field(default=None, exclude=True)
+
+    def _pooled_params(self) -> Dict[str, Any]:
+        params = dict(self._client_params)
+        # no timeout given means the transport's timeouts apply
+        if params.get("timeout") is None:
+            params.pop("timeout", None)
+        return params
+
+    @cached_property
+    def _client(self) -> anthropic.Client:
+        return anthropic.Client(**self._pooled_params(), http_client=self.http_transport.sync_client())
+
+    @cached_property
+    def _async_client(self) -> anthropic.AsyncClient:
+        return anthropic.AsyncClient(**self._pooled_params(), http_client=self.http_transport.async_client())
+
+class ContextPolicy:
+    """
+    DECIDES WHICH MODEL, IF ANY, WRITES THE CONTEXT OF A CHUNK
+
+    a document that fits in one chunk needs no context, the chunk already
+    is the document; neither do tiny chunks such as headings and
+    signatures. chunks with little prose and chunks of large documents
+    (whose prompt is dominated by the document) go to the small model
+    """
+    SKIP = "skip"
+    SMALL = "small"
+    FULL = "full"
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        min_chunk_chars: int = 80,
+        small_chunk_chars: int = 300,
+        min_prose_ratio: float = 0.6,
+        small_model_document_chars: int = 200000
+    ):
+        self.enabled = enabled
+        self.min_chunk_chars = min_chunk_chars
+        self.small_chunk_chars = small_chunk_chars
+        self.min_prose_ratio = min_prose_ratio
+        self.small_model_document_chars = small_model_document_chars
+
+    @classmethod
+    def from_settings(cls, settings) -> "ContextPolicy":
+        return cls(
+            enabled=settings.CONTEXT_POLICY_ENABLED,
+            min_chunk_chars=settings.CONTEXT_MIN_CHUNK_CHARS,
+            small_chunk_chars=settings.CONTEXT_SMALL_CHUNK_CHARS,
+            small_model_document_chars=settings.CONTEXT_SMALL_MODEL_DOCUMENT_CHARS
         )
+
+    @staticmethod
+    def prose_ratio(text: str) -> float:
+        """SHARE OF LETTERS AND SPACES, LOW FOR TABLES, NUMBERS AND CODE"""
+        if not text:
+            return 0.0
+        return sum(1 for c in text if c.isalpha() or c == " ") / len(text)
+
+    def decide(self, document_chars: int, total_chunks: int, chunk: str) -> str:
+        if not self.enabled:
+            return self.FULL
+        size = len(chunk.strip())
+        if total_chunks <= 1 or size < self.min_chunk_chars:
+            return self.SKIP
+        if (
+            document_chars >= self.small_model_document_chars
+            or size < self.small_chunk_chars
+            or self.prose_ratio(chunk) < self.min_prose_ratio
+        ):
+            return self.SMALL
+        return self.FULL
+
+class ContextGenerator:
+    # expected size of the succinct context, counted against the token budget
+    CONTEXT_TOKEN_ESTIMATE = 150
+
+    def __init__(
+        self,
+        scheduler: Optional[RateLimitScheduler] = None,
+        llm: Optional[BaseChatModel] = None,
+        small_llm: Optional[BaseChatModel] = None,
+        model: str = "claude-3-5-sonnet-latest",
+        small_model: str = "claude-3-5-haiku-latest",
+        http_transport: Optional[HttpTransport] = None
+    ):
+        self.scheduler = scheduler
+        self.http_transport = http_transport
+        self.llm = llm or self._chat_model(model)
+        # an injected llm serves both tiers unless a small one is given too
+        self.small_llm = small_llm or (llm if llm else self._chat_model(small_model))
         self.context_prompt = """
         <document>
         {doc_content}
@@ -19,13 +119,31 @@ class ContextGenerator:
         please give a short succinct context to situate this chunk within the overall document for the purposes of improving search retrieval of the chunk.
         answer only with the succinct context and nothing else.
         """
-    
-    async def generate_context(self, document_content: str, chunk_content: str) -> str:
+
+    def _chat_model(self, model: str) -> ChatAnthropic:
+        kwargs: Dict[str, Any] = dict(
+            model=model,
+            temperature=0,
+            # retries are handled by the scheduler when there is one
+            max_retries=0 if self.scheduler else 2,
+        )
+        if self.http_transport:
+            return PooledChatAnthropic(http_transport=self.http_transport, **kwargs)
+        return ChatAnthropic(**kwargs)
+
+    async def generate_context(self, document_content: str, chunk_content: str, small: bool = False) -> str:
         """GENERATES CONTEXT FOR A CHUNK USING THE FULL DOCUMENT"""
-        response = await self.llm.ainvoke(
-            self.context_prompt.format(
-                doc_content=document_content,
-                chunk_content=chunk_content
-            )
+        prompt = self.context_prompt.format(
+            doc_content=document_content,
+            chunk_content=chunk_content
         )
-        return response.content
\ No newline at end of file
+        llm = self.small_llm if small else self.llm
+        if self.scheduler:
+            response = await self.scheduler.run(
+                ANTHROPIC,
+                lambda: llm.ainvoke(prompt),
+                tokens=estimate_tokens(prompt) + self.CONTEXT_TOKEN_ESTIMATE
+            )
+        else:
+            response = await llm.ainvoke(prompt)
+        return response.content
@@ -1,68 +1,220 @@
 # app/processor/document_processor.py
 
-from langchain_google_community import GoogleDriveLoader
-from typing import List, Optional, Dict
+from typing import Any, Callable, List, Optional, Dict, Tuple
 from datetime import datetime
 from langchain.docstore.document import Document
-from google.oauth2.credentials import Credentials
+from dataclasses import dataclass, field
+import asyncio
+import hashlib
 import uuid
 import os
 
 from .chunk_processor import ChunkProcessor
-from .context_generator import ContextGenerator
-from ..database.vector_store import VectorStore
+from .context_generator import ContextGenerator, ContextPolicy
+from .extractors import FileExtractor, download_drive_file
+from .near_duplicates import ChunkSignature, NearDuplicateIndex
+from ..database.vector_store import IndexBinding, VectorStore
 from ..database.metadata_store import MetadataStore
+from ..database.checkpoint_store import CheckpointStore
 from ..models.metadata import DocumentMetadata
 from ..config.settings import Settings
+from ..utils.http import HttpTransport
+from ..utils.logger import setup_logger
+from ..utils.process_pool import CpuPool
+from ..utils.profiling import Profiler
+from ..utils.metrics import ProcessingMetrics, CHUNKS_PROCESSED, CONTEXT_DECISIONS, record_cache, span
+
+logger = setup_logger(__name__)
+
+PIPELINE = "process_file"
+
+# end of stream marker passed along the pipeline queues
+_DONE = object()
+
+@dataclass
+class _FileRun:
+    """State the pipeline stages share while processing one file"""
+    doc_id: str
+    file_id: str
+    namespace: str
+    user_id: Optional[str]
+    full_content: str
+    total_chunks: int
+    checkpoint_key: str
+    # checkpointed contexts and stored chunks of a previous attempt
+    contexts: Dict[int, Any]
+    upserted: Dict[int, Any]
+    # drive id of a completed document with the same content
+    repeat_of: Optional[str] = None
+    decisions: Dict[str, int] = field(
+        default_factory=lambda: {ContextPolicy.FULL: 0, ContextPolicy.SMALL: 0, ContextPolicy.SKIP: 0}
+    )
+    duplicates: int = 0
+    embeddings_reused: int = 0
+    # index and embedding model the whole run writes to, even if the
+    # store switches index while it is in flight
+    binding: Optional[IndexBinding] = None
+
+class _Chunk:
+    """A chunk moving through the pipeline"""
+    __slots__ = ("index", "document", "signature", "reuse_id", "reuse_text", "vector")
+
+    def __init__(self, index: int, document: Document):
+        self.index = index
+        self.document = document
+        self.signature: Optional[ChunkSignature] = None
+        # stored chunk whose embedding (and, with reuse_text, text) is reused
+        self.reuse_id: Optional[str] = None
+        self.reuse_text = False
+        self.vector: Optional[List[float]] = None
+
+async def _run_stages(*stages):
+    """Run coroutines concurrently; if one fails the others are cancelled"""
+    tasks = [asyncio.ensure_future(stage) for stage in stages]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            if task.exception():
+                raise task.exception()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
 class DocumentProcessor:
+    EMBEDDING_BATCH_SIZE = 64
+
     def __init__(
         self,
         vector_store: VectorStore,
         metadata_store: MetadataStore,
         context_generator: ContextGenerator,
         chunk_processor: ChunkProcessor,
-        settings: Settings
+        settings: Settings,
+        checkpoint_store: Optional[CheckpointStore] = None,
+        loader_factory: Optional[Callable[[Dict, str], Any]] = None,
+        context_policy: Optional[ContextPolicy] = None,
+        duplicate_index: Optional[NearDuplicateIndex] = None,
+        cpu_pool: Optional[CpuPool] = None,
+        http_transport: Optional[HttpTransport] = None,
+        profiler: Optional[Profiler] = None
     ):
         self.vector_store = vector_store
         self.metadata_store = metadata_store
         self.context_generator = context_generator
         self.chunk_processor = chunk_processor
         self.settings = settings
+        # the base store keeps nothing, i.e. checkpointing disabled
+        self.checkpoint_store = checkpoint_store or CheckpointStore()
+        self.context_policy = context_policy or ContextPolicy.from_settings(settings)
+        # chunks stored by this process, for reusing the work of duplicates
+        if duplicate_index is None and settings.DEDUP_ENABLED:
+            duplicate_index = NearDuplicateIndex.from_settings(settings)
+        self.duplicate_index = duplicate_index
+        self.queue_size = settings.PIPELINE_QUEUE_SIZE
+        self.context_workers = settings.PIPELINE_CONTEXT_WORKERS
+        # builds a loader for (credentials, file_id); None downloads from
+        # Drive and extracts text by MIME type
+        self.loader_factory = loader_factory
+        # extraction and splitting run in its worker processes when given
+        self.cpu_pool = cpu_pool
+        self.extractor = FileExtractor(cpu_pool)
+        # Drive downloads reuse its pooled connections when given
+        self.http_transport = http_transport
+        # profiles requests that ask for it, and a sample of the rest
+        self.profiler = profiler or Profiler.from_settings(settings)
 
-    def _initialize_loader(self, credentials: Dict, file_id: str) -> GoogleDriveLoader:
-        """Initialize loader with OAuth credentials and file ID"""
-        try:
-            creds = Credentials.from_authorized_user_info(credentials)
-            return GoogleDriveLoader(
-                credentials=creds,
-                file_ids=[file_id],
-                recursive=False
-            )
-        except Exception as e:
-            raise Exception(f"Failed to initialize loader: {str(e)}")
+    async def _load(self, credentials: Dict, file_id: str) -> List[Document]:
+        """Download a file and extract its text off the event loop
+
+        Native Google Docs are exported as plain text; PDF and DOCX files
+        are parsed by the extractor for their MIME type, in CPU pool
+        workers when there is a pool. Custom loaders run in a thread.
+        """
+        if self.loader_factory is not None:
+            return await asyncio.to_thread(lambda: self.loader_factory(credentials, file_id).load())
+        file, data = await asyncio.to_thread(
+            download_drive_file, credentials, file_id, self.http_transport
+        )
+        mime_type = file.get('mimeType')
+        if not self.extractor.supports(mime_type):
+            raise Exception(f"Unsupported file type: {mime_type}")
+        text = await self.extractor.extract(mime_type, data)
+        return [Document(
+            page_content=text,
+            metadata={
+                "source": file.get('webViewLink') or f"https://drive.google.com/file/d/{file_id}/view",
+                "title": file.get('name', ''),
+                "mime_type": mime_type,
+                # native docs have no stored size
+                "size": int(file.get('size') or len(data)),
+            }
+        )]
+
+    async def process_file(
+        self,
+        file_id: str,
+        credentials: Dict,
+        file_info: Optional[Dict] = None,
+        user_id: Optional[str] = None
+    ) -> str:
+        """Process a single file
+
+        file_info is the Drive file resource (as returned by files.get or the
+        Changes API); when given, its revision fields are recorded so that
+        unchanged files can be skipped by the incremental sync. Chunks are
+        stored in the namespace of user_id.
 
-    async def process_file(self, file_id: str, credentials: Dict) -> str:
-        """Process a single file"""
+        Chunks stream through split -> contextualize -> embed -> upsert
+        stages connected by bounded queues and are stored batch by batch,
+        so memory grows with PIPELINE_QUEUE_SIZE rather than with the
+        number of chunks. Stored chunks are checkpointed; a retry after a
+        failure only processes the rest.
+        """
+        with self.profiler.session(PIPELINE, file_id=file_id):
+            return await self._process_file(file_id, credentials, file_info, user_id)
+
+    async def _process_file(
+        self,
+        file_id: str,
+        credentials: Dict,
+        file_info: Optional[Dict],
+        user_id: Optional[str]
+    ) -> str:
         metadata = None
+        previous_chunk_count = 0
+        processing_metrics = ProcessingMetrics()
+        processing_metrics.start_processing()
+        namespace = self.vector_store.namespace_for(user_id)
         try:
-            # Create metadata entry
+            existing = await self.metadata_store.get_by_drive_id(file_id, namespace=namespace)
+
+            # Create metadata entry; a Drive file that was indexed before in
+            # this namespace is re-indexed in place under its existing
+            # document ID, other users sharing the file have their own
             metadata = DocumentMetadata(
-                document_id=str(uuid.uuid4()),
+                document_id=existing['document_id'] if existing else str(uuid.uuid4()),
                 original_file_name=file_id,
                 drive_id=file_id,
                 drive_path="",
                 file_size=0,
                 created_at=datetime.utcnow(),
                 modified_at=datetime.utcnow(),
-                status="processing"
+                status="processing",
+                namespace=namespace,
+                user_id=user_id
             )
-            
-            doc_id = await self.metadata_store.create(metadata)
+
+            if existing:
+                doc_id = metadata.document_id
+                previous_chunk_count = existing.get('processing', {}).get('chunk_count') or 0
+                await self.metadata_store.update_status(doc_id=doc_id, status="processing")
+            else:
+                doc_id = await self.metadata_store.create(metadata)
 
             # Initialize loader and load document
-            loader = self._initialize_loader(credentials, file_id)
-            documents = loader.load()
+            with span(PIPELINE, "download"):
+                documents = await self._load(credentials, file_id)
             
             if not documents:
                 raise Exception(f"No document found with ID: {file_id}")
@@ -81,54 +233,102 @@ class DocumentProcessor:
             # Get full document content for context
             full_content = self.chunk_processor.get_document_text(document)
 
-            # Split into chunks
-            chunks = await self.chunk_processor.split_document(document)
+            # Chunk boundaries only; chunk texts are sliced from the document
+            # as they enter the pipeline
+            with span(PIPELINE, "split"):
+                offsets = await self.chunk_processor.achunk_offsets(document, pool=self.cpu_pool)
+            total_chunks = len(offsets)
+            if not total_chunks:
+                raise Exception("No chunks were successfully processed")
 
-            # Generate context and store chunks
-            processed_chunks = []
-            for i, chunk in enumerate(chunks):
-                try:
-                    # Generate context
-                    context = await self.context_generator.generate_context(
-                        document_content=full_content,
-                        chunk_content=chunk.page_content
-                    )
-                    
-                    # Combine context with chunk
-                    contextualized_chunk = Document(
-                        page_content=f"{context}\n\n{chunk.page_content}",
-                        metadata={
-                            **chunk.metadata,
-                            "document_id": doc_id,
-                            "drive_id": file_id,
-                            "context_generated": True,
-                            "chunk_index": i,
-                            "total_chunks": len(chunks),
-                            "processed_at": datetime.utcnow().isoformat()
-                        }
-                    )
-                    processed_chunks.append(contextualized_chunk)
-                
-                except Exception as chunk_error:
-                    print(f"Error processing chunk {i}: {str(chunk_error)}")
-                    continue
+            # Work already done by a previous attempt on this revision
+            with span(PIPELINE, "checkpoint_load"):
+                checkpoint_key = self.checkpoint_store.make_key(file_id, full_content)
+                run = _FileRun(
+                    doc_id=doc_id,
+                    file_id=file_id,
+                    namespace=namespace,
+                    user_id=user_id,
+                    full_content=full_content,
+                    total_chunks=total_chunks,
+                    checkpoint_key=checkpoint_key,
+                    contexts=await self.checkpoint_store.load(checkpoint_key, "context"),
+                    upserted=await self.checkpoint_store.load(checkpoint_key, "upserted"),
+                    binding=self.vector_store.binding
+                )
+            record_cache("checkpoint_context", len(run.contexts), total_chunks - len(run.contexts))
+            record_cache("checkpoint_upsert", len(run.upserted), total_chunks - len(run.upserted))
+            if run.contexts or run.upserted:
+                logger.info(
+                    f"Resuming {file_id}: {len(run.upserted)} of {total_chunks} chunks "
+                    f"already stored, {len(run.contexts)} contexts checkpointed"
+                )
 
-            if not processed_chunks:
-                raise Exception("No chunks were successfully processed")
+            # A completed copy of the same content lends its contexts and
+            # embeddings chunk for chunk
+            content_hash = hashlib.sha256(full_content.encode("utf-8")).hexdigest()
+            if self.duplicate_index is not None:
+                repeat = await self.metadata_store.get_by_content_hash(content_hash, namespace)
+                # a re-run of the same file would reuse the chunks it replaces
+                if (
+                    repeat
+                    and repeat['original_file']['drive_id'] != file_id
+                    and repeat.get('processing', {}).get('chunk_count') == total_chunks
+                ):
+                    run.repeat_of = repeat['original_file']['drive_id']
+                    logger.info(f"{file_id} repeats {run.repeat_of}, reusing its chunks")
+
+            # split -> contextualize -> embed -> upsert over bounded queues,
+            # so only about PIPELINE_QUEUE_SIZE chunks are held at a time
+            context_queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+            embed_queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+            upsert_queue: asyncio.Queue = asyncio.Queue(1)
+            await _run_stages(
+                self._split_stage(run, document, offsets, context_queue),
+                self._context_stage(run, context_queue, embed_queue),
+                self._embed_stage(run, embed_queue, upsert_queue),
+                self._upsert_stage(run, upsert_queue),
+            )
+
+            # Drop chunks left over from a longer previous revision
+            with span(PIPELINE, "upsert"):
+                await self.vector_store.delete_chunks(
+                    file_id, total_chunks, previous_chunk_count, namespace=namespace, binding=run.binding
+                )
+            if self.duplicate_index is not None:
+                for i in range(total_chunks, previous_chunk_count):
+                    self.duplicate_index.remove(namespace, self.vector_store.chunk_id(file_id, i))
 
-            # Store in vector database
-            await self.vector_store.add_documents(processed_chunks)
+            if file_info:
+                await self.metadata_store.update_revision(
+                    doc_id=doc_id,
+                    md5_checksum=file_info.get('md5Checksum'),
+                    modified_time=file_info.get('modifiedTime'),
+                    head_revision_id=file_info.get('headRevisionId')
+                )
 
             # Update metadata with success status
             await self.metadata_store.update_status(
                 doc_id=doc_id,
                 status="completed",
-                chunk_count=len(processed_chunks)
+                chunk_count=total_chunks,
+                llm_calls_avoided=run.decisions[ContextPolicy.SKIP] + run.duplicates,
+                llm_calls_downgraded=run.decisions[ContextPolicy.SMALL],
+                embeddings_reused=run.embeddings_reused
+            )
+            await self.metadata_store.update_content(
+                doc_id=doc_id,
+                content_hash=content_hash,
+                namespace=namespace,
+                user_id=user_id
             )
+            await self.checkpoint_store.clear(checkpoint_key)
 
+            processing_metrics.end_processing(doc_id, success=True)
             return doc_id
 
         except Exception as e:
+            processing_metrics.end_processing(file_id, success=False)
             # Update metadata with error status
             if metadata and metadata.document_id:
                 await self.metadata_store.update_status(
@@ -138,6 +338,196 @@ class DocumentProcessor:
                 )
             raise Exception(f"Document processing failed: {str(e)}")
 
+    async def _split_stage(
+        self,
+        run: "_FileRun",
+        document: Document,
+        offsets: List[Tuple[int, int]],
+        output: asyncio.Queue
+    ):
+        """Feed chunks that are not stored yet into the pipeline"""
+        text = document.page_content
+        base_metadata = dict(document.metadata)
+        if run.user_id:
+            # lets searches filter by tenant when namespaces are shared
+            base_metadata["user_id"] = run.user_id
+        for i, (start, end) in enumerate(offsets):
+            if i in run.upserted:
+                continue
+            chunk = Document(
+                page_content=text[start:end],
+                metadata={**base_metadata, "start_index": start}
+            )
+            await output.put(_Chunk(i, chunk))
+        for _ in range(self.context_workers):
+            await output.put(_DONE)
+
+    def _find_duplicate(self, run: "_FileRun", item: "_Chunk"):
+        """Point the chunk at a stored chunk whose work it can reuse"""
+        if run.repeat_of:
+            item.reuse_id = self.vector_store.chunk_id(run.repeat_of, item.index)
+            item.reuse_text = True
+            return
+        item.signature = self.duplicate_index.signature(item.document.page_content)
+        match = self.duplicate_index.find(run.namespace, item.signature)
+        # chunks of this file are about to be overwritten, never reuse them
+        if match and not match.vector_id.startswith(f"{run.file_id}#"):
+            item.reuse_id = match.vector_id
+
+    async def _context_stage(self, run: "_FileRun", queue: asyncio.Queue, output: asyncio.Queue):
+        """Contextualize chunks with PIPELINE_CONTEXT_WORKERS concurrent calls
+
+        Duplicates of stored chunks reuse their work and need no context.
+        """
+        async def worker():
+            while True:
+                item = await queue.get()
+                if item is _DONE:
+                    return
+                if self.duplicate_index is not None:
+                    self._find_duplicate(run, item)
+                if item.reuse_id:
+                    run.duplicates += 1
+                else:
+                    await self._contextualize(run, item)
+                await output.put(item)
+
+        await _run_stages(*(worker() for _ in range(self.context_workers)))
+        await output.put(_DONE)
+
+    async def _contextualize(self, run: "_FileRun", item: "_Chunk"):
+        """Prefix a chunk with its context
+
+        The context policy decides per chunk whether the full model, the
+        small model or no model writes it.
+        """
+        i, chunk = item.index, item.document
+        decision = self.context_policy.decide(len(run.full_content), run.total_chunks, chunk.page_content)
+        if decision == ContextPolicy.SKIP:
+            context = None
+        elif i in run.contexts:
+            context = run.contexts.pop(i)
+        else:
+            try:
+                with span(PIPELINE, "context"):
+                    context = await self.context_generator.generate_context(
+                        document_content=run.full_content,
+                        chunk_content=chunk.page_content,
+                        small=decision == ContextPolicy.SMALL
+                    )
+            except Exception as chunk_error:
+                # Transient provider errors were already retried by the
+                # scheduler; stop the document, a retry resumes from the
+                # chunks already stored
+                raise Exception(f"Error processing chunk {i}: {str(chunk_error)}")
+            await self.checkpoint_store.save(run.checkpoint_key, "context", i, context)
+        run.decisions[decision] += 1
+        CONTEXT_DECISIONS.labels(decision).inc()
+
+        # Combine context with chunk
+        if context:
+            chunk.page_content = f"{context}\n\n{chunk.page_content}"
+        chunk.metadata["context_generated"] = bool(context)
+
+    async def _reuse_embeddings(self, run: "_FileRun", batch: List["_Chunk"]) -> List["_Chunk"]:
+        """Take vectors (and for repeats, text) from stored chunks; returns the misses"""
+        reusing = [item for item in batch if item.reuse_id]
+        if not reusing:
+            return batch
+        with span(PIPELINE, "reuse"):
+            stored = await self.vector_store.fetch(
+                [item.reuse_id for item in reusing], namespace=run.namespace, binding=run.binding
+            )
+        for item in reusing:
+            found = stored.get(item.reuse_id)
+            if found is None:
+                # deleted since it was indexed, process this chunk itself
+                if not item.reuse_text:
+                    self.duplicate_index.remove(run.namespace, item.reuse_id)
+                item.reuse_id = None
+                item.reuse_text = False
+                run.duplicates -= 1
+                await self._contextualize(run, item)
+                continue
+            run.contexts.pop(item.index, None)
+            item.vector, source_metadata = found
+            if item.reuse_text:
+                item.document.page_content = source_metadata.get("text", item.document.page_content)
+            item.document.metadata["context_generated"] = item.reuse_text and bool(
+                source_metadata.get("context_generated")
+            )
+            item.document.metadata["duplicate_of"] = item.reuse_id
+            item.document.metadata["duplicate_cluster"] = source_metadata.get("duplicate_cluster", item.reuse_id)
+        hits = sum(1 for item in reusing if item.vector is not None)
+        run.embeddings_reused += hits
+        record_cache("near_duplicate", hits, len(reusing) - hits)
+        return [item for item in batch if item.vector is None]
+
+    async def _embed_stage(self, run: "_FileRun", queue: asyncio.Queue, output: asyncio.Queue):
+        """Embed contextualized chunks in batches of up to EMBEDDING_BATCH_SIZE"""
+        # a batch never holds more chunks than a queue does
+        batch_size = min(self.EMBEDDING_BATCH_SIZE, self.queue_size)
+        finished = False
+        while not finished:
+            batch = []
+            while len(batch) < batch_size:
+                item = await queue.get()
+                if item is _DONE:
+                    finished = True
+                    break
+                batch.append(item)
+            if not batch:
+                break
+            pending = await self._reuse_embeddings(run, batch)
+            if pending:
+                with span(PIPELINE, "embed"):
+                    vectors = await self.vector_store.embed_documents(
+                        [item.document.page_content for item in pending], binding=run.binding
+                    )
+                for item, vector in zip(pending, vectors):
+                    item.vector = vector
+            await output.put(batch)
+        await output.put(_DONE)
+
+    async def _upsert_stage(self, run: "_FileRun", queue: asyncio.Queue):
+        """Store embedded batches and mark their chunks done"""
+        while True:
+            batch = await queue.get()
+            if batch is _DONE:
+                return
+            documents = []
+            for item in batch:
+                item.document.metadata.update({
+                    "document_id": run.doc_id,
+                    "drive_id": run.file_id,
+                    "chunk_index": item.index,
+                    "total_chunks": run.total_chunks,
+                    "processed_at": datetime.utcnow().isoformat()
+                })
+                documents.append(item.document)
+            # ids are deterministic so a re-index overwrites the previous
+            # chunks in place
+            ids = [self.vector_store.chunk_id(run.file_id, item.index) for item in batch]
+            with span(PIPELINE, "upsert"):
+                await self.vector_store.add_embeddings(
+                    documents,
+                    [item.vector for item in batch],
+                    ids=ids,
+                    namespace=run.namespace,
+                    binding=run.binding
+                )
+            # one checkpoint write for the whole batch
+            await self.checkpoint_store.save_many(
+                run.checkpoint_key, "upserted", {item.index: True for item in batch}
+            )
+            for vector_id, item in zip(ids, batch):
+                if item.signature is not None:
+                    self.duplicate_index.add(
+                        run.namespace, vector_id, item.signature,
+                        cluster=item.document.metadata.get("duplicate_cluster")
+                    )
+            CHUNKS_PROCESSED.inc(len(batch))
+
     async def get_processing_status(self, doc_id: str) -> dict:
         """Get current processing status of a document"""
         return await self.metadata_store.get_document(doc_id)
\ No newline at end of file
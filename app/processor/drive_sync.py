@@ -0,0 +1,232 @@
+# app/processor/drive_sync.py
+
+import asyncio
+from typing import Dict, Optional, Tuple
+
+from .document_processor import DocumentProcessor
+from .extractors import build_drive_service
+from ..database.vector_store import VectorStore
+from ..database.metadata_store import MetadataStore
+from ..cloud_function.utils import is_supported_file_type
+from ..utils.logger import setup_logger
+from ..utils.rate_limiter import BULK, priority_scope
+
+logger = setup_logger(__name__)
+
+# drive revision fields compared against what the metadata store recorded
+REVISION_FIELDS = {
+    'md5Checksum': 'md5_checksum',
+    'modifiedTime': 'modified_time',
+    'headRevisionId': 'head_revision_id',
+}
+# sync passes that retry a failed change before it is dropped
+MAX_CHANGE_ATTEMPTS = 5
+
+class DriveSync:
+    """
+    INCREMENTAL SYNC OF A USER'S DRIVE THROUGH THE DRIVE CHANGES API
+
+    polls changes from the page token stored for the user, collapses repeated
+    changes to the same file into one, skips files whose revision has already
+    been indexed and purges vectors of deleted or trashed files
+    """
+
+    FILE_FIELDS = "id,name,mimeType,size,trashed,md5Checksum,modifiedTime,headRevisionId"
+    CHANGE_FIELDS = f"nextPageToken,newStartPageToken,changes(fileId,removed,file({FILE_FIELDS}))"
+
+    def __init__(
+        self,
+        document_processor: DocumentProcessor,
+        metadata_store: MetadataStore,
+        vector_store: VectorStore,
+        page_size: int = 1000
+    ):
+        self.document_processor = document_processor
+        self.metadata_store = metadata_store
+        self.vector_store = vector_store
+        self.page_size = page_size
+
+    def _build_service(self, credentials: Dict):
+        """BUILD A DRIVE V3 SERVICE FROM OAUTH CREDENTIALS"""
+        return build_drive_service(credentials, self.document_processor.http_transport)
+
+    async def _start_page_token(self, service) -> str:
+        """GET THE CURRENT HEAD OF THE CHANGE LOG"""
+        response = await asyncio.to_thread(
+            service.changes().getStartPageToken().execute
+        )
+        return response['startPageToken']
+
+    async def _list_changes(self, service, page_token: str) -> Tuple[Dict[str, Dict], str]:
+        """
+        READ ALL CHANGES SINCE page_token
+
+        returns the latest change per file id and the token to resume from
+        """
+        latest: Dict[str, Dict] = {}
+        while True:
+            response = await asyncio.to_thread(
+                service.changes().list(
+                    pageToken=page_token,
+                    pageSize=self.page_size,
+                    includeRemoved=True,
+                    spaces='drive',
+                    fields=self.CHANGE_FIELDS
+                ).execute
+            )
+            for change in response.get('changes', []):
+                file_id = change.get('fileId')
+                if file_id:
+                    # changes are returned oldest first, so the last one wins
+                    latest[file_id] = change
+            if 'newStartPageToken' in response:
+                return latest, response['newStartPageToken']
+            page_token = response['nextPageToken']
+
+    @staticmethod
+    def is_unchanged(record: Optional[Dict], file: Dict) -> bool:
+        """CHECK IF A FILE'S REVISION MATCHES THE ONE ALREADY INDEXED"""
+        if not record or record.get('processing', {}).get('status') != 'completed':
+            return False
+        original = record.get('original_file', {})
+        return all(
+            original.get(stored_key) == file.get(drive_key)
+            for drive_key, stored_key in REVISION_FIELDS.items()
+        )
+
+    async def _purge(self, file_id: str, record: Optional[Dict], user_id: Optional[str] = None):
+        """REMOVE A DELETED OR TRASHED FILE FROM THE INDEX"""
+        # the chunks are where the file was indexed, which need not be the
+        # namespace of the user whose change log reported the removal
+        namespace = (record or {}).get('processing', {}).get('namespace') or self.vector_store.namespace_for(user_id)
+        await self.vector_store.delete_file(file_id, namespace=namespace)
+        if record:
+            await self.metadata_store.update_status(
+                doc_id=record['document_id'],
+                status="deleted",
+                chunk_count=0
+            )
+
+    async def index_file(self, user_id: str, file_id: str, credentials: Dict) -> bool:
+        """
+        INDEX ONE FILE UNLESS ITS CURRENT REVISION IS ALREADY INDEXED
+
+        returns whether the file was processed. the revision is recorded, so
+        a retried batch skips the files an earlier attempt completed
+        """
+        service = self._build_service(credentials)
+        file = await asyncio.to_thread(
+            service.files().get(fileId=file_id, fields=self.FILE_FIELDS, supportsAllDrives=True).execute
+        )
+        record = await self.metadata_store.get_by_drive_id(file_id, self.vector_store.namespace_for(user_id))
+        if file.get('trashed') or not is_supported_file_type(file.get('mimeType')) or self.is_unchanged(record, file):
+            return False
+        await self.document_processor.process_file(
+            file_id=file_id,
+            credentials=credentials,
+            file_info=file,
+            user_id=user_id
+        )
+        return True
+
+    async def delete_user(self, user_id: str) -> int:
+        """
+        REMOVE A USER'S CHUNKS AND MARK THEIR DOCUMENTS DELETED (OFFBOARDING)
+
+        returns the number of document records marked; a later sync indexes
+        their files again instead of skipping them as unchanged
+        """
+        if self.vector_store.per_user_namespaces:
+            await self.vector_store.delete_user(user_id)
+            namespace = self.vector_store.namespace_for(user_id)
+        else:
+            # the shared namespace is purged file by file, the records say which
+            drive_ids = await self.metadata_store.get_user_drive_ids(user_id, self.vector_store.namespace)
+            await self.vector_store.delete_user(user_id, drive_ids=drive_ids)
+            namespace = None
+        return await self.metadata_store.mark_user_deleted(user_id, namespace=namespace)
+
+    async def sync(self, user_id: str, credentials: Dict) -> Dict[str, int]:
+        """
+        RUN ONE INCREMENTAL SYNC PASS FOR A USER
+
+        the first pass only records the current change log head; files that
+        existed before it are indexed through /process. sync work runs in
+        the bulk priority class, behind interactive /process calls
+        """
+        with priority_scope(BULK):
+            return await self._sync(user_id, credentials)
+
+    async def _sync(self, user_id: str, credentials: Dict) -> Dict[str, int]:
+        service = self._build_service(credentials)
+        stats = {"changes": 0, "processed": 0, "skipped": 0, "deleted": 0, "failed": 0}
+
+        page_token = await self.metadata_store.get_sync_token(user_id)
+        if not page_token:
+            page_token = await self._start_page_token(service)
+            await self.metadata_store.save_sync_token(user_id, page_token)
+            logger.info(f"Initialized drive sync for user {user_id}")
+            return stats
+
+        listed, next_token = await self._list_changes(service, page_token)
+        # changes that failed on earlier passes are retried, unless the file
+        # changed again since
+        changes = {
+            change['fileId']: change
+            for change in await self.metadata_store.get_failed_changes(user_id)
+        }
+        changes.update(listed)
+        stats["changes"] = len(changes)
+        failed_changes = []
+        namespace = self.vector_store.namespace_for(user_id)
+
+        for file_id, change in changes.items():
+            file = change.get('file') or {}
+            try:
+                if change.get('removed') or file.get('trashed'):
+                    # the user's own record, in whichever namespace it was
+                    # indexed; records from before users were recorded are
+                    # found by namespace
+                    record = (
+                        await self.metadata_store.get_by_drive_id(file_id, user_id=user_id) or
+                        await self.metadata_store.get_by_drive_id(file_id, namespace)
+                    )
+                    if record and record.get('processing', {}).get('user_id') not in (None, user_id):
+                        # another user's copy of a file shared with this one
+                        record = None
+                    if record:
+                        await self._purge(file_id, record, user_id)
+                        stats["deleted"] += 1
+                    else:
+                        stats["skipped"] += 1
+                    continue
+
+                record = await self.metadata_store.get_by_drive_id(file_id, namespace)
+                if not is_supported_file_type(file.get('mimeType')) or self.is_unchanged(record, file):
+                    stats["skipped"] += 1
+                    continue
+
+                await self.document_processor.process_file(
+                    file_id=file_id,
+                    credentials=credentials,
+                    file_info=file,
+                    user_id=user_id
+                )
+                stats["processed"] += 1
+
+            except Exception as e:
+                # process_file records the failure on the document; keep going
+                logger.error(f"Drive sync failed for file {file_id}: {str(e)}")
+                stats["failed"] += 1
+                attempts = change.get('attempts', 0) + 1
+                if attempts < MAX_CHANGE_ATTEMPTS:
+                    failed_changes.append({**change, 'attempts': attempts})
+                else:
+                    logger.error(f"Giving up on file {file_id} after {attempts} sync attempts")
+
+        # checkpoint only after the whole delta was handled, a pass that dies
+        # is replayed and unchanged files are skipped on the retry; changes
+        # that failed are stored with the token and retried on the next pass
+        await self.metadata_store.save_sync_token(user_id, next_token, failed_changes)
+        logger.info(f"Drive sync for user {user_id}: {stats}")
+        return stats
@@ -1,14 +1,30 @@
 # app/processor/embedding_generator.py
 
-from langchain_openai import OpenAIEmbeddings
-from typing import List, Any
+from langchain_core.embeddings import Embeddings
+from typing import List, Any, Optional
+from ..database.embeddings import DEFAULT_EMBEDDING_MODEL, ScheduledEmbeddings, openai_embeddings
+from ..utils.http import HttpTransport
+from ..utils.rate_limiter import RateLimitScheduler
 
 class EmbeddingGenerator:
-    def __init__(self, api_key: str):
-        self.embeddings = OpenAIEmbeddings(
-            model="text-embedding-3-large",
-            openai_api_key=api_key
+    def __init__(
+        self,
+        api_key: str,
+        scheduler: Optional[RateLimitScheduler] = None,
+        embeddings: Optional[Embeddings] = None,
+        http_transport: Optional[HttpTransport] = None,
+        model: str = DEFAULT_EMBEDDING_MODEL,
+        dimension: Optional[int] = None
+    ):
+        self.embeddings = embeddings or openai_embeddings(
+            api_key,
+            model,
+            dimension,
+            http_transport,
+            max_retries=0 if scheduler else 2
         )
+        if scheduler:
+            self.embeddings = ScheduledEmbeddings(self.embeddings, scheduler)
     
     async def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
         """GENERATE EMBEDDINGS FOR A LIST OF TEXTS"""
@@ -0,0 +1,273 @@
+# app/processor/embedding_migration.py
+
+import asyncio
+import random
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from ..database.checkpoint_store import CheckpointStore
+from ..database.metadata_store import MetadataStore
+from ..database.vector_store import IndexBinding, VectorStore
+from ..utils.logger import setup_logger
+from ..utils.rate_limiter import BULK, TokenBucket, priority_scope
+
+logger = setup_logger(__name__)
+
+class EmbeddingMigration:
+    """
+    RE-EMBEDS THE STORED CHUNK TEXTS INTO ANOTHER PINECONE INDEX
+
+    chunks keep their contextualized text in the "text" metadata, so a new
+    embedding model or dimension needs no download, extraction or LLM call:
+    each namespace of the current index is listed page by page and every
+    page is fetched, re-embedded with the target model and upserted into
+    the target index under the same ids and metadata. pages are throttled
+    to vectors_per_minute, run at bulk priority and are checkpointed, so a
+    restarted job resumes after the last copied page. reads stay on the
+    current index until the target returns the same neighbours for sampled
+    chunk texts (mean recall@recall_k >= min_recall); the switch is then
+    recorded for the other instances and applied to vector_store at once
+    """
+
+    def __init__(
+        self,
+        vector_store: VectorStore,
+        metadata_store: MetadataStore,
+        target: IndexBinding,
+        checkpoint_store: Optional[CheckpointStore] = None,
+        vectors_per_minute: float = 20000,
+        batch_size: int = 100,
+        recall_k: int = 10,
+        recall_samples: int = 50,
+        min_recall: float = 0.9,
+        settle_seconds: float = 0.0,
+        seed: Optional[int] = None
+    ):
+        self.vector_store = vector_store
+        self.metadata_store = metadata_store
+        self.target = target
+        self.checkpoint_store = checkpoint_store or CheckpointStore()
+        self.batch_size = batch_size
+        self.bucket = TokenBucket(vectors_per_minute, capacity=batch_size)
+        self.recall_k = recall_k
+        self.recall_samples = recall_samples
+        self.min_recall = min_recall
+        self.settle_seconds = settle_seconds
+        self.random = random.Random(seed)
+        self.checkpoint_key = f"embedding_migration_{target.name}"
+
+    @classmethod
+    def from_settings(
+        cls,
+        settings,
+        vector_store: VectorStore,
+        metadata_store: MetadataStore,
+        checkpoint_store: Optional[CheckpointStore] = None
+    ) -> "EmbeddingMigration":
+        """MIGRATION TO THE EMBEDDING_MIGRATION_TARGET_* INDEX AND MODEL"""
+        if not settings.EMBEDDING_MIGRATION_TARGET_INDEX:
+            raise ValueError("EMBEDDING_MIGRATION_TARGET_INDEX is not set")
+        target = vector_store.bind(
+            settings.EMBEDDING_MIGRATION_TARGET_INDEX,
+            settings.EMBEDDING_MIGRATION_TARGET_MODEL,
+            settings.EMBEDDING_MIGRATION_TARGET_DIMENSION
+        )
+        return cls(
+            vector_store,
+            metadata_store,
+            target,
+            checkpoint_store=checkpoint_store,
+            vectors_per_minute=settings.EMBEDDING_MIGRATION_VECTORS_PER_MINUTE,
+            batch_size=settings.EMBEDDING_MIGRATION_BATCH_SIZE,
+            recall_k=settings.EMBEDDING_MIGRATION_RECALL_K,
+            recall_samples=settings.EMBEDDING_MIGRATION_RECALL_SAMPLES,
+            min_recall=settings.EMBEDDING_MIGRATION_MIN_RECALL,
+            settle_seconds=settings.EMBEDDING_MIGRATION_SETTLE_SECONDS
+        )
+
+    async def run(self) -> Dict[str, Any]:
+        """COPY, CATCH UP, CHECK RECALL AND SWITCH READS IF IT PASSES"""
+        source = self.vector_store.binding
+        if source.name == self.target.name:
+            raise ValueError(f"{source.name} is already the active index")
+        stats: Dict[str, Any] = {
+            "source": source.name,
+            "target": self.target.name,
+            "copied": 0,
+            "skipped": 0,
+            "caught_up": 0,
+            "deleted": 0,
+            "recall": None,
+            "switched": False,
+        }
+        # re-embedding yields to interactive requests on the shared scheduler
+        with priority_scope(BULK):
+            namespaces = await self._namespaces(source)
+            for namespace in namespaces:
+                await self._copy_namespace(source, namespace, stats)
+
+            # chunks written, changed or deleted while the copy ran; the
+            # texts seen here are the recall sample
+            catch_up_started = datetime.utcnow().isoformat()
+            samples: List[Tuple[str, str]] = []
+            for namespace in namespaces:
+                await self._catch_up(source, namespace, stats, samples=samples)
+
+            stats["recall"] = await self.check_recall(source, samples)
+            if stats["recall"] < self.min_recall:
+                logger.warning(
+                    f"Recall@{self.recall_k} of {self.target.name} against {source.name} is "
+                    f"{stats['recall']:.3f}, below {self.min_recall}; reads stay on {source.name}"
+                )
+                return stats
+
+            await self.metadata_store.set_active_index(self.target.name, self.target.model, self.target.dimension)
+            self.vector_store.use_index(self.target)
+            stats["switched"] = True
+
+            # pipeline runs started before the switch finish on the source
+            # index; copy what they wrote once they are done
+            if self.settle_seconds:
+                await asyncio.sleep(self.settle_seconds)
+            for namespace in namespaces:
+                await self._catch_up(source, namespace, stats, since=catch_up_started)
+
+        await self.checkpoint_store.clear(self.checkpoint_key)
+        logger.info(f"Migrated {source.name} to {self.target.name}: {stats}")
+        return stats
+
+    async def _namespaces(self, binding: IndexBinding) -> List[str]:
+        stats = await asyncio.to_thread(binding.index.describe_index_stats)
+        return sorted(stats["namespaces"])
+
+    async def _pages(self, binding: IndexBinding, namespace: str) -> AsyncIterator[List[str]]:
+        pages = binding.index.list(namespace=namespace, limit=self.batch_size)
+        while True:
+            # each page is a request, fetched off the event loop
+            ids = await asyncio.to_thread(next, pages, None)
+            if ids is None:
+                return
+            if ids:
+                yield list(ids)
+
+    async def _throttle(self, vectors: int):
+        wait = self.bucket.wait_time(vectors)
+        if wait:
+            await asyncio.sleep(wait)
+        self.bucket.consume(vectors)
+
+    async def _copy_namespace(self, source: IndexBinding, namespace: str, stats: Dict[str, Any]):
+        """COPY A NAMESPACE PAGE BY PAGE, AFTER THE LAST CHECKPOINTED PAGE"""
+        stage = f"copy_{namespace}"
+        done = await self.checkpoint_store.load(self.checkpoint_key, stage)
+        page = max(done) + 1 if done else 0
+        # pages are listed in id order, so the last copied id marks where
+        # to resume; anything missed is picked up by the catch up
+        cursor = done[page - 1] if done else None
+        if cursor is not None:
+            logger.info(f"Resuming {namespace} after {cursor}")
+        async for ids in self._pages(source, namespace):
+            if cursor is not None:
+                ids = [vector_id for vector_id in ids if vector_id > cursor]
+                if not ids:
+                    continue
+            stored = await self.vector_store.fetch(ids, namespace=namespace, binding=source)
+            await self._copy(stored, namespace, stats)
+            await self.checkpoint_store.save(self.checkpoint_key, stage, page, ids[-1])
+            page += 1
+
+    async def _copy(
+        self,
+        stored: Dict[str, Tuple[List[float], Dict[str, Any]]],
+        namespace: str,
+        stats: Dict[str, Any],
+        counter: str = "copied"
+    ):
+        """RE-EMBED FETCHED CHUNKS AND UPSERT THEM INTO THE TARGET"""
+        chunks = [(vector_id, metadata) for vector_id, (_, metadata) in stored.items() if metadata.get("text")]
+        # nothing to re-embed without the text, the file has to be reprocessed
+        stats["skipped"] += len(stored) - len(chunks)
+        if not chunks:
+            return
+        await self._throttle(len(chunks))
+        vectors = await self.target.embeddings.aembed_documents([metadata["text"] for _, metadata in chunks])
+        batch = [(vector_id, vector, metadata) for (vector_id, metadata), vector in zip(chunks, vectors)]
+        for i in range(0, len(batch), self.vector_store.UPSERT_BATCH_SIZE):
+            await self.vector_store.upsert(self.target.index, batch[i:i + self.vector_store.UPSERT_BATCH_SIZE], namespace)
+        stats[counter] += len(batch)
+
+    async def _catch_up(
+        self,
+        source: IndexBinding,
+        namespace: str,
+        stats: Dict[str, Any],
+        samples: Optional[List[Tuple[str, str]]] = None,
+        since: Optional[str] = None
+    ):
+        """
+        MAKE THE TARGET NAMESPACE MATCH THE SOURCE
+
+        chunks missing from the target or stored with other metadata are
+        re-embedded and chunks only in the target are deleted. with since,
+        only chunks processed since then are copied and nothing is deleted,
+        as the target is then the index being written to
+        """
+        target_ids = {vector_id async for ids in self._pages(self.target, namespace) for vector_id in ids}
+        seen = 0
+        async for ids in self._pages(source, namespace):
+            stored = await self.vector_store.fetch(ids, namespace=namespace, binding=source)
+            copied = await self.vector_store.fetch(
+                [vector_id for vector_id in ids if vector_id in target_ids], namespace=namespace, binding=self.target
+            )
+            target_ids.difference_update(ids)
+            stale = {}
+            for vector_id, (values, metadata) in stored.items():
+                if samples is not None and metadata.get("text"):
+                    # reservoir sample of the chunk texts, for the recall check
+                    seen += 1
+                    if len(samples) < self.recall_samples:
+                        samples.append((namespace, metadata["text"]))
+                    else:
+                        slot = self.random.randrange(seen)
+                        if slot < self.recall_samples:
+                            samples[slot] = (namespace, metadata["text"])
+                previous = copied.get(vector_id)
+                if since is not None:
+                    processed_at = metadata.get("processed_at") or ""
+                    if processed_at < since:
+                        continue
+                    if previous is not None and (previous[1].get("processed_at") or "") >= processed_at:
+                        continue
+                elif previous is not None and previous[1] == metadata:
+                    continue
+                stale[vector_id] = (values, metadata)
+            if stale:
+                await self._copy(stale, namespace, stats, counter="caught_up")
+        if since is None and target_ids:
+            extra = sorted(target_ids)
+            for i in range(0, len(extra), self.vector_store.DELETE_BATCH_SIZE):
+                await asyncio.to_thread(
+                    self.target.index.delete,
+                    ids=extra[i:i + self.vector_store.DELETE_BATCH_SIZE],
+                    namespace=namespace
+                )
+            stats["deleted"] += len(extra)
+
+    async def _neighbours(self, binding: IndexBinding, namespace: str, text: str) -> List[str]:
+        embedding = await binding.embeddings.aembed_query(text)
+        results = await asyncio.to_thread(
+            binding.index.query, vector=embedding, top_k=self.recall_k, namespace=namespace
+        )
+        return [match["id"] for match in results["matches"]]
+
+    async def check_recall(self, source: IndexBinding, samples: List[Tuple[str, str]]) -> float:
+        """MEAN SHARE OF THE SOURCE'S TOP recall_k CHUNKS THE TARGET ALSO RETURNS"""
+        recalls = []
+        for namespace, text in samples:
+            expected = await self._neighbours(source, namespace, text)
+            if not expected:
+                continue
+            found = set(await self._neighbours(self.target, namespace, text))
+            recalls.append(sum(1 for vector_id in expected if vector_id in found) / len(expected))
+        # an empty index has nothing to lose
+        return sum(recalls) / len(recalls) if recalls else 1.0
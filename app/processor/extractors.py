@@ -0,0 +1,175 @@
+# app/processor/extractors.py
+
+import asyncio
+import io
+import zipfile
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from xml.etree import ElementTree
+
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+from googleapiclient.http import MediaIoBaseDownload
+
+from ..utils.http import HttpTransport
+from ..utils.process_pool import BytesRef, CpuPool, resolve_bytes
+
+GOOGLE_DOC = "application/vnd.google-apps.document"
+PLAIN_TEXT = "text/plain"
+PDF = "application/pdf"
+DOCX = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+# same types as cloud_function.utils.is_supported_file_type
+SUPPORTED_MIME_TYPES = (PDF, PLAIN_TEXT, GOOGLE_DOC, DOCX)
+
+FILE_FIELDS = "id,name,mimeType,size,webViewLink,modifiedTime"
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_DOCX_BODY = "word/document.xml"
+
+def build_drive_service(credentials: Dict, http_transport: Optional[HttpTransport] = None):
+    """DRIVE V3 SERVICE, ON THE SHARED CONNECTION POOL WHEN GIVEN ONE"""
+    creds = Credentials.from_authorized_user_info(credentials)
+    if http_transport:
+        return build("drive", "v3", http=http_transport.authorized_http(creds), cache_discovery=False)
+    return build("drive", "v3", credentials=creds, cache_discovery=False)
+
+def download_drive_file(
+    credentials: Dict,
+    file_id: str,
+    http_transport: Optional[HttpTransport] = None
+) -> Tuple[Dict, bytes]:
+    """
+    FILE RESOURCE AND CONTENT OF A DRIVE FILE
+
+    native google docs are exported straight to text/plain, other files are
+    downloaded as stored. blocking, run it in a thread
+    """
+    service = build_drive_service(credentials, http_transport)
+    file = service.files().get(fileId=file_id, fields=FILE_FIELDS, supportsAllDrives=True).execute()
+    if file.get("mimeType") == GOOGLE_DOC:
+        request = service.files().export_media(fileId=file_id, mimeType=PLAIN_TEXT)
+    else:
+        request = service.files().get_media(fileId=file_id, supportsAllDrives=True)
+    buffer = io.BytesIO()
+    downloader = MediaIoBaseDownload(buffer, request, chunksize=8 * 1024 * 1024)
+    done = False
+    while not done:
+        _, done = downloader.next_chunk()
+    return file, buffer.getvalue()
+
+def extract_plain_text(data: BytesRef) -> str:
+    """UTF-8 TEXT, AS EXPORTED FOR GOOGLE DOCS (WHICH STARTS WITH A BOM)"""
+    return resolve_bytes(data).decode("utf-8-sig", errors="replace")
+
+def extract_docx(data: BytesRef) -> str:
+    """
+    PARAGRAPH TEXT OF A DOCX FILE
+
+    streams word/document.xml with iterparse and drops each paragraph once
+    its text is taken, so no document tree is built. heading styles become
+    markdown headings, which the chunker splits on
+    """
+    paragraphs: List[str] = []
+    runs: List[str] = []
+    heading = 0
+    with zipfile.ZipFile(io.BytesIO(resolve_bytes(data))) as archive:
+        with archive.open(_DOCX_BODY) as body:
+            for _, element in ElementTree.iterparse(body, events=("end",)):
+                tag = element.tag
+                if tag == _W + "t":
+                    runs.append(element.text or "")
+                elif tag == _W + "tab":
+                    runs.append("\t")
+                elif tag in (_W + "br", _W + "cr"):
+                    runs.append("\n")
+                elif tag == _W + "pStyle":
+                    style = element.get(_W + "val", "")
+                    if style == "Title":
+                        heading = 1
+                    elif style.startswith("Heading") and style[7:].isdigit():
+                        heading = min(int(style[7:]), 6)
+                elif tag == _W + "p":
+                    text = "".join(runs)
+                    if heading and text.strip():
+                        text = f"{'#' * heading} {text}"
+                    paragraphs.append(text)
+                    runs.clear()
+                    heading = 0
+                    element.clear()
+    return "\n\n".join(paragraphs)
+
+def pdf_page_count(data: BytesRef) -> int:
+    from PyPDF2 import PdfReader
+
+    return len(PdfReader(io.BytesIO(resolve_bytes(data))).pages)
+
+def extract_pdf_pages(data: BytesRef, start: int = 0, end: Optional[int] = None) -> List[str]:
+    """TEXT OF PAGES [start, end) OF A PDF, ALL PAGES BY DEFAULT"""
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(io.BytesIO(resolve_bytes(data)))
+    count = len(reader.pages)
+    end = count if end is None else min(end, count)
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+class FileExtractor:
+    """
+    TEXT EXTRACTION DISPATCHED ON MIME TYPE
+
+    parsing runs in the workers of pool, or in a thread without one. pdf
+    pages are extracted in ranges of pdf_pages_per_task, in parallel across
+    the pool workers
+    """
+
+    def __init__(self, pool: Optional[CpuPool] = None, pdf_pages_per_task: int = 16):
+        self.pool = pool
+        self.pdf_pages_per_task = pdf_pages_per_task
+        self._extractors: Dict[str, Callable[[bytes], Awaitable[str]]] = {
+            GOOGLE_DOC: self._extract_plain_text,
+            PLAIN_TEXT: self._extract_plain_text,
+            DOCX: self._extract_docx,
+            PDF: self._extract_pdf,
+        }
+
+    def supports(self, mime_type: Optional[str]) -> bool:
+        return mime_type in self._extractors
+
+    async def extract(self, mime_type: Optional[str], data: bytes) -> str:
+        """TEXT OF A FILE OF mime_type"""
+        extractor = self._extractors.get(mime_type)
+        if extractor is None:
+            raise ValueError(f"unsupported file type: {mime_type}")
+        return await extractor(data)
+
+    async def _run(self, fn: Callable, *args):
+        if self.pool is None:
+            return await asyncio.to_thread(fn, *args)
+        return await self.pool.run(fn, *args)
+
+    async def _extract_plain_text(self, data: bytes) -> str:
+        # decoding is cheap, not worth a round trip to a worker
+        return extract_plain_text(data)
+
+    async def _extract_docx(self, data: bytes) -> str:
+        shared = self.pool.share_bytes(data) if self.pool else data
+        try:
+            return await self._run(extract_docx, shared)
+        finally:
+            CpuPool.release(shared)
+
+    async def _extract_pdf(self, data: bytes) -> str:
+        if self.pool is None:
+            return "\n\n".join(await self._run(extract_pdf_pages, data))
+
+        shared = self.pool.share_bytes(data)
+        try:
+            count = await self.pool.run(pdf_page_count, shared)
+            # spread pages over all workers, in ranges of at most pdf_pages_per_task
+            step = min(self.pdf_pages_per_task, max(1, -(-count // max(1, self.pool.max_workers))))
+            ranges = await asyncio.gather(*(
+                self.pool.run(extract_pdf_pages, shared, start, start + step)
+                for start in range(0, count, step)
+            ))
+        finally:
+            CpuPool.release(shared)
+        return "\n\n".join(page for pages in ranges for page in pages)
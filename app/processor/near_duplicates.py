@@ -0,0 +1,240 @@
+# app/processor/near_duplicates.py
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Union
+import hashlib
+import re
+import zlib
+
+import numpy as np
+
+_WORD = re.compile(r"\w+")
+
+@dataclass
+class ChunkSignature:
+    """EXACT HASH AND MINHASH SIGNATURE OF A CHUNK'S NORMALIZED TEXT"""
+    exact: str
+    minhash: np.ndarray
+
+@dataclass
+class DuplicateMatch:
+    vector_id: str
+    cluster: str
+    similarity: float
+
+class MinHasher:
+    """
+    MINHASH OVER WORD SHINGLES
+
+    words are lowercased and punctuation dropped, so whitespace and
+    formatting changes do not matter. similarity of two signatures
+    estimates the jaccard similarity of their shingle sets
+    """
+    _PRIME = (1 << 61) - 1
+    _MAX_HASH = (1 << 32) - 1
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 5, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self._a = rng.randint(1, 1 << 31, num_perm).astype(np.uint64)
+        self._b = rng.randint(0, 1 << 31, num_perm).astype(np.uint64)
+
+    def _shingles(self, words: List[str]) -> np.ndarray:
+        n = self.shingle_size
+        if len(words) <= n:
+            grams = [" ".join(words)]
+        else:
+            grams = [" ".join(words[i:i + n]) for i in range(len(words) - n + 1)]
+        return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+    def signature(self, text: str) -> ChunkSignature:
+        words = _WORD.findall(text.lower())
+        exact = hashlib.sha1(" ".join(words).encode("utf-8")).hexdigest()
+        shingles = self._shingles(words)
+        hashes = (shingles[:, None] * self._a[None, :] + self._b[None, :]) % self._PRIME
+        minhash = (hashes.min(axis=0) & self._MAX_HASH).astype(np.uint32)
+        return ChunkSignature(exact, minhash)
+
+    @staticmethod
+    def similarity(a: ChunkSignature, b: ChunkSignature) -> float:
+        if a.exact == b.exact:
+            return 1.0
+        return float(np.mean(a.minhash == b.minhash))
+
+class NearDuplicateIndex:
+    """
+    LSH INDEX OF CHUNKS ALREADY STORED, PER NAMESPACE
+
+    signatures are split into bands; chunks sharing any band are candidates
+    and are kept when their estimated similarity reaches threshold. each
+    chunk belongs to the cluster of the first chunk it duplicated. the
+    index lives in memory and keeps the chunks of the last max_entries
+    additions.
+
+    entries sit in slots of a ring: signatures in one packed array, ids in
+    lists, and each band is one dict from a 64-bit hash of the namespace
+    and band rows to the slot (or list of slots) holding it. with the
+    default 64 permutations in 16 bands an entry takes about 2 KB, 100 MB
+    at the default max_entries (measured with tracemalloc, 100k entries)
+    """
+
+    # odd multipliers mixing the rows of a band into one 64-bit hash
+    _MIX = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93], dtype=np.uint64)
+
+    def __init__(
+        self,
+        threshold: float = 0.85,
+        num_perm: int = 64,
+        bands: int = 16,
+        max_entries: int = 50000
+    ):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_entries = max_entries
+        self.hasher = MinHasher(num_perm)
+        self._mix = np.resize(self._MIX, self.rows)
+        # slot -> minhash and exact hash key; grown up to max_entries rows
+        self._signatures = np.zeros((0, num_perm), dtype=np.uint32)
+        self._exact_keys = np.zeros(0, dtype=np.uint64)
+        # slot -> namespace, vector id and cluster (None: its own id), None when free
+        self._namespaces: List[Optional[str]] = []
+        self._ids: List[Optional[str]] = []
+        self._clusters: List[Optional[str]] = []
+        # namespace -> vector id -> slot
+        self._slots: Dict[str, Dict[str, int]] = {}
+        self._exact: Dict[int, int] = {}
+        # per band: band hash -> slot, or list of slots when shared
+        self._buckets: List[Dict[int, Union[int, List[int]]]] = [{} for _ in range(bands)]
+        self._namespace_keys: Dict[str, int] = {}
+        self._cursor = 0
+        self._size = 0
+
+    @classmethod
+    def from_settings(cls, settings) -> "NearDuplicateIndex":
+        return cls(threshold=settings.DEDUP_THRESHOLD, max_entries=settings.DEDUP_MAX_ENTRIES)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def signature(self, text: str) -> ChunkSignature:
+        return self.hasher.signature(text)
+
+    def _namespace_key(self, namespace: str) -> int:
+        key = self._namespace_keys.get(namespace)
+        if key is None:
+            digest = hashlib.blake2b(namespace.encode("utf-8"), digest_size=8).digest()
+            key = self._namespace_keys[namespace] = int.from_bytes(digest, "little")
+        return key
+
+    def _exact_key(self, namespace: str, signature: ChunkSignature) -> int:
+        return int(signature.exact[:16], 16) ^ self._namespace_key(namespace)
+
+    def _band_hashes(self, namespace: str, signature: ChunkSignature) -> List[int]:
+        rows = signature.minhash.reshape(self.bands, self.rows).astype(np.uint64)
+        hashes = (rows * self._mix).sum(axis=1, dtype=np.uint64) ^ np.uint64(self._namespace_key(namespace))
+        # final avalanche so nearby row values land far apart
+        hashes ^= hashes >> np.uint64(31)
+        hashes *= np.uint64(0xBF58476D1CE4E5B9)
+        hashes ^= hashes >> np.uint64(29)
+        return hashes.tolist()
+
+    def find(self, namespace: str, signature: ChunkSignature) -> Optional[DuplicateMatch]:
+        """BEST STORED MATCH AT OR ABOVE THRESHOLD, IF ANY"""
+        slot = self._exact.get(self._exact_key(namespace, signature))
+        if slot is not None and self._namespaces[slot] == namespace:
+            return DuplicateMatch(self._ids[slot], self._cluster(slot), 1.0)
+
+        candidates = set()
+        for bucket, band_hash in zip(self._buckets, self._band_hashes(namespace, signature)):
+            found = bucket.get(band_hash)
+            if found is None:
+                continue
+            if isinstance(found, int):
+                candidates.add(found)
+            else:
+                candidates.update(found)
+        # a 64-bit hash collision may point into another namespace
+        slots = [slot for slot in candidates if self._namespaces[slot] == namespace]
+        if not slots:
+            return None
+        similarities = np.mean(self._signatures[slots] == signature.minhash, axis=1)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            return None
+        slot = slots[best]
+        return DuplicateMatch(self._ids[slot], self._cluster(slot), float(similarities[best]))
+
+    def _cluster(self, slot: int) -> str:
+        cluster = self._clusters[slot]
+        return self._ids[slot] if cluster is None else cluster
+
+    def add(self, namespace: str, vector_id: str, signature: ChunkSignature, cluster: Optional[str] = None):
+        """REGISTER A STORED CHUNK"""
+        self.remove(namespace, vector_id)
+        slot = self._cursor
+        self._cursor = (self._cursor + 1) % self.max_entries
+        if slot == len(self._ids):
+            self._grow()
+        elif self._ids[slot] is not None:
+            # the ring is full, forget the oldest addition
+            self._free(slot)
+
+        exact_key = self._exact_key(namespace, signature)
+        self._signatures[slot] = signature.minhash
+        self._exact_keys[slot] = exact_key
+        self._namespaces[slot] = namespace
+        self._ids[slot] = vector_id
+        self._clusters[slot] = cluster if cluster and cluster != vector_id else None
+        self._slots.setdefault(namespace, {})[vector_id] = slot
+        self._exact.setdefault(exact_key, slot)
+        for bucket, band_hash in zip(self._buckets, self._band_hashes(namespace, signature)):
+            found = bucket.get(band_hash)
+            if found is None:
+                bucket[band_hash] = slot
+            elif isinstance(found, int):
+                bucket[band_hash] = [found, slot]
+            else:
+                found.append(slot)
+        self._size += 1
+
+    def _grow(self):
+        """ADD SLOTS, DOUBLING UP TO max_entries"""
+        size = len(self._ids)
+        capacity = min(self.max_entries, max(1024, size * 2))
+        signatures = np.zeros((capacity, self._signatures.shape[1]), dtype=np.uint32)
+        signatures[:size] = self._signatures
+        exact_keys = np.zeros(capacity, dtype=np.uint64)
+        exact_keys[:size] = self._exact_keys
+        self._signatures, self._exact_keys = signatures, exact_keys
+        for slots in (self._namespaces, self._ids, self._clusters):
+            slots.extend([None] * (capacity - size))
+
+    def remove(self, namespace: str, vector_id: str):
+        slot = self._slots.get(namespace, {}).get(vector_id)
+        if slot is not None:
+            self._free(slot)
+
+    def _free(self, slot: int):
+        namespace = self._namespaces[slot]
+        slots = self._slots[namespace]
+        del slots[self._ids[slot]]
+        if not slots:
+            del self._slots[namespace]
+        exact_key = int(self._exact_keys[slot])
+        if self._exact.get(exact_key) == slot:
+            del self._exact[exact_key]
+        signature = ChunkSignature("", self._signatures[slot])
+        for bucket, band_hash in zip(self._buckets, self._band_hashes(namespace, signature)):
+            found = bucket.get(band_hash)
+            if found == slot:
+                del bucket[band_hash]
+            elif isinstance(found, list):
+                found.remove(slot)
+                if len(found) == 1:
+                    bucket[band_hash] = found[0]
+        self._namespaces[slot] = self._ids[slot] = self._clusters[slot] = None
+        self._size -= 1
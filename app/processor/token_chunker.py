@@ -0,0 +1,269 @@
+# app/processor/token_chunker.py
+
+import re
+from collections import deque
+from typing import Callable, Deque, Iterator, List, Optional, TextIO, Tuple
+
+# (start, end, size) of a piece of the text, offsets relative to the buffer
+Span = Tuple[int, int, int]
+
+DEFAULT_SEPARATORS = ["\n\n", "\n", " ", ""]
+
+# markdown ATX heading at the start of a paragraph
+DEFAULT_HEADING_PATTERN = r"[ \t]*#{1,6}[ \t]"
+
+class TiktokenCounter:
+    """
+    TOKEN COUNTER BACKED BY A TIKTOKEN ENCODING
+
+    pickles as the encoding name, so chunkers using it can be sent to
+    worker processes; the encoding is loaded again on first use there
+    """
+
+    def __init__(self, encoding_name: str = "cl100k_base"):
+        self.encoding_name = encoding_name
+        self._encoding = None
+
+    def __getstate__(self):
+        return {"encoding_name": self.encoding_name}
+
+    def __setstate__(self, state):
+        self.encoding_name = state["encoding_name"]
+        self._encoding = None
+
+    def __call__(self, text: str) -> int:
+        if self._encoding is None:
+            import tiktoken
+
+            self._encoding = tiktoken.get_encoding(self.encoding_name)
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+def tiktoken_counter(encoding_name: str = "cl100k_base") -> Callable[[str], int]:
+    """TOKEN COUNTER BACKED BY A TIKTOKEN ENCODING"""
+    counter = TiktokenCounter(encoding_name)
+    # fail at startup rather than on the first document if it is unavailable
+    counter("")
+    return counter
+
+class _Merger:
+    """
+    GREEDILY PACKS CONSECUTIVE SPANS INTO CHUNKS OF AT MOST chunk_size,
+    CARRYING TRAILING SPANS OVER AS OVERLAP (SAME RULES AS LANGCHAIN'S
+    TextSplitter._merge_splits WITH keep_separator=True)
+    """
+
+    __slots__ = ("chunk_size", "chunk_overlap", "current", "total")
+
+    def __init__(self, chunk_size: int, chunk_overlap: int):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.current: Deque[Span] = deque()
+        self.total = 0
+
+    def add(self, span: Span) -> Optional[Tuple[int, int]]:
+        """ADD A SPAN, RETURNS THE (start, end) OF A COMPLETED CHUNK IF ANY"""
+        size = span[2]
+        emitted = None
+        if self.total + size > self.chunk_size and self.current:
+            emitted = (self.current[0][0], self.current[-1][1])
+            while self.total > self.chunk_overlap or (
+                self.total + size > self.chunk_size and self.total > 0
+            ):
+                self.total -= self.current.popleft()[2]
+        self.current.append(span)
+        self.total += size
+        return emitted
+
+    def flush(self) -> Optional[Tuple[int, int]]:
+        """END THE CURRENT RUN, RETURNS ITS LAST CHUNK IF ANY"""
+        emitted = (self.current[0][0], self.current[-1][1]) if self.current else None
+        self.current.clear()
+        self.total = 0
+        return emitted
+
+    def shift(self, offset: int):
+        """REBASE PENDING SPANS AFTER THE BUFFER WAS TRIMMED BY offset"""
+        self.current = deque((s - offset, e - offset, n) for s, e, n in self.current)
+
+class TokenChunker:
+    """
+    STREAMING TEXT CHUNKER SIZED BY TOKEN COUNT
+
+    chunks are yielded lazily as (start_index, text) from a string or a text
+    stream. boundaries follow the recursive paragraph -> line -> word ->
+    character strategy of langchain's RecursiveCharacterTextSplitter and are
+    identical to it when sizing by characters with headings disabled; pieces
+    are tracked as offsets so the text is only sliced to measure tokens and
+    to emit chunks. with split_on_headings a markdown heading always starts
+    a new chunk
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = 256,
+        chunk_overlap: int = 50,
+        tokenizer: Optional[Callable[[str], int]] = None,
+        separators: Optional[List[str]] = None,
+        split_on_headings: bool = True,
+        heading_pattern: str = DEFAULT_HEADING_PATTERN
+    ):
+        if chunk_overlap > chunk_size:
+            raise ValueError(
+                f"chunk overlap ({chunk_overlap}) is larger than chunk size ({chunk_size})"
+            )
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        # None sizes by characters
+        self.tokenizer = tokenizer
+        self.separators = separators or DEFAULT_SEPARATORS
+        self._patterns = {sep: re.compile(re.escape(sep)) for sep in self.separators if sep}
+        self.split_on_headings = split_on_headings
+        self._heading = re.compile(r"\s*" + heading_pattern)
+
+    def _size(self, text: str, start: int, end: int) -> int:
+        if self.tokenizer is None:
+            return end - start
+        return self.tokenizer(text[start:end])
+
+    def _split_spans(self, text: str, start: int, end: int, separator: str) -> Iterator[Tuple[int, int]]:
+        """SPLIT [start, end) AT separator, KEEPING IT AT THE START OF EACH PIECE"""
+        if not separator:
+            for i in range(start, end):
+                yield i, i + 1
+            return
+        pos = start
+        for match in self._patterns[separator].finditer(text, start, end):
+            if match.start() > pos:
+                yield pos, match.start()
+                pos = match.start()
+        if end > pos:
+            yield pos, end
+
+    @staticmethod
+    def _strip(text: str, start: int, end: int) -> Optional[Tuple[int, str]]:
+        chunk = text[start:end]
+        stripped = chunk.strip()
+        if not stripped:
+            return None
+        return start + len(chunk) - len(chunk.lstrip()), stripped
+
+    def _choose_separator(self, text: str, start: int, end: int, separators: List[str]) -> Tuple[str, List[str]]:
+        for i, sep in enumerate(separators):
+            if sep == "":
+                return sep, []
+            if self._patterns[sep].search(text, start, end):
+                return sep, separators[i + 1:]
+        return separators[-1], []
+
+    def _split(
+        self,
+        text: str,
+        start: int,
+        end: int,
+        separators: List[str],
+        merger: Optional[_Merger] = None,
+        top_level: bool = False
+    ) -> Iterator[Tuple[int, str]]:
+        """RECURSIVELY SPLIT [start, end), YIELDING (start_index, chunk)"""
+        separator, next_separators = self._choose_separator(text, start, end, separators)
+        yield from self._split_with(text, start, end, separator, next_separators, merger, top_level)
+
+    def _split_with(
+        self,
+        text: str,
+        start: int,
+        end: int,
+        separator: str,
+        next_separators: List[str],
+        merger: Optional[_Merger],
+        top_level: bool
+    ) -> Iterator[Tuple[int, str]]:
+        merger = merger or _Merger(self.chunk_size, self.chunk_overlap)
+        headings = top_level and self.split_on_headings
+
+        for s, e in self._split_spans(text, start, end, separator):
+            size = self._size(text, s, e)
+            if headings and self._heading.match(text, s, e):
+                emitted = merger.flush()
+                if emitted and (chunk := self._strip(text, *emitted)):
+                    yield chunk
+            if size < self.chunk_size:
+                emitted = merger.add((s, e, size))
+                if emitted and (chunk := self._strip(text, *emitted)):
+                    yield chunk
+                continue
+
+            emitted = merger.flush()
+            if emitted and (chunk := self._strip(text, *emitted)):
+                yield chunk
+            if not next_separators:
+                yield s, text[s:e]
+            else:
+                yield from self._split(text, s, e, next_separators)
+
+        if not top_level:
+            emitted = merger.flush()
+            if emitted and (chunk := self._strip(text, *emitted)):
+                yield chunk
+
+    def iter_chunks(self, text: str) -> Iterator[Tuple[int, str]]:
+        """YIELD (start_index, chunk) FOR A STRING"""
+        merger = _Merger(self.chunk_size, self.chunk_overlap)
+        yield from self._split(text, 0, len(text), self.separators, merger, top_level=True)
+        emitted = merger.flush()
+        if emitted and (chunk := self._strip(text, *emitted)):
+            yield chunk
+
+    def split_text(self, text: str) -> List[str]:
+        return [chunk for _, chunk in self.iter_chunks(text)]
+
+    def iter_stream(self, stream: TextIO, block_size: int = 1 << 20) -> Iterator[Tuple[int, str]]:
+        """
+        YIELD (start_index, chunk) FROM A TEXT STREAM
+
+        only the unprocessed tail of the stream and the spans still pending
+        in the current chunk are kept in memory. the stream is cut at
+        paragraph breaks, so the top level always splits on the first
+        separator
+        """
+        separator = self.separators[0]
+        next_separators = self.separators[1:]
+        merger = _Merger(self.chunk_size, self.chunk_overlap)
+        buffer = ""
+        # absolute offset of buffer[0], and end of the part already split
+        base = 0
+        done = 0
+
+        while True:
+            block = stream.read(block_size)
+            buffer += block
+            if block:
+                # cut before the last complete run of separators; trailing
+                # newlines may continue in the next block
+                limit = len(buffer.rstrip("\n"))
+                cut = buffer.rfind(separator, done, limit)
+                while cut > done and buffer[cut - 1] == separator[0]:
+                    cut -= 1
+                if cut <= done:
+                    continue
+            else:
+                cut = len(buffer)
+
+            for index, chunk in self._split_with(
+                buffer, done, cut, separator, next_separators, merger, top_level=True
+            ):
+                yield base + index, chunk
+
+            if not block:
+                break
+
+            # drop text that no pending span refers to anymore
+            keep_from = merger.current[0][0] if merger.current else cut
+            buffer = buffer[keep_from:]
+            base += keep_from
+            done = cut - keep_from
+            merger.shift(keep_from)
+
+        emitted = merger.flush()
+        if emitted and (chunk := self._strip(buffer, *emitted)):
+            yield base + chunk[0], chunk[1]
@@ -0,0 +1,259 @@
+# app/utils/http.py
+
+import asyncio
+import threading
+from typing import Any, Callable, Dict, Iterator, AsyncIterator, Optional
+
+import httpx
+
+from .logger import setup_logger
+from .metrics import HTTP_CONNECTIONS, HTTP_REQUESTS, HTTP_TLS_HANDSHAKES
+
+logger = setup_logger(__name__)
+
+# httpcore trace events of a new connection and of its tls handshake
+_CONNECT_EVENT = "connection.connect_tcp.complete"
+_TLS_EVENT = "connection.start_tls.complete"
+
+def _h2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def _record_trace(host: str, name: str):
+    if name == _CONNECT_EVENT:
+        HTTP_CONNECTIONS.labels(host).inc()
+    elif name == _TLS_EVENT:
+        HTTP_TLS_HANDSHAKES.labels(host).inc()
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """RESPONSE BODY THAT FREES ITS HOST SLOT ONCE CLOSED"""
+
+    def __init__(self, stream: httpx.SyncByteStream, release: Callable[[], None]):
+        self.stream = stream
+        self.release = release
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield from self.stream
+
+    def close(self):
+        try:
+            self.stream.close()
+        finally:
+            if self.release:
+                self.release()
+                self.release = None
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self.stream = stream
+        self.release = release
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self.stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self.stream.aclose()
+        finally:
+            if self.release:
+                self.release()
+                self.release = None
+
+class _PooledTransport(httpx.BaseTransport):
+    """LIMITS CONCURRENT REQUESTS PER HOST AND COUNTS CONNECTIONS OPENED"""
+
+    def __init__(self, transport: httpx.BaseTransport, per_host: int):
+        self.transport = transport
+        self.per_host = per_host
+        self._slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def _slot(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            slot = self._slots.get(host)
+            if slot is None:
+                slot = self._slots[host] = threading.BoundedSemaphore(self.per_host)
+            return slot
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        slot = self._slot(host)
+        slot.acquire()
+        try:
+            request.extensions = {**request.extensions, "trace": lambda name, info: _record_trace(host, name)}
+            response = self.transport.handle_request(request)
+        except BaseException:
+            slot.release()
+            raise
+        HTTP_REQUESTS.labels(host).inc()
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, slot.release),
+            extensions=response.extensions
+        )
+
+    def close(self):
+        self.transport.close()
+
+class _AsyncPooledTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport: httpx.AsyncBaseTransport, per_host: int):
+        self.transport = transport
+        self.per_host = per_host
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        slot = self._slots.get(host)
+        if slot is None:
+            slot = self._slots[host] = asyncio.Semaphore(self.per_host)
+        await slot.acquire()
+
+        async def trace(name: str, info: Dict[str, Any]):
+            _record_trace(host, name)
+
+        try:
+            request.extensions = {**request.extensions, "trace": trace}
+            response = await self.transport.handle_async_request(request)
+        except BaseException:
+            slot.release()
+            raise
+        HTTP_REQUESTS.labels(host).inc()
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_AsyncReleasingStream(response.stream, slot.release),
+            extensions=response.extensions
+        )
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+class Httplib2Adapter:
+    """
+    HTTPLIB2 INTERFACE OVER THE SHARED SYNC CLIENT
+
+    googleapiclient only talks to httplib2-style objects; this lets Drive
+    calls reuse the pooled connections instead of a new Http per service
+    """
+
+    def __init__(self, client: httpx.Client):
+        self.client = client
+        self.timeout = None
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=5, connection_type=None):
+        import httplib2
+
+        response = self.client.request(
+            method, uri, content=body, headers=headers, follow_redirects=redirections > 0
+        )
+        content = response.content
+        info = {key.lower(): value for key, value in response.headers.items()}
+        # the body is already decoded, as httplib2 would have done
+        info.pop("content-encoding", None)
+        info["content-length"] = str(len(content))
+        info["status"] = str(response.status_code)
+        return httplib2.Response(info), content
+
+    def close(self):
+        # the shared client outlives any one service
+        pass
+
+class HttpTransport:
+    """
+    SHARED KEEP-ALIVE HTTP CONNECTION POOLS FOR OUTBOUND CLIENTS
+
+    anthropic, openai and drive clients all send through one sync and one
+    async httpx client, so connections and tls sessions are reused across
+    them instead of each client keeping (or not keeping) its own pool.
+    http/2 is used when the h2 package is installed. at most
+    max_connections_per_host requests run against a host at once
+    """
+
+    def __init__(
+        self,
+        http2: bool = True,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        max_connections_per_host: int = 20,
+        keepalive_expiry: float = 60.0,
+        connect_timeout: float = 10.0,
+        read_timeout: float = 600.0
+    ):
+        if http2 and not _h2_available():
+            logger.warning("h2 is not installed, using HTTP/1.1 keep-alive connections")
+            http2 = False
+        self.http2 = http2
+        self.max_connections_per_host = max_connections_per_host
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self._client: Optional[httpx.Client] = None
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings) -> "HttpTransport":
+        return cls(
+            http2=settings.HTTP_HTTP2,
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            max_connections_per_host=settings.HTTP_MAX_CONNECTIONS_PER_HOST,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+            connect_timeout=settings.HTTP_CONNECT_TIMEOUT,
+            read_timeout=settings.HTTP_READ_TIMEOUT
+        )
+
+    def sync_client(self) -> httpx.Client:
+        with self._lock:
+            if self._client is None:
+                transport = httpx.HTTPTransport(http2=self.http2, limits=self.limits)
+                self._client = httpx.Client(
+                    transport=_PooledTransport(transport, self.max_connections_per_host),
+                    timeout=self.timeout
+                )
+            return self._client
+
+    def async_client(self) -> httpx.AsyncClient:
+        with self._lock:
+            if self._async_client is None:
+                transport = httpx.AsyncHTTPTransport(http2=self.http2, limits=self.limits)
+                self._async_client = httpx.AsyncClient(
+                    transport=_AsyncPooledTransport(transport, self.max_connections_per_host),
+                    timeout=self.timeout
+                )
+            return self._async_client
+
+    def openai_kwargs(self) -> Dict[str, Any]:
+        """OpenAIEmbeddings ARGUMENTS TO SEND THROUGH THE SHARED CLIENTS"""
+        return {"http_client": self.sync_client(), "http_async_client": self.async_client()}
+
+    def pinecone_kwargs(self) -> Dict[str, Any]:
+        """
+        Pinecone.Index ARGUMENTS
+
+        the pinecone client is built on urllib3 and cannot share these
+        pools, its own keep-alive pool gets the same per-host size instead
+        """
+        return {"connection_pool_maxsize": self.max_connections_per_host}
+
+    def authorized_http(self, credentials):
+        """httplib2-STYLE HTTP FOR googleapiclient.discovery.build(http=...)"""
+        from google_auth_httplib2 import AuthorizedHttp
+
+        return AuthorizedHttp(credentials, http=Httplib2Adapter(self.sync_client()))
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+        if self._client is not None:
+            self._client.close()
+            self._client = None
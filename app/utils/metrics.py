@@ -1,49 +1,298 @@
 # app/utils/metrics.py
 
-from google.cloud import monitoring_v3
-from typing import Dict, Any
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    CONTENT_TYPE_LATEST,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import threading
 import time
 
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# registry served on /metrics; kept separate from the default one so tests
+# and benchmarks can import the app repeatedly
+REGISTRY = CollectorRegistry(auto_describe=True)
+
+LATENCY_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0
+)
+
+STAGE_DURATION = Histogram(
+    "indexer_stage_duration_seconds",
+    "Time spent in each stage of a pipeline",
+    ["pipeline", "stage"],
+    buckets=LATENCY_BUCKETS,
+    registry=REGISTRY,
+)
+DOCUMENTS_PROCESSED = Counter(
+    "indexer_documents_processed_total",
+    "Documents that finished processing, by outcome",
+    ["status"],
+    registry=REGISTRY,
+)
+CHUNKS_PROCESSED = Counter(
+    "indexer_chunks_processed_total",
+    "Chunks upserted to the vector store",
+    registry=REGISTRY,
+)
+PROVIDER_TOKENS = Counter(
+    "indexer_provider_tokens_total",
+    "Estimated tokens sent to each model provider",
+    ["provider"],
+    registry=REGISTRY,
+)
+CACHE_REQUESTS = Counter(
+    "indexer_cache_requests_total",
+    "Cache and checkpoint lookups, by result (hit or miss)",
+    ["cache", "result"],
+    registry=REGISTRY,
+)
+
+CONTEXT_DECISIONS = Counter(
+    "indexer_context_decisions_total",
+    "Chunks by context policy decision (full, small or skip)",
+    ["decision"],
+    registry=REGISTRY,
+)
+
+QUEUE_WAIT = Histogram(
+    "indexer_scheduler_queue_wait_seconds",
+    "Time calls waited for a provider concurrency slot, by priority class",
+    ["provider", "priority"],
+    buckets=LATENCY_BUCKETS,
+    registry=REGISTRY,
+)
+HTTP_REQUESTS = Counter(
+    "indexer_http_requests_total",
+    "Requests sent through the shared HTTP transport",
+    ["host"],
+    registry=REGISTRY,
+)
+HTTP_CONNECTIONS = Counter(
+    "indexer_http_connections_opened_total",
+    "New connections opened by the shared HTTP transport, requests minus these reused one",
+    ["host"],
+    registry=REGISTRY,
+)
+HTTP_TLS_HANDSHAKES = Counter(
+    "indexer_http_tls_handshakes_total",
+    "TLS handshakes performed by the shared HTTP transport",
+    ["host"],
+    registry=REGISTRY,
+)
+
+# resolved label children, labels() is the costly part of an observation
+_stage_children: Dict[Tuple[str, str], Any] = {}
+
+@contextmanager
+def span(pipeline: str, stage: str) -> Iterator[None]:
+    """TIME A PIPELINE STAGE INTO THE STAGE DURATION HISTOGRAM"""
+    child = _stage_children.get((pipeline, stage))
+    if child is None:
+        child = _stage_children[(pipeline, stage)] = STAGE_DURATION.labels(pipeline, stage)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        child.observe(time.perf_counter() - started)
+
+def record_cache(cache: str, hits: int, misses: int):
+    """COUNT CACHE HITS AND MISSES"""
+    if hits:
+        CACHE_REQUESTS.labels(cache, "hit").inc(hits)
+    if misses:
+        CACHE_REQUESTS.labels(cache, "miss").inc(misses)
+
+def record_tokens(provider: str, tokens: int):
+    PROVIDER_TOKENS.labels(provider).inc(tokens)
+
+def record_queue_wait(provider: str, priority: str, seconds: float):
+    QUEUE_WAIT.labels(provider, priority).observe(seconds)
+
+class SchedulerCollector:
+    """EXPOSES RATE LIMIT SCHEDULER UTILIZATION AS GAUGES AT SCRAPE TIME"""
+
+    FIELDS = (
+        "in_flight",
+        "concurrency_limit",
+        "concurrency_utilization",
+        "request_budget_utilization",
+        "token_budget_utilization",
+        "latency_ewma_seconds",
+    )
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+
+    def collect(self):
+        utilization = self.scheduler.utilization()
+        for field in self.FIELDS:
+            gauge = GaugeMetricFamily(
+                f"indexer_provider_{field}",
+                f"Rate limit scheduler {field.replace('_', ' ')}",
+                labels=["provider"],
+            )
+            for provider, stats in utilization.items():
+                gauge.add_metric([provider], float(stats[field]))
+            yield gauge
+        for field in ("waiting", "in_flight_by_class"):
+            gauge = GaugeMetricFamily(
+                f"indexer_provider_{field}",
+                f"Rate limit scheduler calls {field.replace('_by_class', '')}, by priority class",
+                labels=["provider", "priority"],
+            )
+            for provider, stats in utilization.items():
+                for priority, count in stats[field].items():
+                    gauge.add_metric([provider, priority], float(count))
+            yield gauge
+
+def register_scheduler(scheduler):
+    REGISTRY.register(SchedulerCollector(scheduler))
+
+class CpuPoolCollector:
+    """EXPOSES CPU WORKER POOL SIZE AND LOAD AT SCRAPE TIME"""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def collect(self):
+        stats = self.pool.stats()
+        for field, description in (
+            ("workers", "Configured CPU worker processes"),
+            ("in_flight", "CPU pool tasks queued or running"),
+        ):
+            gauge = GaugeMetricFamily(f"indexer_cpu_pool_{field}", description)
+            gauge.add_metric([], float(stats[field]))
+            yield gauge
+        for field, description in (
+            ("tasks", "Tasks submitted to the CPU pool"),
+            ("failures", "CPU pool tasks that raised"),
+            ("shared_bytes", "Bytes passed to CPU workers through shared memory"),
+        ):
+            counter = CounterMetricFamily(f"indexer_cpu_pool_{field}", description)
+            counter.add_metric([], float(stats[field]))
+            yield counter
+
+def register_cpu_pool(pool):
+    REGISTRY.register(CpuPoolCollector(pool))
+
+def render_latest() -> Tuple[bytes, str]:
+    """PROMETHEUS TEXT EXPOSITION OF ALL METRICS AND ITS CONTENT TYPE"""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
 class MetricsClient:
     def __init__(self, project_id: str):
+        # optional dependency, only needed when exporting to cloud monitoring
+        from google.cloud import monitoring_v3
+
+        self.monitoring_v3 = monitoring_v3
         self.project_id = project_id
         self.client = monitoring_v3.MetricServiceClient()
         self.project_name = f"projects/{project_id}"
-        
-    def create_time_series(self, series: Dict[str, Any]):
-        """CREATE A NEW TIME SERIES"""
+
+    def build_time_series(self, name: str, labels: Dict[str, str], value: float, end_time: float):
+        """BUILD A GAUGE TIME SERIES FOR A CUSTOM METRIC"""
+        series = self.monitoring_v3.TimeSeries()
+        series.metric.type = f"custom.googleapis.com/document_indexer/{name}"
+        series.metric.labels.update(labels)
+        series.resource.type = "global"
+        series.resource.labels["project_id"] = self.project_id
+        seconds = int(end_time)
+        interval = self.monitoring_v3.TimeInterval(
+            {"end_time": {"seconds": seconds, "nanos": int((end_time - seconds) * 10 ** 9)}}
+        )
+        point = self.monitoring_v3.Point({"interval": interval, "value": {"double_value": value}})
+        series.points = [point]
+        return series
+
+    def create_time_series(self, series: List[Any]):
+        """WRITE A BATCH OF TIME SERIES"""
         try:
             self.client.create_time_series(
                 request={
                     "name": self.project_name,
-                    "time_series": [series]
+                    "time_series": series
                 }
             )
         except Exception as e:
-            print(f"error creating time series: {str(e)}")
+            logger.error(f"error creating time series: {str(e)}")
+
+class CloudMonitoringExporter:
+    """
+    PERIODICALLY PUSHES THE REGISTRY TO CLOUD MONITORING
+
+    counters and histogram sums/counts are sent as gauges in batches of
+    BATCH_SIZE series per request from a background thread
+    """
+
+    # api limit of time series per create_time_series request
+    BATCH_SIZE = 200
+
+    def __init__(self, project_id: str, interval: float = 60.0):
+        self.client = MetricsClient(project_id)
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _collect(self, now: float) -> List[Any]:
+        series = []
+        for family in REGISTRY.collect():
+            for sample in family.samples:
+                # buckets would multiply cardinality, sums and counts suffice
+                if sample.name.endswith("_bucket") or sample.name.endswith("_created"):
+                    continue
+                series.append(
+                    self.client.build_time_series(sample.name, dict(sample.labels), float(sample.value), now)
+                )
+        return series
+
+    def export(self):
+        series = self._collect(time.time())
+        for i in range(0, len(series), self.BATCH_SIZE):
+            self.client.create_time_series(series[i:i + self.BATCH_SIZE])
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.export()
+            except Exception as e:
+                logger.error(f"error exporting metrics: {str(e)}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
 
 class ProcessingMetrics:
-    def __init__(self, project_id: str):
-        self.metrics_client = MetricsClient(project_id)
+    def __init__(self):
         self.start_time = None
-        
+
     def start_processing(self):
         """START TIMING DOCUMENT PROCESSING"""
-        self.start_time = time.time()
-        
+        self.start_time = time.perf_counter()
+
     def end_processing(self, document_id: str, success: bool):
         """RECORD PROCESSING COMPLETION METRICS"""
         if not self.start_time:
             return
-            
-        duration = time.time() - self.start_time
+
+        duration = time.perf_counter() - self.start_time
         self._record_metrics(document_id, duration, success)
-        
+
     def _record_metrics(self, document_id: str, duration: float, success: bool):
         """RECORD PROCESSING METRICS"""
-        metrics = {
-            "processing_duration": duration,
-            "processing_success": 1 if success else 0,
-            "document_id": document_id
-        }
-        self.metrics_client.create_time_series(metrics)
\ No newline at end of file
+        # document ids would be unbounded label values, only the outcome is kept
+        STAGE_DURATION.labels("process_file", "total").observe(duration)
+        DOCUMENTS_PROCESSED.labels("completed" if success else "failed").inc()
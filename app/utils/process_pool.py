@@ -0,0 +1,187 @@
+# app/utils/process_pool.py
+
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Optional, TypeVar, Union
+
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+T = TypeVar("T")
+
+class SharedText:
+    """
+    TEXT HANDED TO OR FROM A WORKER THROUGH A SHARED MEMORY SEGMENT
+
+    only the segment name and sizes are pickled. lengths holds the
+    character length of each text when several are packed into one segment
+    """
+    __slots__ = ("name", "size", "lengths")
+
+    def __init__(self, name: str, size: int, lengths: Optional[List[int]] = None):
+        self.name = name
+        self.size = size
+        self.lengths = lengths
+
+    def __getstate__(self):
+        return (self.name, self.size, self.lengths)
+
+    def __setstate__(self, state):
+        self.name, self.size, self.lengths = state
+
+    @classmethod
+    def create(cls, text: str, lengths: Optional[List[int]] = None) -> "SharedText":
+        return cls.from_bytes(text.encode("utf-8"), lengths)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, lengths: Optional[List[int]] = None) -> "SharedText":
+        segment = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+        try:
+            segment.buf[:len(data)] = data
+        finally:
+            segment.close()
+        return cls(segment.name, len(data), lengths)
+
+    def read_bytes(self) -> bytes:
+        segment = shared_memory.SharedMemory(name=self.name)
+        try:
+            return bytes(segment.buf[:self.size])
+        finally:
+            segment.close()
+
+    def read(self) -> str:
+        return self.read_bytes().decode("utf-8")
+
+    def read_all(self) -> List[str]:
+        text = self.read()
+        texts, start = [], 0
+        for length in self.lengths or []:
+            texts.append(text[start:start + length])
+            start += length
+        return texts
+
+    def unlink(self):
+        try:
+            segment = shared_memory.SharedMemory(name=self.name)
+        except FileNotFoundError:
+            return
+        segment.close()
+        segment.unlink()
+
+TextRef = Union[str, SharedText]
+TextsRef = Union[List[str], SharedText]
+BytesRef = Union[bytes, SharedText]
+
+def resolve_text(ref: TextRef) -> str:
+    """TEXT OF A TextRef, CALLED INSIDE WORKER FUNCTIONS"""
+    return ref.read() if isinstance(ref, SharedText) else ref
+
+def resolve_texts(ref: TextsRef) -> List[str]:
+    return ref.read_all() if isinstance(ref, SharedText) else ref
+
+def resolve_bytes(ref: BytesRef) -> bytes:
+    return ref.read_bytes() if isinstance(ref, SharedText) else ref
+
+class CpuPool:
+    """
+    WORKER PROCESSES FOR CPU-BOUND WORK, AWAITABLE FROM THE EVENT LOOP
+
+    keeps extraction, splitting and tokenization of large files from holding
+    the GIL of the process serving requests. functions must be importable
+    module-level functions. texts of at least shared_memory_threshold
+    characters are passed through shared memory instead of being pickled.
+    with max_workers=0 work runs inline in the caller, e.g. in tests
+    """
+
+    def __init__(self, max_workers: int = 2, shared_memory_threshold: int = 1 << 20):
+        self.max_workers = max_workers
+        self.shared_memory_threshold = shared_memory_threshold
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.tasks = 0
+        self.failures = 0
+        self.shared_bytes = 0
+
+    @classmethod
+    def from_settings(cls, settings) -> "CpuPool":
+        return cls(
+            max_workers=settings.CPU_POOL_WORKERS,
+            shared_memory_threshold=settings.CPU_POOL_SHARED_MEMORY_THRESHOLD
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_workers > 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn, forking would copy the threads of grpc clients and
+                # the metrics exporter in an undefined state
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def share_text(self, text: str) -> TextRef:
+        """A REFERENCE TO PASS text TO A WORKER, release() IT AFTERWARDS"""
+        if not self.enabled or len(text) < self.shared_memory_threshold:
+            return text
+        ref = SharedText.create(text)
+        self.shared_bytes += ref.size
+        return ref
+
+    def share_texts(self, texts: List[str]) -> TextsRef:
+        if not self.enabled or sum(len(text) for text in texts) < self.shared_memory_threshold:
+            return texts
+        ref = SharedText.create("".join(texts), [len(text) for text in texts])
+        self.shared_bytes += ref.size
+        return ref
+
+    def share_bytes(self, data: bytes) -> BytesRef:
+        if not self.enabled or len(data) < self.shared_memory_threshold:
+            return data
+        ref = SharedText.from_bytes(data)
+        self.shared_bytes += ref.size
+        return ref
+
+    @staticmethod
+    def release(ref: Any):
+        if isinstance(ref, SharedText):
+            ref.unlink()
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        """RUN fn(*args) IN A WORKER PROCESS"""
+        self.tasks += 1
+        self.in_flight += 1
+        try:
+            if not self.enabled:
+                return fn(*args)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        except Exception:
+            self.failures += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "workers": self.max_workers,
+            "in_flight": self.in_flight,
+            "tasks": self.tasks,
+            "failures": self.failures,
+            "shared_bytes": self.shared_bytes,
+        }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
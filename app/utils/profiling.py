@@ -0,0 +1,233 @@
+# app/utils/profiling.py
+
+import random
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, ContextManager, Dict, Iterator, List, Optional, Tuple
+
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+PROFILE_HEADER = "X-Profile"
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# id of the request that asked to be profiled, seen by everything it awaits
+_requested: ContextVar[Optional[str]] = ContextVar("profile_request", default=None)
+
+_Function = Tuple[str, int, str]
+
+@contextmanager
+def profile_request(request_id: str) -> Iterator[None]:
+    """PROFILE EVERY SESSION STARTED IN THIS CONTEXT UNDER request_id"""
+    token = _requested.set(request_id)
+    try:
+        yield
+    finally:
+        _requested.reset(token)
+
+def _peak_rss() -> int:
+    # kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class _StackSampler(threading.Thread):
+    """SAMPLES THE PYTHON STACK OF ONE THREAD EVERY interval SECONDS"""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = 0
+        # highest traced memory seen at a sample, tracemalloc's own peak is
+        # shared by every session running at the time
+        self.traced_peak = 0
+        self.own: Counter = Counter()
+        self.total: Counter = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.samples += 1
+            self.traced_peak = max(self.traced_peak, tracemalloc.get_traced_memory()[0])
+            seen = set()
+            leaf = True
+            while frame is not None:
+                code = frame.f_code
+                function = (code.co_filename, code.co_firstlineno, code.co_name)
+                if leaf:
+                    self.own[function] += 1
+                    leaf = False
+                if function not in seen:
+                    seen.add(function)
+                    self.total[function] += 1
+                frame = frame.f_back
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+class Profiler:
+    """
+    OPT-IN CPU AND MEMORY PROFILES OF PIPELINE RUNS
+
+    a session is profiled when its request sent the profile header (see
+    profile_request) or, otherwise, with probability sample_rate. profiled
+    sessions sample the stack of their thread, diff tracemalloc snapshots
+    and record cpu time and peak rss; reports of the last max_reports
+    request ids are kept for the admin endpoint. unprofiled sessions cost
+    a context variable lookup. the sampled thread is the event loop, so
+    work of concurrent requests on it shows up in the profile too
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = 0.0,
+        interval: float = 0.005,
+        top: int = 25,
+        max_reports: int = 100
+    ):
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.top = top
+        self.max_reports = max_reports
+        self._reports: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # sessions tracing allocations; tracemalloc is stopped after the last
+        # if this profiler started it
+        self._tracing = 0
+        self._started_tracing = False
+
+    @classmethod
+    def from_settings(cls, settings) -> "Profiler":
+        return cls(
+            sample_rate=settings.PROFILING_SAMPLE_RATE,
+            interval=settings.PROFILING_INTERVAL,
+            top=settings.PROFILING_TOP,
+            max_reports=settings.PROFILING_MAX_REPORTS
+        )
+
+    def session(self, name: str, **labels: Any) -> ContextManager[None]:
+        """PROFILE THE BLOCK IF ITS REQUEST ASKED FOR IT OR IT IS SAMPLED"""
+        request_id = _requested.get()
+        if request_id is None:
+            if not self.sample_rate or random.random() >= self.sample_rate:
+                return nullcontext()
+            request_id = uuid.uuid4().hex
+        return self._profile(request_id, name, labels)
+
+    def _start_tracing(self):
+        with self._lock:
+            self._tracing += 1
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+
+    def _stop_tracing(self):
+        with self._lock:
+            self._tracing -= 1
+            if self._tracing == 0 and self._started_tracing:
+                tracemalloc.stop()
+                self._started_tracing = False
+
+    @contextmanager
+    def _profile(self, request_id: str, name: str, labels: Dict[str, Any]) -> Iterator[None]:
+        self._start_tracing()
+        before = tracemalloc.take_snapshot()
+        rss_before = _peak_rss()
+        sampler = _StackSampler(threading.get_ident(), self.interval)
+        started_at = datetime.now(timezone.utc).isoformat()
+        wall, cpu = time.perf_counter(), time.process_time()
+        sampler.start()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = repr(e)
+            raise
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            sampler.stop()
+            after = tracemalloc.take_snapshot()
+            traced_peak = max(sampler.traced_peak, tracemalloc.get_traced_memory()[0])
+            self._stop_tracing()
+            rss_after = _peak_rss()
+            report = {
+                "request_id": request_id,
+                "name": name,
+                "labels": labels,
+                "started_at": started_at,
+                "wall_seconds": wall,
+                "cpu_seconds": cpu,
+                "peak_rss_bytes": rss_after,
+                "peak_rss_growth_bytes": rss_after - rss_before,
+                "traced_peak_bytes": traced_peak,
+                "samples": sampler.samples,
+                "hot_functions": self._hot_functions(sampler),
+                "top_allocations": self._top_allocations(before, after),
+                "error": error,
+            }
+            self._save(report)
+            logger.info(f"profiled {name} for request {request_id}: {wall:.3f}s wall, {cpu:.3f}s cpu")
+
+    def _hot_functions(self, sampler: _StackSampler) -> List[Dict[str, Any]]:
+        hot = []
+        for function, count in sampler.total.most_common(self.top):
+            filename, line, name = function
+            hot.append({
+                "function": f"{name} ({filename}:{line})",
+                "own_samples": sampler.own[function],
+                "total_samples": count,
+            })
+        return hot
+
+    def _top_allocations(self, before: tracemalloc.Snapshot, after: tracemalloc.Snapshot) -> List[Dict[str, Any]]:
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        stats = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "lineno")
+        return [
+            {
+                "site": str(stat.traceback),
+                "size_bytes": stat.size,
+                "size_diff_bytes": stat.size_diff,
+                "count_diff": stat.count_diff,
+            }
+            for stat in stats[:self.top]
+        ]
+
+    def _save(self, report: Dict[str, Any]):
+        with self._lock:
+            reports = self._reports.pop(report["request_id"], [])
+            reports.append(report)
+            self._reports[report["request_id"]] = reports
+            while len(self._reports) > self.max_reports:
+                self._reports.popitem(last=False)
+
+    def reports(self, request_id: str) -> Optional[List[Dict[str, Any]]]:
+        """REPORTS OF A REQUEST, ONE PER PROFILED SESSION"""
+        with self._lock:
+            reports = self._reports.get(request_id)
+            return list(reports) if reports is not None else None
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """NEWEST FIRST, WITHOUT THE FUNCTION AND ALLOCATION TABLES"""
+        with self._lock:
+            return [
+                {
+                    "request_id": request_id,
+                    "sessions": [
+                        {key: report[key] for key in ("name", "labels", "started_at", "wall_seconds", "cpu_seconds", "traced_peak_bytes")}
+                        for report in reports
+                    ],
+                }
+                for request_id, reports in reversed(self._reports.items())
+            ]
@@ -0,0 +1,375 @@
+# app/utils/rate_limiter.py
+
+import asyncio
+import math
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, TypeVar
+
+from .logger import setup_logger
+from .metrics import record_queue_wait, record_tokens
+
+logger = setup_logger(__name__)
+
+T = TypeVar("T")
+
+# provider names used by the clients that go through the scheduler
+ANTHROPIC = "anthropic"
+OPENAI = "openai"
+PINECONE = "pinecone"
+
+# priority classes: single files a user is waiting for, and backfills
+INTERACTIVE = "interactive"
+BULK = "bulk"
+PRIORITY_CLASSES = (INTERACTIVE, BULK)
+
+# class of the work being run, seen by every call it makes
+_priority: ContextVar[str] = ContextVar("priority", default=INTERACTIVE)
+
+@contextmanager
+def priority_scope(priority_class: str) -> Iterator[None]:
+    """RUN THE CALLS MADE IN THIS CONTEXT UNDER priority_class"""
+    if priority_class not in PRIORITY_CLASSES:
+        raise ValueError(f"unknown priority class: {priority_class}")
+    token = _priority.set(priority_class)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def current_priority() -> str:
+    return _priority.get()
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+def estimate_tokens(text: str) -> int:
+    """ROUGH TOKEN COUNT (~4 CHARACTERS PER TOKEN) FOR BUDGETING"""
+    return max(1, len(text) // 4)
+
+def _status_code(error: Exception) -> Optional[int]:
+    """HTTP STATUS OF A PROVIDER SDK ERROR, IF ANY"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    return status
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """SECONDS TO WAIT FROM THE retry-after(-ms) RESPONSE HEADERS"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        # http-date form is not used by these providers
+        return None
+    return None
+
+def is_rate_limited(error: Exception) -> bool:
+    return _status_code(error) in (429, 529)
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    status = _status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    # sdk connection/timeout errors carry no status
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+class TokenBucket:
+    """TOKEN BUCKET REFILLED CONTINUOUSLY AT rate_per_minute"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.consumed = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """SECONDS UNTIL amount TOKENS ARE AVAILABLE"""
+        self._refill()
+        # a single request larger than the bucket still has to pass eventually
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def utilization(self) -> float:
+        """FRACTION OF THE BUCKET CURRENTLY SPENT"""
+        self._refill()
+        return round(1 - max(0.0, self.tokens) / self.capacity, 3)
+
+    def consume(self, amount: float):
+        self._refill()
+        amount = min(amount, self.capacity)
+        self.tokens -= amount
+        self.consumed += amount
+
+class ProviderLimiter:
+    """
+    REQUEST/TOKEN BUDGETS AND ADAPTIVE CONCURRENCY FOR ONE PROVIDER
+
+    concurrency follows AIMD: it grows by one slot per window of successful
+    calls and is cut multiplicatively on 429s or when latency exceeds target.
+    slots go to waiting priority classes in proportion to their weights
+    (stride scheduling), and bulk work never holds the reserved_share of
+    slots kept free for interactive calls; otherwise it may use any idle slot
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        max_concurrency: int = 8,
+        min_concurrency: int = 1,
+        latency_target: float = 30.0,
+        weights: Optional[Dict[str, float]] = None,
+        reserved_share: float = 0.25
+    ):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.latency_target = latency_target
+        self.concurrency_limit = float(max(min_concurrency, max_concurrency // 2))
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.stats = {"calls": 0, "throttled": 0, "retries": 0, "failures": 0}
+        self._latency_ewma: Optional[float] = None
+        # created lazily so it binds to the running event loop
+        self._condition: Optional[asyncio.Condition] = None
+        self.weights = weights or {INTERACTIVE: 4.0, BULK: 1.0}
+        self.reserved_share = reserved_share
+        self.waiting = {cls: 0 for cls in PRIORITY_CLASSES}
+        self.in_flight_by_class = {cls: 0 for cls in PRIORITY_CLASSES}
+        # stride scheduling: the waiting class with the lowest pass goes next
+        self._pass = {cls: 0.0 for cls in PRIORITY_CLASSES}
+        self._virtual_time = 0.0
+
+    @property
+    def condition(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def _class_limit(self, priority_class: str) -> int:
+        limit = int(self.concurrency_limit)
+        if priority_class == INTERACTIVE:
+            return limit
+        if limit <= 1 or not self.reserved_share:
+            return limit
+        # rounded up, so AIMD cutting the limit to 2 or 3 keeps a slot free
+        return limit - max(1, math.ceil(limit * self.reserved_share))
+
+    def _admissible(self, priority_class: str) -> bool:
+        if self.in_flight >= self._class_limit(priority_class):
+            return False
+        # a class that is further behind its share and could run goes first
+        return not any(
+            count and other != priority_class
+            and self._pass[other] < self._pass[priority_class]
+            and self.in_flight < self._class_limit(other)
+            for other, count in self.waiting.items()
+        )
+
+    async def acquire(self, tokens: int, priority_class: Optional[str] = None):
+        """WAIT FOR A CONCURRENCY SLOT AND BOTH BUDGETS, THEN TAKE THEM"""
+        priority_class = priority_class or current_priority()
+        queued = time.monotonic()
+        async with self.condition:
+            if not self.waiting[priority_class] and not self.in_flight_by_class[priority_class]:
+                # an idle class does not bank credit for the time it was idle
+                self._pass[priority_class] = max(self._pass[priority_class], self._virtual_time)
+            self.waiting[priority_class] += 1
+            try:
+                await self.condition.wait_for(lambda: self._admissible(priority_class))
+            finally:
+                self.waiting[priority_class] -= 1
+            self.in_flight += 1
+            self.in_flight_by_class[priority_class] += 1
+            self._virtual_time = max(self._virtual_time, self._pass[priority_class])
+            self._pass[priority_class] += 1 / self.weights[priority_class]
+            # a class that deferred to this one may fit in a remaining slot
+            self.condition.notify_all()
+        record_queue_wait(self.name, priority_class, time.monotonic() - queued)
+
+        try:
+            while True:
+                delay = max(
+                    self.paused_until - time.monotonic(),
+                    self.requests.wait_time(1),
+                    self.tokens.wait_time(tokens)
+                )
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+            self.requests.consume(1)
+            self.tokens.consume(tokens)
+        except BaseException:
+            await self._free_slot(priority_class)
+            raise
+
+    async def release(self, latency: float, throttled: bool, priority_class: Optional[str] = None):
+        """RETURN THE SLOT AND ADAPT CONCURRENCY TO THE OUTCOME"""
+        self.stats["calls"] += 1
+        self._latency_ewma = latency if self._latency_ewma is None else (
+            0.8 * self._latency_ewma + 0.2 * latency
+        )
+
+        if throttled:
+            self.stats["throttled"] += 1
+            self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit / 2)
+        elif latency > self.latency_target:
+            self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit * 0.9)
+        else:
+            self.concurrency_limit = min(
+                self.max_concurrency,
+                self.concurrency_limit + 1 / self.concurrency_limit
+            )
+        await self._free_slot(priority_class or current_priority())
+
+    async def _free_slot(self, priority_class: str):
+        async with self.condition:
+            self.in_flight -= 1
+            self.in_flight_by_class[priority_class] -= 1
+            self.condition.notify_all()
+
+    def pause(self, seconds: float):
+        """HOLD ALL NEW CALLS, E.G. UNTIL A PROVIDER'S retry-after ELAPSES"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def utilization(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "concurrency_limit": round(self.concurrency_limit, 2),
+            "concurrency_utilization": round(self.in_flight / max(1, int(self.concurrency_limit)), 3),
+            "request_budget_utilization": self.requests.utilization(),
+            "token_budget_utilization": self.tokens.utilization(),
+            "latency_ewma_seconds": round(self._latency_ewma or 0.0, 3),
+            "paused_for_seconds": round(max(0.0, self.paused_until - time.monotonic()), 3),
+            "waiting": dict(self.waiting),
+            "in_flight_by_class": dict(self.in_flight_by_class),
+            **self.stats
+        }
+
+class RateLimitScheduler:
+    """
+    SHARED GATE FOR ALL LLM AND EMBEDDING CALLS
+
+    every call waits for its provider's request/token budgets and a
+    concurrency slot, and retryable failures are retried with jittered
+    exponential backoff that honors retry-after. calls are scheduled by the
+    priority class of the context they are made in (see priority_scope)
+    """
+
+    def __init__(
+        self,
+        limiters: Dict[str, ProviderLimiter],
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0
+    ):
+        self.limiters = limiters
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @classmethod
+    def from_settings(cls, settings) -> "RateLimitScheduler":
+        weights = {
+            INTERACTIVE: settings.PRIORITY_INTERACTIVE_WEIGHT,
+            BULK: settings.PRIORITY_BULK_WEIGHT,
+        }
+        reserved_share = settings.PRIORITY_INTERACTIVE_RESERVED_SHARE
+        return cls(
+            limiters={
+                ANTHROPIC: ProviderLimiter(
+                    ANTHROPIC,
+                    requests_per_minute=settings.ANTHROPIC_REQUESTS_PER_MINUTE,
+                    tokens_per_minute=settings.ANTHROPIC_TOKENS_PER_MINUTE,
+                    max_concurrency=settings.ANTHROPIC_MAX_CONCURRENCY,
+                    latency_target=settings.ANTHROPIC_LATENCY_TARGET,
+                    weights=weights,
+                    reserved_share=reserved_share
+                ),
+                OPENAI: ProviderLimiter(
+                    OPENAI,
+                    requests_per_minute=settings.OPENAI_REQUESTS_PER_MINUTE,
+                    tokens_per_minute=settings.OPENAI_TOKENS_PER_MINUTE,
+                    max_concurrency=settings.OPENAI_MAX_CONCURRENCY,
+                    latency_target=settings.OPENAI_LATENCY_TARGET,
+                    weights=weights,
+                    reserved_share=reserved_share
+                ),
+                # tokens are vectors for upserts
+                PINECONE: ProviderLimiter(
+                    PINECONE,
+                    requests_per_minute=settings.PINECONE_REQUESTS_PER_MINUTE,
+                    tokens_per_minute=settings.PINECONE_VECTORS_PER_MINUTE,
+                    max_concurrency=settings.PINECONE_MAX_CONCURRENCY,
+                    latency_target=settings.PINECONE_LATENCY_TARGET,
+                    weights=weights,
+                    reserved_share=reserved_share
+                ),
+            },
+            max_retries=settings.RATE_LIMIT_MAX_RETRIES
+        )
+
+    def _backoff(self, attempt: int) -> float:
+        """FULL-JITTER EXPONENTIAL BACKOFF"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def run(
+        self,
+        provider: str,
+        call: Callable[[], Awaitable[T]],
+        tokens: int = 1
+    ) -> T:
+        """RUN call UNDER THE PROVIDER'S LIMITS, RETRYING TRANSIENT FAILURES"""
+        limiter = self.limiters[provider]
+        priority_class = current_priority()
+        attempt = 0
+        while True:
+            await limiter.acquire(tokens, priority_class)
+            record_tokens(provider, tokens)
+            started = time.monotonic()
+            throttled = False
+            try:
+                return await call()
+            except Exception as e:
+                throttled = is_rate_limited(e)
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    limiter.stats["failures"] += 1
+                    raise
+                retry_after = _retry_after(e)
+                delay = retry_after if retry_after is not None else self._backoff(attempt)
+                if throttled:
+                    limiter.pause(delay)
+                logger.warning(
+                    f"{provider} call failed ({str(e)}), retry {attempt + 1} in {delay:.1f}s"
+                )
+            finally:
+                await limiter.release(time.monotonic() - started, throttled, priority_class)
+
+            limiter.stats["retries"] += 1
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def utilization(self) -> Dict[str, Dict[str, Any]]:
+        """PER-PROVIDER BUDGET AND CONCURRENCY UTILIZATION"""
+        return {name: limiter.utilization() for name, limiter in self.limiters.items()}
@@ -0,0 +1,12 @@
+# benchmarks/__init__.py
+
+import os
+
+# app/__init__ loads settings on import, benchmarks run without a .env
+for key in [
+    "PROJECT_ID", "GOOGLE_APPLICATION_CREDENTIALS", "GOOGLE_CLIENT_ID",
+    "GOOGLE_CLIENT_SECRET", "OAUTH_REDIRECT_URI", "OPENAI_API_KEY",
+    "ANTHROPIC_API_KEY", "PINECONE_API_KEY", "PINECONE_ENVIRONMENT",
+    "PINECONE_INDEX_NAME"
+]:
+    os.environ.setdefault(key, "benchmark")
\ No newline at end of file
@@ -0,0 +1,108 @@
+# benchmarks/bench_chunk_store.py
+"""
+MEMORY PER CHUNK OF THE HYBRID SEARCH INDEX, BEFORE AND AFTER ChunkStore
+
+    python -m benchmarks.bench_chunk_store --sizes 10000 100000 --output chunk_store.json
+
+before: a Document per chunk, BM25Processor's copy of every text and
+rank_bm25's dict of term frequencies per chunk, embeddings as lists of
+floats. after: ChunkStore, BM25Index postings and a float32 matrix.
+allocations are measured with tracemalloc while each index is built
+"""
+
+import argparse
+import gc
+import json
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+from langchain_core.documents import Document
+from rank_bm25 import BM25Okapi
+
+from .corpus import generate_chunks
+from app.database.chunk_store import ChunkStore
+from app.processor.bm25_processor import BM25Index, tokenize
+
+def _documents(size: int, seed: int) -> List[Document]:
+    texts = generate_chunks(size, seed=seed)
+    return [
+        Document(
+            id=f"file-{i // 20}#{i % 20}",
+            page_content=text,
+            metadata={
+                "document_id": f"doc-{i // 20}",
+                "drive_id": f"file-{i // 20}",
+                "chunk_index": i % 20,
+                "total_chunks": 20,
+                "context_generated": i % 3 != 0,
+                "processed_at": f"2024-05-01T12:{(i // 60) % 60:02d}:{i % 60:02d}",
+            },
+        )
+        for i, text in enumerate(texts)
+    ]
+
+def _allocated(build: Callable[[], Any]) -> Dict[str, float]:
+    """BYTES STILL HELD BY WHAT build RETURNS, AND THE PEAK WHILE BUILDING"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return {"held_bytes": held, "peak_bytes": peak}
+
+def run(sizes: List[int], dimension: int, seed: int = 0) -> Dict[str, Any]:
+    results = []
+    for size in sizes:
+        documents = _documents(size, seed)
+        text_bytes = sum(len(doc.page_content.encode("utf-8")) for doc in documents)
+        rng = np.random.default_rng(seed)
+        vectors = rng.standard_normal((size, dimension), dtype=np.float32)
+
+        def before():
+            # new Document and metadata objects; their strings are shared
+            # with documents, so only "after" pays for the text itself
+            docs = [Document(id=d.id, page_content=d.page_content, metadata=dict(d.metadata)) for d in documents]
+            corpus = [d.page_content for d in docs]
+            bm25 = BM25Okapi([tokenize(text) for text in corpus])
+            return docs, corpus, bm25, vectors.tolist()
+
+        def after():
+            store = ChunkStore.from_documents(documents)
+            bm25 = BM25Index(tokenize(doc.page_content) for doc in documents)
+            return store, bm25, np.array(vectors, dtype=np.float32)
+
+        row: Dict[str, Any] = {"chunks": size, "text_bytes_per_chunk": text_bytes / size}
+        for name, build in (("before", before), ("after", after)):
+            measured = _allocated(build)
+            row[name] = {
+                "bytes_per_chunk": measured["held_bytes"] / size,
+                "peak_bytes_per_chunk": measured["peak_bytes"] / size,
+            }
+        row["reduction"] = row["before"]["bytes_per_chunk"] / row["after"]["bytes_per_chunk"]
+        results.append(row)
+    return {"benchmark": "chunk_store", "dimension": dimension, "results": results}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--dimension", type=int, default=64, help="embedding dimension")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    report = run(args.sizes, args.dimension)
+    for row in report["results"]:
+        print(
+            f"chunks={row['chunks']:<8} text={row['text_bytes_per_chunk']:.0f}B  "
+            f"before={row['before']['bytes_per_chunk']:.0f}B/chunk  "
+            f"after={row['after']['bytes_per_chunk']:.0f}B/chunk  "
+            f"reduction={row['reduction']:.2f}x"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# benchmarks/bench_chunker.py
+"""
+COMPARE TokenChunker AGAINST LANGCHAIN'S RecursiveCharacterTextSplitter
+
+    python -m benchmarks.bench_chunker --sizes-mb 1 4 16 --output chunker.json
+
+both splitters run with the same character-based settings (headings
+disabled) so their chunk boundaries can be checked for equality
+"""
+
+import argparse
+import io
+import json
+import time
+import tracemalloc
+from typing import Any, Callable, Dict
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from .corpus import generate_document
+from app.processor.token_chunker import TokenChunker
+
+def _measure(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": best, "peak_mb": peak / 2 ** 20}
+
+def run(sizes_mb, chunk_size: int, chunk_overlap: int, repeat: int) -> Dict[str, Any]:
+    results = []
+    for size_mb in sizes_mb:
+        text = generate_document(int(size_mb * 2 ** 20), seed=size_mb)
+        langchain = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True
+        )
+        chunker = TokenChunker(chunk_size, chunk_overlap, split_on_headings=False)
+
+        expected = [doc.page_content for doc in langchain.create_documents([text])]
+        actual = [chunk for _, chunk in chunker.iter_chunks(text)]
+        streamed = [chunk for _, chunk in chunker.iter_stream(io.StringIO(text))]
+
+        def consume(iterator):
+            for _ in iterator:
+                pass
+
+        baseline = _measure(lambda: langchain.create_documents([text]), repeat)
+        native = _measure(lambda: consume(chunker.iter_chunks(text)), repeat)
+        results.append({
+            "size_mb": size_mb,
+            "chunks": len(actual),
+            "equivalent_boundaries": actual == expected,
+            "stream_equivalent": streamed == actual,
+            "langchain": baseline,
+            "token_chunker": native,
+            "speedup": baseline["seconds"] / native["seconds"],
+        })
+    return {
+        "benchmark": "chunker",
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "results": results,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    report = run(args.sizes_mb, args.chunk_size, args.chunk_overlap, args.repeat)
+    for row in report["results"]:
+        print(
+            f"{row['size_mb']:>4} MB  chunks={row['chunks']:<7} "
+            f"langchain={row['langchain']['seconds']:.3f}s/{row['langchain']['peak_mb']:.0f}MB  "
+            f"token_chunker={row['token_chunker']['seconds']:.3f}s/{row['token_chunker']['peak_mb']:.0f}MB  "
+            f"speedup={row['speedup']:.2f}x  equivalent={row['equivalent_boundaries']}"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
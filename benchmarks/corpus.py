@@ -0,0 +1,162 @@
+# benchmarks/corpus.py
+
+import io
+import random
+import zipfile
+from typing import List
+
+WORDS = (
+    "the quarterly revenue report shows growth across regions while operating "
+    "costs remained stable compared to the previous fiscal year and the board "
+    "approved the new hiring plan for engineering sales support and legal teams "
+    "customers reported faster onboarding after the platform migration completed"
+).split()
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(6, 24))]
+    return " ".join(words).capitalize() + "."
+
+def _paragraph(rng: random.Random) -> str:
+    return " ".join(_sentence(rng) for _ in range(rng.randint(1, 8)))
+
+def generate_document(target_chars: int, seed: int = 0) -> str:
+    """
+    SYNTHETIC DOCUMENT OF ROUGHLY target_chars CHARACTERS
+
+    markdown-like structure: headings, paragraphs, bullet lists and the odd
+    run of blank lines, deterministic for a given seed
+    """
+    rng = random.Random(seed)
+    parts: List[str] = []
+    size = 0
+    section = 0
+    while size < target_chars:
+        roll = rng.random()
+        if roll < 0.08:
+            section += 1
+            part = f"{'#' * rng.randint(1, 3)} Section {section}"
+        elif roll < 0.2:
+            part = "\n".join(f"- {_sentence(rng)}" for _ in range(rng.randint(2, 6)))
+        else:
+            part = _paragraph(rng)
+        parts.append(part)
+        parts.append(rng.choice(["\n\n", "\n\n", "\n\n", "\n\n\n", "\n"]))
+        size += len(part) + 2
+    return "".join(parts)
+
+def generate_corpus(num_documents: int, mean_chars: int = 20000, seed: int = 0) -> List[str]:
+    """DETERMINISTIC CORPUS OF DOCUMENTS WITH VARYING LENGTH"""
+    rng = random.Random(seed)
+    return [
+        generate_document(max(200, int(rng.expovariate(1 / mean_chars))), seed=seed + i)
+        for i in range(num_documents)
+    ]
+
+def generate_chunks(num_chunks: int, mean_chars: int = 800, seed: int = 0) -> List[str]:
+    """DETERMINISTIC CHUNK-SIZED TEXTS FOR SEARCH INDEXES, FAST AT MILLIONS OF CHUNKS"""
+    rng = random.Random(seed)
+    chunks = []
+    for _ in range(num_chunks):
+        words = rng.choices(WORDS, k=max(8, int(rng.gauss(mean_chars, mean_chars / 4)) // 7))
+        chunks.append(" ".join(words))
+    return chunks
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def make_pdf(pages: List[str], line_chars: int = 90) -> bytes:
+    """
+    MINIMAL PDF WITH ONE PAGE PER TEXT
+
+    helvetica text wrapped at line_chars, enough for PyPDF2 to extract the
+    words back; written by hand so fixtures need no pdf library
+    """
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for text in pages:
+        words, lines, line = text.split(), [], ""
+        for word in words:
+            if line and len(line) + len(word) + 1 > line_chars:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        if line:
+            lines.append(line)
+        stream = "BT /F1 10 Tf 12 TL 40 800 Td " + " ".join(f"({_pdf_escape(l)}) '" for l in lines) + " ET"
+        data = stream.encode("latin-1", errors="replace")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(data), data))
+        content = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids), len(kids)
+    )
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+_DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+_DOCX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+
+def make_docx(text: str) -> bytes:
+    """
+    MINIMAL DOCX OF A generate_document TEXT
+
+    one paragraph per block, markdown headings become Heading styles
+    """
+    from xml.sax.saxutils import escape
+
+    paragraphs = []
+    for block in text.split("\n\n"):
+        block = block.strip()
+        if not block:
+            continue
+        style = ""
+        if block.startswith("#"):
+            level = len(block) - len(block.lstrip("#"))
+            block = block.lstrip("#").strip()
+            style = f'<w:pPr><w:pStyle w:val="Heading{level}"/></w:pPr>'
+        runs = "<w:br/>".join(f'<w:t xml:space="preserve">{escape(line)}</w:t>' for line in block.split("\n"))
+        paragraphs.append(f"<w:p>{style}<w:r>{runs}</w:r></w:p>")
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f'<w:body>{"".join(paragraphs)}</w:body></w:document>'
+    )
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", _DOCX_CONTENT_TYPES)
+        archive.writestr("_rels/.rels", _DOCX_RELS)
+        archive.writestr("word/document.xml", document)
+    return buffer.getvalue()
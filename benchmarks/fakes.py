@@ -0,0 +1,432 @@
+# benchmarks/fakes.py
+"""
+DETERMINISTIC LOCAL STAND-INS FOR THE EXTERNAL SERVICES
+
+each fake implements the subset of the client API this service uses and
+sleeps for a configurable latency per call, so the pipeline can be
+measured offline with realistic waits. synchronous clients (pinecone,
+firestore) block like the real ones do
+"""
+
+import asyncio
+import hashlib
+import math
+import time
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from google.api_core.exceptions import AlreadyExists, NotFound
+from google.cloud import firestore
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+@dataclass
+class Latency:
+    """PER-CALL LATENCY IN SECONDS FOR EACH FAKE SERVICE"""
+    llm: float = 0.0
+    # added per 1k prompt characters, long documents make slower calls
+    llm_per_1k_chars: float = 0.0
+    embedding: float = 0.0
+    pinecone: float = 0.0
+    firestore: float = 0.0
+    drive: float = 0.0
+
+    @classmethod
+    def realistic(cls) -> "Latency":
+        return cls(llm=0.8, llm_per_1k_chars=0.002, embedding=0.15, pinecone=0.03, firestore=0.01, drive=0.3)
+
+class FakeChatModel:
+    """ANTHROPIC STAND-IN: RETURNS A SHORT CONTEXT DERIVED FROM THE PROMPT"""
+
+    def __init__(self, latency: Optional[Latency] = None):
+        self.latency = latency or Latency()
+        self.calls = 0
+
+    async def ainvoke(self, prompt: str) -> SimpleNamespace:
+        self.calls += 1
+        delay = self.latency.llm + self.latency.llm_per_1k_chars * len(prompt) / 1000
+        if delay:
+            await asyncio.sleep(delay)
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:12]
+        return SimpleNamespace(content=f"This chunk is part of document section {digest}.")
+
+class FakeEmbeddings(Embeddings):
+    """
+    OPENAI EMBEDDINGS STAND-IN
+
+    hashed bag-of-words vectors: deterministic, cheap, and texts sharing
+    words score higher, so similarity search results are meaningful
+    """
+
+    def __init__(self, dimension: int = 256, latency: Optional[Latency] = None):
+        self.dimension = dimension
+        self.latency = latency or Latency()
+        self.calls = 0
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimension
+        for word in text.lower().split():
+            vector[zlib.crc32(word.encode("utf-8")) % self.dimension] += 1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        if self.latency.embedding:
+            await asyncio.sleep(self.latency.embedding)
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        self.calls += 1
+        if self.latency.embedding:
+            await asyncio.sleep(self.latency.embedding)
+        return self.embed_query(text)
+
+def _matches_filter(metadata: Dict[str, Any], filter: Optional[Dict[str, Any]]) -> bool:
+    """SUBSET OF THE PINECONE METADATA FILTER LANGUAGE"""
+    if not filter:
+        return True
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(_matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(_matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        value = metadata.get(key)
+        if isinstance(condition, dict):
+            for op, operand in condition.items():
+                if op == "$eq" and value != operand:
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+                if op == "$in" and value not in operand:
+                    return False
+                if op == "$nin" and value in operand:
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+class FakePineconeIndex:
+    """IN-MEMORY PINECONE INDEX WITH BRUTE-FORCE COSINE QUERIES"""
+
+    def __init__(self, name: str, dimension: int, latency: Optional[Latency] = None):
+        self.name = name
+        self.dimension = dimension
+        self.latency = latency or Latency()
+        self.config = SimpleNamespace(host=f"{name}.local", api_key="fake")
+        self.namespaces: Dict[str, Dict[str, Any]] = {}
+        self.calls = 0
+
+    def _wait(self):
+        self.calls += 1
+        if self.latency.pinecone:
+            time.sleep(self.latency.pinecone)
+
+    def upsert(self, vectors, namespace: str = "", **kwargs):
+        self._wait()
+        store = self.namespaces.setdefault(namespace, {})
+        for vector in vectors:
+            if isinstance(vector, dict):
+                vector_id, values, metadata = vector["id"], vector["values"], vector.get("metadata", {})
+            else:
+                vector_id, values, metadata = vector
+            store[vector_id] = (np.asarray(values, dtype=np.float32), dict(metadata or {}))
+        return {"upserted_count": len(vectors)}
+
+    def delete(self, ids=None, delete_all=None, namespace: str = "", filter=None, **kwargs):
+        self._wait()
+        if delete_all:
+            self.namespaces.pop(namespace, None)
+            return {}
+        store = self.namespaces.get(namespace, {})
+        if filter:
+            ids = [i for i, (_, metadata) in store.items() if _matches_filter(metadata, filter)]
+        for vector_id in ids or []:
+            store.pop(vector_id, None)
+        return {}
+
+    def list(self, prefix: str = "", namespace: str = "", limit: int = 100, **kwargs) -> Iterator[List[str]]:
+        ids = sorted(i for i in self.namespaces.get(namespace, {}) if i.startswith(prefix))
+        for i in range(0, len(ids), limit):
+            self._wait()
+            yield ids[i:i + limit]
+
+    def fetch(self, ids: List[str], namespace: str = "", **kwargs):
+        self._wait()
+        store = self.namespaces.get(namespace, {})
+        return SimpleNamespace(vectors={
+            i: SimpleNamespace(id=i, values=store[i][0].tolist(), metadata=dict(store[i][1]))
+            for i in ids if i in store
+        })
+
+    def query(self, vector, top_k: int = 10, namespace: str = "", filter=None,
+              include_metadata: bool = False, include_values: bool = False, **kwargs):
+        self._wait()
+        store = self.namespaces.get(namespace, {})
+        items = [(i, v, m) for i, (v, m) in store.items() if _matches_filter(m, filter)]
+        if not items:
+            return {"matches": []}
+        matrix = np.stack([v for _, v, _ in items])
+        query = np.asarray(vector, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+        scores = matrix @ query / np.where(norms == 0, 1.0, norms)
+        top = np.argsort(-scores)[:top_k]
+        return {"matches": [
+            {
+                "id": items[i][0],
+                "score": float(scores[i]),
+                "metadata": dict(items[i][2]) if include_metadata else None,
+                "values": items[i][1].tolist() if include_values else None,
+            }
+            for i in top
+        ]}
+
+    def describe_index_stats(self, **kwargs):
+        return {
+            "dimension": self.dimension,
+            "namespaces": {ns: {"vector_count": len(v)} for ns, v in self.namespaces.items()},
+            "total_vector_count": sum(len(v) for v in self.namespaces.values()),
+        }
+
+class FakePineconeClient:
+    """PINECONE CLIENT STAND-IN HOLDING FAKE INDEXES BY NAME"""
+
+    def __init__(self, dimension: int = 256, latency: Optional[Latency] = None):
+        self.dimension = dimension
+        self.latency = latency or Latency()
+        self.indexes: Dict[str, FakePineconeIndex] = {}
+
+    def list_indexes(self):
+        return [SimpleNamespace(name=name) for name in self.indexes]
+
+    def create_index(self, name: str, dimension: int = None, **kwargs):
+        # the fake embeddings decide the dimension, not the caller
+        self.indexes[name] = FakePineconeIndex(name, self.dimension, self.latency)
+
+    def delete_index(self, name: str, **kwargs):
+        self.indexes.pop(name, None)
+
+    def Index(self, name: str, **kwargs) -> FakePineconeIndex:
+        if name not in self.indexes:
+            raise NotFound(f"index {name} not found")
+        return self.indexes[name]
+
+def _set_path(data: Dict[str, Any], path: str, value: Any):
+    keys = path.split(".")
+    for key in keys[:-1]:
+        data = data.setdefault(key, {})
+    data[keys[-1]] = value
+
+def _get_path(data: Dict[str, Any], path: str) -> Any:
+    for key in path.split("."):
+        if not isinstance(data, dict) or key not in data:
+            return None
+        data = data[key]
+    return data
+
+def _resolve(value: Any) -> Any:
+    if value is firestore.SERVER_TIMESTAMP:
+        return datetime.now(timezone.utc)
+    if isinstance(value, dict):
+        return {k: _resolve(v) for k, v in value.items()}
+    return value
+
+class FakeSnapshot:
+    def __init__(self, reference: "FakeDocumentReference", data: Optional[Dict[str, Any]]):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return _resolve_copy(self._data)
+
+    def get(self, path: str) -> Any:
+        return _get_path(self._data or {}, path)
+
+def _resolve_copy(data):
+    if data is None:
+        return None
+    return {k: _resolve_copy(v) if isinstance(v, dict) else v for k, v in data.items()}
+
+class FakeDocumentReference:
+    def __init__(self, collection: "FakeCollection", doc_id: str):
+        self.collection_ref = collection
+        self.id = doc_id
+
+    @property
+    def _store(self) -> Dict[str, Dict[str, Any]]:
+        return self.collection_ref.documents
+
+    def _wait(self):
+        self.collection_ref.client._wait()
+
+    def set(self, data: Dict[str, Any], merge: bool = False):
+        self._wait()
+        data = _resolve(data)
+        if merge and self.id in self._store:
+            self._store[self.id].update(data)
+        else:
+            self._store[self.id] = data
+
+    def create(self, data: Dict[str, Any]):
+        if self.id in self._store:
+            raise AlreadyExists(f"document {self.id} already exists")
+        self.set(data)
+
+    def update(self, data: Dict[str, Any]):
+        self._wait()
+        if self.id not in self._store:
+            raise NotFound(f"document {self.id} not found")
+        for path, value in data.items():
+            _set_path(self._store[self.id], path, _resolve(value))
+
+    def get(self) -> FakeSnapshot:
+        self._wait()
+        return FakeSnapshot(self, self._store.get(self.id))
+
+    def delete(self):
+        self._wait()
+        self._store.pop(self.id, None)
+
+    def collection(self, name: str) -> "FakeCollection":
+        key = f"{self.collection_ref.path}/{self.id}/{name}"
+        return self.collection_ref.client.collection(key)
+
+    def collections(self) -> List["FakeCollection"]:
+        prefix = f"{self.collection_ref.path}/{self.id}/"
+        return [
+            self.collection_ref.client.collection(path)
+            for path in list(self.collection_ref.client.collections_by_path)
+            if path.startswith(prefix) and "/" not in path[len(prefix):]
+        ]
+
+class FakeQuery:
+    def __init__(self, collection: "FakeCollection", filters=None, order=None, limit=None):
+        self.collection_ref = collection
+        self.filters = filters or []
+        self.order = order
+        self.limit_count = limit
+
+    def where(self, field_path: str, op: str, value: Any) -> "FakeQuery":
+        return FakeQuery(self.collection_ref, self.filters + [(field_path, op, value)], self.order, self.limit_count)
+
+    def order_by(self, field_path: str, **kwargs) -> "FakeQuery":
+        return FakeQuery(self.collection_ref, self.filters, field_path, self.limit_count)
+
+    def limit(self, count: int) -> "FakeQuery":
+        return FakeQuery(self.collection_ref, self.filters, self.order, count)
+
+    def stream(self) -> Iterator[FakeSnapshot]:
+        self.collection_ref.client._wait()
+        items = list(self.collection_ref.documents.items())
+        for path, op, value in self.filters:
+            if op != "==":
+                raise NotImplementedError(f"operator {op} is not supported by the fake")
+            items = [(i, d) for i, d in items if _get_path(d, path) == value]
+        if self.order:
+            items.sort(key=lambda item: _get_path(item[1], self.order))
+        if self.limit_count is not None:
+            items = items[:self.limit_count]
+        for doc_id, data in items:
+            yield FakeSnapshot(FakeDocumentReference(self.collection_ref, doc_id), data)
+
+    def get(self) -> List[FakeSnapshot]:
+        return list(self.stream())
+
+class FakeCollection(FakeQuery):
+    def __init__(self, client: "FakeFirestore", path: str):
+        super().__init__(self)
+        self.client = client
+        self.path = path
+        self.documents: Dict[str, Dict[str, Any]] = {}
+
+    def document(self, doc_id: Optional[str] = None) -> FakeDocumentReference:
+        return FakeDocumentReference(self, doc_id or hashlib.md5(str(time.time_ns()).encode()).hexdigest())
+
+class FakeWriteBatch:
+    """WRITES APPLIED TOGETHER ON COMMIT, ONE ROUND TRIP"""
+
+    def __init__(self, client: "FakeFirestore"):
+        self.client = client
+        self.writes: List[Tuple[FakeDocumentReference, Optional[Dict[str, Any]]]] = []
+
+    def set(self, reference: FakeDocumentReference, data: Dict[str, Any]):
+        self.writes.append((reference, _resolve(data)))
+
+    def delete(self, reference: FakeDocumentReference):
+        self.writes.append((reference, None))
+
+    def commit(self):
+        self.client._wait()
+        for reference, data in self.writes:
+            if data is None:
+                reference._store.pop(reference.id, None)
+            else:
+                reference._store[reference.id] = data
+        self.writes = []
+
+class FakeFirestore:
+    """IN-MEMORY FIRESTORE CLIENT (DOCUMENTS, SUBCOLLECTIONS, == QUERIES, WRITE BATCHES)"""
+
+    def __init__(self, latency: Optional[Latency] = None):
+        self.latency = latency or Latency()
+        self.collections_by_path: Dict[str, FakeCollection] = {}
+        self.calls = 0
+
+    def _wait(self):
+        self.calls += 1
+        if self.latency.firestore:
+            time.sleep(self.latency.firestore)
+
+    def batch(self) -> FakeWriteBatch:
+        return FakeWriteBatch(self)
+
+    def collection(self, path: str) -> FakeCollection:
+        if path not in self.collections_by_path:
+            self.collections_by_path[path] = FakeCollection(self, path)
+        return self.collections_by_path[path]
+
+class FakeDrive:
+    """DRIVE STAND-IN SERVING TEXT FILES FROM MEMORY"""
+
+    def __init__(self, files: Optional[Dict[str, str]] = None, latency: Optional[Latency] = None):
+        self.files: Dict[str, str] = dict(files or {})
+        self.latency = latency or Latency()
+
+    def add_file(self, file_id: str, text: str):
+        self.files[file_id] = text
+
+    def loader(self, credentials: Dict, file_id: str) -> "FakeDriveLoader":
+        """LOADER FACTORY WITH THE DocumentProcessor loader_factory SIGNATURE"""
+        return FakeDriveLoader(self, file_id)
+
+class FakeDriveLoader:
+    def __init__(self, drive: FakeDrive, file_id: str):
+        self.drive = drive
+        self.file_id = file_id
+
+    def load(self) -> List[Document]:
+        if self.drive.latency.drive:
+            time.sleep(self.drive.latency.drive)
+        text = self.drive.files.get(self.file_id)
+        if text is None:
+            return []
+        return [Document(
+            page_content=text,
+            metadata={"source": f"https://docs.google.com/document/d/{self.file_id}", "title": self.file_id}
+        )]
@@ -0,0 +1,283 @@
+# benchmarks/run_benchmarks.py
+"""
+END-TO-END BENCHMARKS AGAINST LOCAL SERVICE STAND-INS
+
+    python -m benchmarks.run_benchmarks --output results.json
+    python -m benchmarks.run_benchmarks --suite search --search-sizes 10000 100000
+
+ingest: documents per minute through DocumentProcessor.process_file with
+the real chunker, context generator, vector store and metadata store on
+top of the fakes in benchmarks.fakes, plus the per-stage time taken from
+the pipeline spans. search: index build time and p50/p99 query latency of
+HybridSearch.search at each index size. no network access or credentials
+are needed; --latency realistic injects typical provider latencies
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from .corpus import WORDS, generate_chunks, generate_corpus
+from .fakes import FakeChatModel, FakeDrive, FakeEmbeddings, FakeFirestore, FakePineconeClient, Latency
+from app.config.settings import get_settings
+from app.database.hybrid_search import HybridSearch
+from app.database.metadata_store import MetadataStore
+from app.database.vector_store import VectorStore
+from app.processor.bm25_processor import BM25Processor
+from app.processor.chunk_processor import ChunkProcessor
+from app.processor.context_generator import ContextGenerator
+from app.processor.document_processor import DocumentProcessor
+from app.processor.embedding_generator import EmbeddingGenerator
+from app.utils.metrics import REGISTRY
+from app.utils.rate_limiter import RateLimitScheduler
+
+LATENCY_PROFILES = {
+    "none": Latency,
+    "realistic": Latency.realistic,
+}
+
+def _percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+def _peak_rss_mb() -> float:
+    # kilobytes on linux, bytes on macos
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (2 ** 20 if sys.platform == "darwin" else 2 ** 10)
+
+def _stage_totals(pipeline: str) -> Dict[str, Dict[str, float]]:
+    """CUMULATIVE SECONDS AND COUNT PER STAGE FROM THE STAGE HISTOGRAM"""
+    totals: Dict[str, Dict[str, float]] = {}
+    for family in REGISTRY.collect():
+        if family.name != "indexer_stage_duration_seconds":
+            continue
+        for sample in family.samples:
+            if sample.labels.get("pipeline") != pipeline:
+                continue
+            stage = totals.setdefault(sample.labels["stage"], {"seconds": 0.0, "count": 0.0})
+            if sample.name.endswith("_sum"):
+                stage["seconds"] = sample.value
+            elif sample.name.endswith("_count"):
+                stage["count"] = sample.value
+    return totals
+
+def _context_decisions() -> Dict[str, float]:
+    return {
+        decision: REGISTRY.get_sample_value("indexer_context_decisions_total", {"decision": decision}) or 0.0
+        for decision in ("full", "small", "skip")
+    }
+
+def _stage_delta(before: Dict[str, Dict[str, float]], after: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+    delta = {}
+    for stage, totals in after.items():
+        previous = before.get(stage, {"seconds": 0.0, "count": 0.0})
+        count = totals["count"] - previous["count"]
+        if count:
+            seconds = totals["seconds"] - previous["seconds"]
+            delta[stage] = {"seconds": seconds, "count": count, "mean_seconds": seconds / count}
+    return delta
+
+async def bench_ingest(
+    num_documents: int,
+    mean_chars: int,
+    concurrency: int,
+    latency: Latency,
+    dimension: int,
+    rate_limited: bool
+) -> Dict[str, Any]:
+    settings = get_settings()
+    scheduler = RateLimitScheduler.from_settings(settings) if rate_limited else None
+    drive = FakeDrive(latency=latency)
+    corpus = generate_corpus(num_documents, mean_chars)
+    for i, text in enumerate(corpus):
+        drive.add_file(f"file-{i}", text)
+
+    llm = FakeChatModel(latency)
+    embeddings = FakeEmbeddings(dimension, latency)
+    processor = DocumentProcessor(
+        vector_store=VectorStore(
+            settings,
+            scheduler=scheduler,
+            client=FakePineconeClient(dimension, latency),
+            embeddings=embeddings
+        ),
+        metadata_store=MetadataStore(settings.PROJECT_ID, client=FakeFirestore(latency)),
+        context_generator=ContextGenerator(scheduler=scheduler, llm=llm),
+        chunk_processor=ChunkProcessor.from_settings(settings),
+        settings=settings,
+        loader_factory=drive.loader
+    )
+
+    semaphore = asyncio.Semaphore(concurrency)
+    durations: List[float] = []
+    failures = 0
+
+    async def process(file_id: str):
+        nonlocal failures
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await processor.process_file(file_id, credentials={})
+            except Exception:
+                failures += 1
+            durations.append(time.perf_counter() - started)
+
+    before = _stage_totals("process_file")
+    decisions_before = _context_decisions()
+    started = time.perf_counter()
+    await asyncio.gather(*(process(f"file-{i}") for i in range(num_documents)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "documents": num_documents,
+        "characters": sum(len(text) for text in corpus),
+        "concurrency": concurrency,
+        "rate_limited": rate_limited,
+        "failures": failures,
+        "seconds": elapsed,
+        "documents_per_minute": num_documents / elapsed * 60,
+        "document_seconds_p50": _percentile(durations, 50),
+        "document_seconds_p99": _percentile(durations, 99),
+        "llm_calls": llm.calls,
+        "context_decisions": {
+            decision: count - decisions_before[decision]
+            for decision, count in _context_decisions().items()
+        },
+        "embedding_calls": embeddings.calls,
+        "stages": _stage_delta(before, _stage_totals("process_file")),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+async def bench_search(
+    size: int,
+    queries: int,
+    k: int,
+    dimension: int,
+    latency: Latency,
+    seed: int = 0
+) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    texts = generate_chunks(size, seed=seed)
+    documents = [
+        Document(page_content=text, metadata={"drive_id": f"file-{i // 20}", "chunk_index": i % 20})
+        for i, text in enumerate(texts)
+    ]
+    del texts
+
+    # index build is measured without injected latency, only queries pay it
+    embeddings = FakeEmbeddings(dimension)
+    search = HybridSearch(
+        embedding_generator=EmbeddingGenerator(api_key="", embeddings=embeddings),
+        bm25_processor=BM25Processor()
+    )
+    started = time.perf_counter()
+    await search.index_documents(documents)
+    build_seconds = time.perf_counter() - started
+    embeddings.latency = latency
+
+    before = _stage_totals("hybrid_search")
+    timings: List[float] = []
+    filtered: List[float] = []
+    for i in range(queries):
+        query = " ".join(rng.choices(WORDS, k=rng.randint(2, 6)))
+        started = time.perf_counter()
+        await search.search(query, k=k)
+        timings.append(time.perf_counter() - started)
+        # every tenth query filters on a file, as per-document lookups do
+        if i % 10 == 0:
+            started = time.perf_counter()
+            await search.search(query, k=k, filter_metadata={"drive_id": f"file-{rng.randrange(max(1, size // 20))}"})
+            filtered.append(time.perf_counter() - started)
+
+    return {
+        "chunks": size,
+        "dimension": dimension,
+        "queries": queries,
+        "k": k,
+        "build_seconds": build_seconds,
+        "query_seconds_p50": _percentile(timings, 50),
+        "query_seconds_p99": _percentile(timings, 99),
+        "query_seconds_mean": float(np.mean(timings)) if timings else 0.0,
+        "filtered_query_seconds_p50": _percentile(filtered, 50),
+        "filtered_query_seconds_p99": _percentile(filtered, 99),
+        "stages": _stage_delta(before, _stage_totals("hybrid_search")),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+async def run(args) -> Dict[str, Any]:
+    latency = LATENCY_PROFILES[args.latency]()
+    report: Dict[str, Any] = {
+        "benchmark": "pipeline",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {**vars(args), "latency_seconds": vars(latency)},
+    }
+    if args.suite in ("all", "ingest"):
+        report["ingest"] = await bench_ingest(
+            args.documents, args.mean_chars, args.concurrency, latency, args.dimension, args.rate_limited
+        )
+    if args.suite in ("all", "search"):
+        report["search"] = []
+        for size in args.search_sizes:
+            report["search"].append(
+                await bench_search(size, args.queries, args.k, args.dimension, latency)
+            )
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suite", choices=["all", "ingest", "search"], default="all")
+    parser.add_argument("--latency", choices=sorted(LATENCY_PROFILES), default="none")
+    parser.add_argument("--dimension", type=int, default=64, help="fake embedding dimension")
+    parser.add_argument("--documents", type=int, default=100)
+    parser.add_argument("--mean-chars", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate-limited", action="store_true",
+                        help="route calls through the scheduler with the configured budgets")
+    parser.add_argument("--search-sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if "ingest" in report:
+        ingest = report["ingest"]
+        print(
+            f"ingest  docs={ingest['documents']} concurrency={ingest['concurrency']}  "
+            f"{ingest['documents_per_minute']:.1f} docs/min  failures={ingest['failures']}"
+        )
+        for stage, totals in sorted(ingest["stages"].items()):
+            print(f"        {stage:<16} {totals['seconds']:8.3f}s  n={int(totals['count'])}")
+    for row in report.get("search", []):
+        print(
+            f"search  chunks={row['chunks']:<8} build={row['build_seconds']:.2f}s  "
+            f"p50={row['query_seconds_p50'] * 1000:.1f}ms  p99={row['query_seconds_p99'] * 1000:.1f}ms  "
+            f"filtered p50={row['filtered_query_seconds_p50'] * 1000:.1f}ms"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -5,11 +5,23 @@
 gcloud builds submit --tag gcr.io/$PROJECT_ID/document-indexer
 
 # Deploy Cloud Run Job
+# The trigger function runs this one job per batch of files, overriding
+# FILES (drive file and user ids) and the task count per execution (see
+# app/job.py)
 gcloud run jobs create document-indexer \
     --image gcr.io/$PROJECT_ID/document-indexer \
     --region $REGION \
     --service-account $SERVICE_ACCOUNT \
+    --command python \
+    --args=-m,app.job \
     --memory 2Gi \
     --cpu 2 \
     --max-retries 3 \
-    --task-timeout 10m
\ No newline at end of file
+    --task-timeout 10m
+
+# Flush the tail of event bursts that no later event dispatches
+gcloud scheduler jobs create pubsub document-indexer-flush \
+    --location $REGION \
+    --schedule "* * * * *" \
+    --topic document-indexer-flush \
+    --message-body "flush"
\ No newline at end of file
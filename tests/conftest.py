@@ -0,0 +1,30 @@
+# tests/conftest.py
+
+import os
+import pytest
+
+# app/__init__ loads settings on import, provide placeholders for tests
+for key in [
+    "PROJECT_ID", "GOOGLE_APPLICATION_CREDENTIALS", "GOOGLE_CLIENT_ID",
+    "GOOGLE_CLIENT_SECRET", "OAUTH_REDIRECT_URI", "OPENAI_API_KEY",
+    "ANTHROPIC_API_KEY", "PINECONE_API_KEY", "PINECONE_ENVIRONMENT",
+    "PINECONE_INDEX_NAME"
+]:
+    os.environ.setdefault(key, "test")
+
+from app.config.settings import get_settings
+from app.database.metadata_store import MetadataStore
+from app.database.vector_store import VectorStore
+from benchmarks.fakes import FakeEmbeddings, FakeFirestore, FakePineconeClient
+
+@pytest.fixture
+def mock_vector_store():
+    return VectorStore(
+        get_settings(),
+        client=FakePineconeClient(dimension=64),
+        embeddings=FakeEmbeddings(dimension=64)
+    )
+
+@pytest.fixture
+def mock_metadata_store():
+    return MetadataStore("test", client=FakeFirestore())
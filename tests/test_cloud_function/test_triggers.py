@@ -0,0 +1,110 @@
+# tests/test_cloud_function/test_triggers.py
+
+import json
+from datetime import datetime, timezone
+
+import pytest
+from app.cloud_function import main
+from benchmarks.fakes import FakeFirestore
+from app.cloud_function.utils import get_drive_file, should_process_file
+
+def _event(name="docs/report.pdf", content_type="application/pdf", generation="1", drive_file_id="drive-1", user_id="alice"):
+    return {
+        "id": f"bucket/{name}/{generation}",
+        "bucket": "bucket",
+        "name": name,
+        "contentType": content_type,
+        "metadata": {"drive_file_id": drive_file_id, "user_id": user_id}
+    }
+
+def test_drive_file_comes_from_object_metadata():
+    assert get_drive_file(_event()) == {"file_id": "drive-1", "user_id": "alice"}
+    assert get_drive_file(_event(generation="2")) == get_drive_file(_event(generation="1"))
+    assert get_drive_file({"bucket": "bucket", "name": "x"}) is None
+    assert get_drive_file(_event(user_id="")) is None
+
+def test_unsupported_files_are_filtered():
+    assert should_process_file(_event(content_type="application/pdf"))
+    assert not should_process_file(_event(content_type="image/png"))
+    assert not should_process_file({"name": "x", "bucket": "bucket"})
+
+def test_trigger_skips_unsupported(monkeypatch):
+    queued = []
+    monkeypatch.setattr(main, "enqueue_event", queued.append)
+    monkeypatch.setattr(main, "flush_pending", lambda: None)
+
+    main.trigger_processing(_event(content_type="image/png"), None)
+    main.trigger_processing({**_event(), "metadata": {}}, None)
+    main.trigger_processing(_event(), None)
+
+    assert queued == [{"file_id": "drive-1", "user_id": "alice"}]
+
+def test_events_are_pending_per_user_and_file(monkeypatch):
+    db = FakeFirestore()
+    monkeypatch.setattr(main, "_db", db)
+    main.enqueue_event({"file_id": "drive-1", "user_id": "alice"})
+    main.enqueue_event({"file_id": "drive-1", "user_id": "alice"})
+    # a file shared with another user is indexed for them as well
+    main.enqueue_event({"file_id": "drive-1", "user_id": "bob"})
+
+    pending = [snapshot.to_dict() for snapshot in db.collection(main.PENDING_COLLECTION).stream()]
+    assert sorted((entry["user_id"], entry["file_id"]) for entry in pending) == [("alice", "drive-1"), ("bob", "drive-1")]
+
+def test_dispatch_batch_splits_into_tasks(monkeypatch):
+    requests = []
+
+    class FakeOperation:
+        class operation:
+            name = "operations/1"
+
+    class FakeJobsClient:
+        def run_job(self, request):
+            requests.append(request)
+            return FakeOperation()
+
+    monkeypatch.setattr(main, "_jobs_client", FakeJobsClient())
+    monkeypatch.setattr(main, "FILES_PER_TASK", 10)
+
+    result = main.dispatch_batch([{"file_id": f"f{i}", "user_id": f"u{i % 2}"} for i in range(25)])
+
+    assert result["dispatched"] == 25
+    assert result["task_count"] == 3
+    assert len(requests) == 1
+    assert requests[0].overrides.task_count == 3
+    [env] = requests[0].overrides.container_overrides[0].env
+    assert env.name == "FILES"
+    assert json.loads(env.value)[:2] == [{"file_id": "f0", "user_id": "u0"}, {"file_id": "f1", "user_id": "u1"}]
+
+def test_failed_dispatch_requeues_claimed_files(monkeypatch):
+    db = FakeFirestore()
+    # the claim below stands in for the transactional one
+    db.transaction = lambda: None
+    monkeypatch.setattr(main, "_db", db)
+    pending = db.collection(main.PENDING_COLLECTION)
+    queued_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for file_id in ("a", "b"):
+        pending.document(file_id).set({"file_id": file_id, "user_id": "alice", "queued_at": queued_at})
+
+    def claim(transaction, force):
+        snapshots = list(pending.stream())
+        for snapshot in snapshots:
+            snapshot.reference.delete()
+        return [snapshot.to_dict() for snapshot in snapshots]
+
+    def unavailable(files):
+        raise RuntimeError("RunJob quota exceeded")
+
+    monkeypatch.setattr(main, "_claim_batch", claim)
+    monkeypatch.setattr(main, "dispatch_batch", unavailable)
+    with pytest.raises(RuntimeError):
+        main.flush_pending(force=True)
+
+    requeued = {snapshot.to_dict()["file_id"]: snapshot.to_dict() for snapshot in pending.stream()}
+    assert sorted(requeued) == ["a", "b"]
+    assert requeued["a"]["queued_at"] == queued_at
+
+    dispatched = []
+    monkeypatch.setattr(main, "dispatch_batch", lambda files: dispatched.extend(f["file_id"] for f in files))
+    main.flush_pending(force=True)
+    assert sorted(dispatched) == ["a", "b"]
+    assert list(pending.stream()) == []
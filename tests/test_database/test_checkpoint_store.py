@@ -0,0 +1,64 @@
+# tests/test_database/test_checkpoint_store.py
+
+import asyncio
+
+import pytest
+from app.database.checkpoint_store import CheckpointStore, FirestoreCheckpointStore, LocalCheckpointStore
+from benchmarks.fakes import FakeFirestore, Latency
+
+def test_key_changes_with_content():
+    assert CheckpointStore.make_key("doc", "a") == CheckpointStore.make_key("doc", "a")
+    assert CheckpointStore.make_key("doc", "a") != CheckpointStore.make_key("doc", "b")
+
+@pytest.mark.asyncio
+async def test_local_store_resumes_and_clears(tmp_path):
+    store = LocalCheckpointStore(str(tmp_path))
+    key = store.make_key("doc", "content")
+
+    await store.save(key, "context", 0, "first")
+    await store.save(key, "context", 1, "second")
+    await store.save(key, "embedding", 0, [0.1, 0.2])
+
+    # a write cut short by a crash is ignored
+    with open(store._path(key, "context"), "a") as f:
+        f.write('{"i": 2, "v": "thi')
+
+    assert await store.load(key, "context") == {0: "first", 1: "second"}
+
+    await store.save(key, "context", 2, "third")
+    assert (await store.load(key, "context"))[2] == "third"
+    assert await store.load(key, "embedding") == {0: [0.1, 0.2]}
+
+    await store.clear(key)
+    assert await store.load(key, "context") == {}
+    await store.save_many(key, "upserted", {0: True, 1: True})
+    await store.save_many(key, "upserted", {})
+    assert await store.load(key, "upserted") == {0: True, 1: True}
+
+@pytest.mark.asyncio
+async def test_firestore_store_batches_writes_off_the_event_loop():
+    db = FakeFirestore(latency=Latency(firestore=0.02))
+    store = FirestoreCheckpointStore("test", client=db)
+    key = store.make_key("doc", "content")
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.001)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    await store.save_many(key, "upserted", {i: True for i in range(50)})
+    task.cancel()
+    # one commit for the batch, during which the loop kept running
+    assert db.calls == 1
+    assert ticks > 0
+
+    await store.save(key, "context", 0, "first")
+    assert await store.load(key, "upserted") == {i: True for i in range(50)}
+    assert await store.load(key, "context") == {0: "first"}
+
+    await store.clear(key)
+    assert await store.load(key, "upserted") == {}
+    assert await store.load(key, "context") == {}
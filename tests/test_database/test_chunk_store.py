@@ -0,0 +1,47 @@
+# tests/test_database/test_chunk_store.py
+
+import numpy as np
+from langchain_core.documents import Document
+from app.database.chunk_store import ChunkStore
+
+DOCUMENTS = [
+    Document(id="a#0", page_content="naïve revenue ✓", metadata={"drive_id": "a", "chunk_index": 0, "flag": True}),
+    Document(id="a#1", page_content="", metadata={"drive_id": "a", "chunk_index": 1.0, "tags": ["x", "y"]}),
+    Document(id="b#0", page_content="hiring plan", metadata={"drive_id": "b", "chunk_index": 0, "flag": None}),
+]
+
+def test_round_trips_documents():
+    store = ChunkStore.from_documents(DOCUMENTS)
+
+    assert len(store) == 3
+    for i, doc in enumerate(DOCUMENTS):
+        rebuilt = store.document(i)
+        assert rebuilt.id == doc.id
+        assert rebuilt.page_content == doc.page_content
+        assert rebuilt.metadata == doc.metadata
+    assert store[1].get("flag", "missing") == "missing"
+    assert store[0].get("flag") is True
+
+def test_mask_matches_dict_equality():
+    store = ChunkStore.from_documents(DOCUMENTS)
+
+    assert store.mask({"drive_id": "a"}).tolist() == [True, True, False]
+    # integers come back from pinecone as floats
+    assert store.mask({"chunk_index": 1}).tolist() == [False, True, False]
+    assert store.mask({"flag": True}).tolist() == [True, False, False]
+    assert store.mask({"flag": None}).tolist() == [False, True, True]
+    assert store.mask({"drive_id": "a", "tags": ["x", "y"]}).tolist() == [False, True, False]
+    assert not store.mask({"user_id": "alice"}).any()
+
+def test_extend_and_take_leave_the_source_unchanged():
+    store = ChunkStore.from_documents(DOCUMENTS)
+    added = Document(id="c#0", page_content="board minutes", metadata={"drive_id": "c", "owner": "ana"})
+
+    extended = store.extend([added])
+    taken = extended.take(np.array([True, False, True, True]))
+
+    assert [doc.id for doc in map(extended.document, range(4))] == ["a#0", "a#1", "b#0", "c#0"]
+    assert [taken.text(i) for i in range(3)] == ["naïve revenue ✓", "hiring plan", "board minutes"]
+    assert taken.document(2).metadata == added.metadata
+    assert taken.mask({"drive_id": "a"}).tolist() == [True, False, False]
+    assert len(store) == 3 and store.value(2, "owner") is None
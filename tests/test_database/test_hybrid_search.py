@@ -0,0 +1,101 @@
+# tests/test_database/test_hybrid_search.py
+
+import asyncio
+import pytest
+from langchain_core.documents import Document
+from app.database.hybrid_search import HybridSearch
+from app.processor.bm25_processor import BM25Processor
+from app.processor.embedding_generator import EmbeddingGenerator
+from benchmarks.fakes import FakeEmbeddings
+
+@pytest.mark.asyncio
+async def test_collapse_duplicates_keeps_one_hit_per_cluster():
+    footer = "This message is confidential and intended only for the recipient."
+    documents = [
+        Document(page_content=footer, metadata={"drive_id": "a", "chunk_index": 0}),
+        Document(page_content=footer, metadata={"drive_id": "b", "chunk_index": 3, "duplicate_cluster": "a#0"}),
+        Document(page_content=footer + " Thanks.", metadata={"drive_id": "c", "chunk_index": 1, "duplicate_cluster": "a#0"}),
+        Document(page_content="The recipient list for the quarterly report.", metadata={"drive_id": "d", "chunk_index": 0}),
+    ]
+    search = HybridSearch(
+        embedding_generator=EmbeddingGenerator(api_key="", embeddings=FakeEmbeddings(dimension=64)),
+        bm25_processor=BM25Processor()
+    )
+    await search.index_documents(documents)
+
+    expanded = await search.search("confidential recipient", k=3)
+    collapsed = await search.search("confidential recipient", k=3, collapse_duplicates=True)
+
+    footers = {"a", "b", "c"}
+    assert sum(r["document"].metadata["drive_id"] in footers for r in expanded) >= 2
+    assert len(collapsed) == 2
+    assert sum(r["document"].metadata["drive_id"] in footers for r in collapsed) == 1
+
+class GatedEmbeddings(FakeEmbeddings):
+    """HOLDS EMBEDDING CALLS UNTIL THE TEST OPENS THE GATE"""
+
+    def __init__(self):
+        super().__init__(dimension=64)
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def aembed_documents(self, texts):
+        await self.gate.wait()
+        return await super().aembed_documents(texts)
+
+    async def aembed_query(self, text):
+        await self.gate.wait()
+        return await super().aembed_query(text)
+
+def _chunks(drive_id: str, texts):
+    return [
+        Document(page_content=text, metadata={"drive_id": drive_id, "chunk_index": i})
+        for i, text in enumerate(texts)
+    ]
+
+OLD = _chunks("old", ["quarterly revenue grew", "hiring plan for sales", "board minutes"])
+NEW = _chunks("new", ["revenue forecast for next year", "office move schedule"])
+
+@pytest.mark.asyncio
+async def test_searches_see_one_generation_while_reindexing():
+    embeddings = GatedEmbeddings()
+    search = HybridSearch(
+        embedding_generator=EmbeddingGenerator(api_key="", embeddings=embeddings),
+        bm25_processor=BM25Processor()
+    )
+    await search.index_documents(OLD)
+
+    # a search that has started, and a reindex waiting on embeddings
+    embeddings.gate.clear()
+    in_flight = asyncio.create_task(search.search("revenue", k=3))
+    reindex = asyncio.create_task(search.index_documents(NEW))
+    await asyncio.sleep(0.01)
+    assert search.generation.version == 1
+
+    embeddings.gate.set()
+    await reindex
+    assert search.generation.version == 2
+    results = await in_flight
+    assert {r["document"].metadata["drive_id"] for r in results} == {"old"}
+    results = await search.search("revenue", k=2)
+    assert {r["document"].metadata["drive_id"] for r in results} == {"new"}
+
+@pytest.mark.asyncio
+async def test_delta_matches_a_full_rebuild():
+    def make():
+        return HybridSearch(
+            embedding_generator=EmbeddingGenerator(api_key="", embeddings=FakeEmbeddings(dimension=64)),
+            bm25_processor=BM25Processor()
+        )
+    changed = _chunks("old", ["quarterly revenue fell", "hiring freeze"])
+    incremental, rebuilt = make(), make()
+    await incremental.index_documents(OLD + NEW)
+    await incremental.apply_delta(changed, removed_drive_ids=["old"])
+    await rebuilt.index_documents(NEW + changed)
+
+    assert incremental.generation.version == 2
+    for query in ["revenue", "hiring plan", "office"]:
+        got = await incremental.search(query, k=4)
+        expected = await rebuilt.search(query, k=4)
+        assert [r["document"].page_content for r in got] == [r["document"].page_content for r in expected]
+        assert [r["score"]["combined"] for r in got] == pytest.approx([r["score"]["combined"] for r in expected])
@@ -0,0 +1,75 @@
+# tests/test_database/test_vector_store.py
+
+import asyncio
+import time
+
+import pytest
+from langchain_core.documents import Document
+from app.config.settings import get_settings
+from app.database.vector_store import VectorStore
+from benchmarks.fakes import FakeEmbeddings, FakePineconeClient, Latency
+
+def make_store(mode: str = "user", latency: Latency = None) -> VectorStore:
+    settings = get_settings().model_copy(update={"PINECONE_NAMESPACE_MODE": mode})
+    return VectorStore(settings, client=FakePineconeClient(dimension=64, latency=latency), embeddings=FakeEmbeddings(dimension=64))
+
+async def index(store: VectorStore, user_id: str, drive_id: str, texts):
+    documents = [
+        Document(page_content=text, metadata={"drive_id": drive_id, "user_id": user_id})
+        for text in texts
+    ]
+    await store.add_embeddings(
+        documents,
+        await store.embed_documents(texts),
+        ids=[store.chunk_id(drive_id, i) for i in range(len(texts))],
+        namespace=store.namespace_for(user_id)
+    )
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["user", "shared"])
+async def test_search_is_scoped_to_user(mode):
+    store = make_store(mode)
+    await index(store, "alice", "file-a", ["quarterly revenue report"] * 3)
+    await index(store, "bob", "file-b", ["quarterly revenue report"] * 3)
+
+    results = await store.similarity_search("revenue", k=10, user_id="alice")
+
+    assert len(results) == 3
+    assert {doc.metadata["user_id"] for doc in results} == {"alice"}
+
+@pytest.mark.asyncio
+async def test_filter_is_pushed_down_to_the_index():
+    store = make_store()
+    await index(store, "alice", "file-a", ["revenue growth"] * 20)
+    await index(store, "alice", "file-b", ["hiring plan"] * 2)
+
+    # post-filtering the top 2 would return nothing from file-b
+    results = await store.similarity_search("revenue growth", k=2, filter={"drive_id": "file-b"}, user_id="alice")
+
+    assert [doc.metadata["drive_id"] for doc in results] == ["file-b", "file-b"]
+
+@pytest.mark.asyncio
+async def test_delete_user_drops_namespace():
+    store = make_store()
+    await index(store, "alice", "file-a", ["revenue growth"] * 3)
+    await index(store, "bob", "file-b", ["revenue growth"] * 3)
+
+    await store.delete_user("alice")
+
+    assert await store.similarity_search("revenue", user_id="alice") == []
+    assert len(await store.similarity_search("revenue", user_id="bob")) == 3
+
+@pytest.mark.asyncio
+async def test_index_calls_do_not_block_the_event_loop():
+    store = make_store(latency=Latency(pinecone=0.1))
+    await index(store, "alice", "file-a", ["revenue growth"] * 3)
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        store.similarity_search("revenue", user_id="alice"),
+        store.fetch(["file-a#0"], namespace="alice"),
+        store.delete_chunks("file-a", 2, 3, namespace="alice"),
+    )
+
+    # the round trips overlap instead of running one after another
+    assert time.perf_counter() - started < 0.25
@@ -0,0 +1,38 @@
+# tests/test_processor/test_bm25_processor.py
+
+import numpy as np
+from rank_bm25 import BM25Okapi
+from app.processor.bm25_processor import BM25Index, BM25Processor
+from benchmarks.corpus import generate_chunks
+
+def test_scores_match_rank_bm25():
+    texts = generate_chunks(300, mean_chars=200) + ["", "Revenue revenue REVENUE"]
+    processor = BM25Processor()
+    processor.index_documents(texts)
+    reference = BM25Okapi([text.lower().split() for text in texts])
+
+    for query in ["quarterly revenue", "revenue revenue board", "legal", "unknown words"]:
+        np.testing.assert_allclose(
+            processor.get_scores(query), reference.get_scores(query.lower().split()), rtol=1e-9
+        )
+
+def test_search_returns_positions():
+    processor = BM25Processor()
+    processor.index_documents(["hiring plan", "quarterly revenue report", "board minutes"])
+    assert processor.search("revenue", k=1)[0]["index"] == 1
+
+def test_extend_and_take_match_a_rebuild():
+    texts = generate_chunks(200, mean_chars=200)
+    tokens = [text.lower().split() for text in texts]
+    index = BM25Index(tokens[:150])
+    keep = np.ones(150, dtype=bool)
+    keep[[0, 10, 11, 12, 149]] = False
+
+    updated = index.take(keep).extend(tokens[150:])
+    expected = BM25Index([t for t, kept in zip(tokens[:150], keep) if kept] + tokens[150:])
+
+    assert updated.corpus_size == expected.corpus_size
+    for query in ["quarterly revenue", "board legal hiring", tokens[10][0]]:
+        np.testing.assert_allclose(updated.get_scores(query.split()), expected.get_scores(query.split()), rtol=1e-9)
+    # the source index is unchanged
+    assert index.corpus_size == 150
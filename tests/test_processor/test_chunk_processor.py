@@ -0,0 +1,50 @@
+# tests/test_processor/test_chunk_processor.py
+
+import io
+import pytest
+from langchain.docstore.document import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.processor.chunk_processor import ChunkProcessor
+from app.processor.token_chunker import TokenChunker
+from benchmarks.corpus import generate_document
+
+TEXT = generate_document(200000, seed=7)
+
+@pytest.mark.parametrize("chunk_size,chunk_overlap", [(1000, 200), (300, 50)])
+def test_matches_recursive_character_splitter(chunk_size, chunk_overlap):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    chunker = TokenChunker(chunk_size, chunk_overlap, split_on_headings=False)
+
+    assert chunker.split_text(TEXT) == splitter.split_text(TEXT)
+
+def test_stream_matches_text():
+    chunker = TokenChunker(500, 100)
+    expected = list(chunker.iter_chunks(TEXT))
+
+    assert list(chunker.iter_stream(io.StringIO(TEXT), block_size=4096)) == expected
+
+def test_start_index_points_into_source():
+    for start, chunk in TokenChunker(400, 80).iter_chunks(TEXT):
+        assert TEXT[start:start + len(chunk)] == chunk
+
+def test_headings_start_new_chunks():
+    text = "intro paragraph\n\n# Heading\n\nbody text"
+    chunks = TokenChunker(1000, 0).split_text(text)
+
+    assert chunks == ["intro paragraph", "# Heading\n\nbody text"]
+
+def test_sizes_by_tokenizer():
+    count_words = lambda text: len(text.split())
+    chunker = TokenChunker(50, 10, tokenizer=count_words)
+
+    assert all(count_words(chunk) <= 50 for chunk in chunker.split_text(TEXT))
+
+@pytest.mark.asyncio
+async def test_split_document_keeps_metadata():
+    processor = ChunkProcessor(chunk_size=500, chunk_overlap=50)
+    chunks = await processor.split_document(Document(page_content=TEXT, metadata={"source": "doc"}))
+
+    assert len(chunks) > 1
+    assert all(chunk.metadata["source"] == "doc" for chunk in chunks)
+    assert chunks[0].metadata["start_index"] == 0
\ No newline at end of file
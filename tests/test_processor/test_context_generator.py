@@ -0,0 +1,35 @@
+# tests/test_processor/test_context_generator.py
+
+import pytest
+from app.processor.context_generator import ContextGenerator, ContextPolicy
+from benchmarks.fakes import FakeChatModel
+
+PROSE = "The board approved the new hiring plan for the engineering and sales teams. " * 6
+
+def test_policy_skips_single_chunk_documents_and_tiny_chunks():
+    policy = ContextPolicy()
+    assert policy.decide(len(PROSE), 1, PROSE) == ContextPolicy.SKIP
+    assert policy.decide(50000, 40, "Kind regards,\nJane") == ContextPolicy.SKIP
+
+def test_policy_downgrades_low_value_chunks():
+    policy = ContextPolicy(small_model_document_chars=100000)
+    table = "| 2023 | 1,204.50 | 3.2% |\n" * 20
+    assert policy.decide(50000, 40, PROSE) == ContextPolicy.FULL
+    assert policy.decide(50000, 40, table) == ContextPolicy.SMALL
+    assert policy.decide(50000, 40, PROSE[:200]) == ContextPolicy.SMALL
+    # the model tier follows the document size
+    assert policy.decide(250000, 400, PROSE) == ContextPolicy.SMALL
+
+def test_disabled_policy_always_uses_full_model():
+    policy = ContextPolicy(enabled=False)
+    assert policy.decide(len(PROSE), 1, "Hi") == ContextPolicy.FULL
+
+@pytest.mark.asyncio
+async def test_small_chunks_use_small_model():
+    llm, small_llm = FakeChatModel(), FakeChatModel()
+    generator = ContextGenerator(llm=llm, small_llm=small_llm)
+
+    await generator.generate_context(PROSE, PROSE[:100], small=True)
+    await generator.generate_context(PROSE, PROSE[:100])
+
+    assert (llm.calls, small_llm.calls) == (1, 1)
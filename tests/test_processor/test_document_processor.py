@@ -1,30 +1,221 @@
 # tests/test_processor/test_document_processor.py
 
 import pytest
+from app.config.settings import get_settings
+from app.database.checkpoint_store import LocalCheckpointStore
 from app.processor.document_processor import DocumentProcessor
 from app.processor.context_generator import ContextGenerator
 from app.processor.chunk_processor import ChunkProcessor
+from benchmarks.corpus import generate_document
+from benchmarks.fakes import FakeChatModel, FakeDrive
 
 @pytest.mark.asyncio
 async def test_process_file(mock_vector_store, mock_metadata_store):
     # setup
+    drive = FakeDrive({"test-file": generate_document(5000, seed=1)})
     processor = DocumentProcessor(
         vector_store=mock_vector_store,
         metadata_store=mock_metadata_store,
-        context_generator=ContextGenerator(),
-        chunk_processor=ChunkProcessor()
+        context_generator=ContextGenerator(llm=FakeChatModel()),
+        chunk_processor=ChunkProcessor(),
+        settings=get_settings(),
+        loader_factory=drive.loader
     )
-    
+
     # test file processing
     doc_id = await processor.process_file(
         file_id="test-file",
-        file_path="gs://test-bucket/test.pdf"
+        credentials={}
     )
-    
+
     # verify metadata was created
     metadata = await mock_metadata_store.get_document(doc_id)
-    assert metadata["status"] == "completed"
-    
+    assert metadata["processing"]["status"] == "completed"
+    assert metadata["processing"]["chunk_count"] > 1
+
     # verify chunks were stored
     chunks = await mock_vector_store.similarity_search("test query")
-    assert len(chunks) > 0
\ No newline at end of file
+    assert len(chunks) > 0
+    assert chunks[0].metadata["drive_id"] == "test-file"
+
+@pytest.mark.asyncio
+async def test_reprocess_file_reuses_document(mock_vector_store, mock_metadata_store):
+    drive = FakeDrive({"test-file": generate_document(8000, seed=2)})
+    processor = DocumentProcessor(
+        vector_store=mock_vector_store,
+        metadata_store=mock_metadata_store,
+        context_generator=ContextGenerator(llm=FakeChatModel()),
+        chunk_processor=ChunkProcessor(),
+        settings=get_settings(),
+        loader_factory=drive.loader
+    )
+    first = await processor.process_file(file_id="test-file", credentials={})
+
+    # a shorter revision drops the chunks past its end
+    drive.add_file("test-file", generate_document(2000, seed=3))
+    second = await processor.process_file(file_id="test-file", credentials={})
+
+    assert second == first
+    metadata = await mock_metadata_store.get_document(second)
+    stored = [
+        vector_id
+        for page in mock_vector_store.index.list(prefix="test-file#", namespace=mock_vector_store.namespace)
+        for vector_id in page
+    ]
+    assert len(stored) == metadata["processing"]["chunk_count"]
+
+@pytest.mark.asyncio
+async def test_users_sharing_a_file_get_their_own_records(mock_vector_store, mock_metadata_store):
+    drive = FakeDrive({"shared-file": generate_document(4000, seed=6)})
+    processor = DocumentProcessor(
+        vector_store=mock_vector_store,
+        metadata_store=mock_metadata_store,
+        context_generator=ContextGenerator(llm=FakeChatModel()),
+        chunk_processor=ChunkProcessor(),
+        settings=get_settings(),
+        loader_factory=drive.loader
+    )
+
+    alice = await processor.process_file(file_id="shared-file", credentials={}, user_id="alice")
+    bob = await processor.process_file(file_id="shared-file", credentials={}, user_id="bob")
+    # re-indexing reuses the user's own record
+    assert await processor.process_file(file_id="shared-file", credentials={}, user_id="alice") == alice
+
+    assert alice != bob
+    for user_id, doc_id in (("alice", alice), ("bob", bob)):
+        record = await mock_metadata_store.get_by_drive_id("shared-file", namespace=user_id)
+        assert record["document_id"] == doc_id
+        assert record["processing"]["user_id"] == user_id
+        assert record["processing"]["status"] == "completed"
+
+class FailingChatModel(FakeChatModel):
+    def __init__(self, fail_after: int):
+        super().__init__()
+        self.fail_after = fail_after
+
+    async def ainvoke(self, prompt):
+        if self.calls >= self.fail_after:
+            raise RuntimeError("provider unavailable")
+        return await super().ainvoke(prompt)
+
+@pytest.mark.asyncio
+async def test_failed_file_resumes_from_stored_chunks(mock_vector_store, mock_metadata_store, tmp_path):
+    drive = FakeDrive({"test-file": generate_document(60000, seed=4)})
+    settings = get_settings().model_copy(update={"PIPELINE_QUEUE_SIZE": 4, "PIPELINE_CONTEXT_WORKERS": 2})
+    checkpoint_store = LocalCheckpointStore(str(tmp_path))
+
+    def processor(llm):
+        return DocumentProcessor(
+            vector_store=mock_vector_store,
+            metadata_store=mock_metadata_store,
+            context_generator=ContextGenerator(llm=llm),
+            chunk_processor=ChunkProcessor(),
+            settings=settings,
+            checkpoint_store=checkpoint_store,
+            loader_factory=drive.loader
+        )
+
+    failing = FailingChatModel(fail_after=40)
+    with pytest.raises(Exception, match="provider unavailable"):
+        await processor(failing).process_file(file_id="test-file", credentials={})
+
+    # chunks were stored batch by batch before the failure
+    stored = [i for page in mock_vector_store.index.list(prefix="test-file#", namespace="default") for i in page]
+    assert 0 < len(stored) <= 40
+
+    llm = FakeChatModel()
+    doc_id = await processor(llm).process_file(file_id="test-file", credentials={})
+    metadata = await mock_metadata_store.get_document(doc_id)
+    total = metadata["processing"]["chunk_count"]
+    assert metadata["processing"]["status"] == "completed"
+    assert llm.calls <= total - len(stored)
+
+@pytest.mark.asyncio
+async def test_single_chunk_document_skips_context(mock_vector_store, mock_metadata_store):
+    drive = FakeDrive({"short-file": "A one paragraph memo about the quarterly revenue report. " * 5})
+    llm = FakeChatModel()
+    processor = DocumentProcessor(
+        vector_store=mock_vector_store,
+        metadata_store=mock_metadata_store,
+        context_generator=ContextGenerator(llm=llm),
+        chunk_processor=ChunkProcessor(),
+        settings=get_settings(),
+        loader_factory=drive.loader
+    )
+
+    doc_id = await processor.process_file(file_id="short-file", credentials={})
+
+    metadata = await mock_metadata_store.get_document(doc_id)
+    assert llm.calls == 0
+    assert metadata["processing"]["llm_calls_avoided"] == 1
+    chunks = await mock_vector_store.similarity_search("memo")
+    assert chunks[0].metadata["context_generated"] is False
+
+@pytest.mark.asyncio
+async def test_duplicates_reuse_stored_work(mock_vector_store, mock_metadata_store):
+    original = generate_document(20000, seed=5)
+    edited = original.replace("Section 3", "Section three", 1)
+    drive = FakeDrive({"original": original, "copy": original, "edited": edited})
+    llm = FakeChatModel()
+    processor = DocumentProcessor(
+        vector_store=mock_vector_store,
+        metadata_store=mock_metadata_store,
+        context_generator=ContextGenerator(llm=llm),
+        chunk_processor=ChunkProcessor(),
+        settings=get_settings(),
+        loader_factory=drive.loader
+    )
+    await processor.process_file(file_id="original", credentials={})
+    calls = llm.calls
+
+    # a copy of a document reuses its contexts and embeddings
+    copy_id = await processor.process_file(file_id="copy", credentials={})
+    copy = await mock_metadata_store.get_document(copy_id)
+    assert llm.calls == calls
+    assert copy["processing"]["embeddings_reused"] == copy["processing"]["chunk_count"]
+    stored = mock_vector_store.index.fetch(["original#1", "copy#1"], namespace="default").vectors
+    assert stored["copy#1"].metadata["text"] == stored["original#1"].metadata["text"]
+
+    # an edited copy only needs new work for the chunks that changed
+    edited_id = await processor.process_file(file_id="edited", credentials={})
+    edited_record = await mock_metadata_store.get_document(edited_id)
+    assert llm.calls - calls <= 2
+    assert edited_record["processing"]["embeddings_reused"] >= edited_record["processing"]["chunk_count"] - 2
+
+@pytest.mark.asyncio
+async def test_duplicates_of_deleted_chunks_get_their_own_context(mock_vector_store, mock_metadata_store):
+    original = generate_document(20000, seed=6)
+    edited = original.replace("Section 3", "Section three", 1)
+    drive = FakeDrive({"original": original, "copy": original, "edited": edited})
+    llm = FakeChatModel()
+    processor = DocumentProcessor(
+        vector_store=mock_vector_store,
+        metadata_store=mock_metadata_store,
+        context_generator=ContextGenerator(llm=llm),
+        chunk_processor=ChunkProcessor(),
+        settings=get_settings(),
+        loader_factory=drive.loader
+    )
+    await processor.process_file(file_id="original", credentials={})
+    contexts = {
+        vector_id.split("#")[1]: vector.metadata["context_generated"]
+        for page in mock_vector_store.index.list(prefix="original#", namespace="default")
+        for vector_id, vector in mock_vector_store.index.fetch(page, namespace="default").vectors.items()
+    }
+    # the duplicate index and the metadata record still point at these
+    await mock_vector_store.delete_file("original", namespace="default")
+
+    for file_id in ("edited", "copy"):
+        calls = llm.calls
+        doc_id = await processor.process_file(file_id=file_id, credentials={})
+        record = await mock_metadata_store.get_document(doc_id)
+        stored = {
+            vector_id.split("#")[1]: vector.metadata
+            for page in mock_vector_store.index.list(prefix=f"{file_id}#", namespace="default")
+            for vector_id, vector in mock_vector_store.index.fetch(page, namespace="default").vectors.items()
+        }
+        assert record["processing"]["embeddings_reused"] == 0
+        assert llm.calls - calls == sum(contexts.values())
+        assert {i: metadata["context_generated"] for i, metadata in stored.items()} == contexts
+        assert all(metadata["text"].startswith("This chunk is part") for i, metadata in stored.items() if contexts[i])
+        assert not any("duplicate_of" in metadata for metadata in stored.values())
@@ -0,0 +1,338 @@
+# tests/test_processor/test_drive_sync.py
+
+from typing import Dict, List
+
+import pytest
+from app.config.settings import get_settings
+from app.processor.chunk_processor import ChunkProcessor
+from app.processor.context_generator import ContextGenerator
+from app.processor.document_processor import DocumentProcessor
+from app.processor.drive_sync import MAX_CHANGE_ATTEMPTS, DriveSync
+from benchmarks.corpus import generate_document
+from benchmarks.fakes import FakeChatModel, FakeDrive
+
+PDF = "application/pdf"
+
+class _Request:
+    def __init__(self, response: Dict):
+        self.response = response
+
+    def execute(self) -> Dict:
+        return self.response
+
+class FakeChangesService:
+    """DRIVE V3 CHANGES AND FILES API OVER AN IN-MEMORY CHANGE LOG, TOKENS ARE LOG OFFSETS"""
+
+    def __init__(self):
+        self.log: List[Dict] = []
+        self.files_by_id: Dict[str, Dict] = {}
+        self.fail_at_token = None
+
+    def add(self, file_id: str, removed: bool = False, **file):
+        change = {"fileId": file_id, "removed": removed}
+        if removed:
+            self.files_by_id.pop(file_id, None)
+        else:
+            change["file"] = self.files_by_id[file_id] = {"id": file_id, "mimeType": PDF, **file}
+        self.log.append(change)
+
+    def changes(self):
+        return self
+
+    def files(self):
+        return self
+
+    def get(self, fileId: str, **kwargs):
+        return _Request(self.files_by_id[fileId])
+
+    def getStartPageToken(self):
+        return _Request({"startPageToken": str(len(self.log))})
+
+    def list(self, pageToken: str, pageSize: int, **kwargs):
+        start = int(pageToken)
+        if start == self.fail_at_token:
+            raise ConnectionError("drive unavailable")
+        page = self.log[start:start + pageSize]
+        end = start + len(page)
+        response = {"changes": page}
+        if end < len(self.log):
+            response["nextPageToken"] = str(end)
+        else:
+            response["newStartPageToken"] = str(len(self.log))
+        return _Request(response)
+
+class Crash(BaseException):
+    """THE INSTANCE GOING AWAY MID-PASS, NOT A PER-FILE ERROR"""
+
+@pytest.fixture
+def drive():
+    return FakeDrive({
+        file_id: generate_document(3000, seed=seed)
+        for seed, file_id in enumerate(("a", "b", "c"))
+    })
+
+@pytest.fixture
+def service():
+    return FakeChangesService()
+
+@pytest.fixture
+def drive_sync(mock_vector_store, mock_metadata_store, drive, service):
+    processor = DocumentProcessor(
+        vector_store=mock_vector_store,
+        metadata_store=mock_metadata_store,
+        context_generator=ContextGenerator(llm=FakeChatModel()),
+        chunk_processor=ChunkProcessor(),
+        settings=get_settings(),
+        loader_factory=drive.loader
+    )
+    sync = DriveSync(processor, mock_metadata_store, mock_vector_store, page_size=2)
+    sync._build_service = lambda credentials: service
+    sync.processed = []
+    process_file = processor.process_file
+
+    async def counted(file_id, **kwargs):
+        sync.processed.append(file_id)
+        return await process_file(file_id=file_id, **kwargs)
+
+    processor.process_file = counted
+    return sync
+
+def stored_ids(vector_store, file_id: str, namespace: str = "alice") -> List[str]:
+    return [i for page in vector_store.index.list(prefix=f"{file_id}#", namespace=namespace) for i in page]
+
+async def start(drive_sync, service) -> str:
+    # the first pass only records the head of the change log
+    stats = await drive_sync.sync("alice", {})
+    assert stats["changes"] == 0
+    return await drive_sync.metadata_store.get_sync_token("alice")
+
+@pytest.mark.asyncio
+async def test_first_sync_only_records_the_start_token(drive_sync, service):
+    service.add("a", md5Checksum="1")
+    assert await start(drive_sync, service) == "1"
+    assert drive_sync.processed == []
+
+@pytest.mark.asyncio
+async def test_repeated_changes_to_a_file_are_collapsed(drive_sync, service):
+    await start(drive_sync, service)
+    for revision in ("1", "2", "3"):
+        service.add("a", md5Checksum=revision, headRevisionId=revision)
+    service.add("b", md5Checksum="1", headRevisionId="1")
+
+    stats = await drive_sync.sync("alice", {})
+
+    assert stats["changes"] == 2 and stats["processed"] == 2
+    assert sorted(drive_sync.processed) == ["a", "b"]
+    record = await drive_sync.metadata_store.get_by_drive_id("a")
+    # the latest revision of the file is the one recorded
+    assert record["original_file"]["md5_checksum"] == "3"
+    assert await drive_sync.metadata_store.get_sync_token("alice") == "4"
+
+def test_is_unchanged_compares_the_indexed_revision():
+    record = {
+        "processing": {"status": "completed"},
+        "original_file": {"md5_checksum": "m1", "modified_time": "t1", "head_revision_id": "r1"},
+    }
+    file = {"md5Checksum": "m1", "modifiedTime": "t1", "headRevisionId": "r1"}
+    assert DriveSync.is_unchanged(record, file)
+    assert not DriveSync.is_unchanged(record, {**file, "md5Checksum": "m2"})
+    assert not DriveSync.is_unchanged(record, {**file, "headRevisionId": "r2"})
+    assert not DriveSync.is_unchanged({**record, "processing": {"status": "failed"}}, file)
+    assert not DriveSync.is_unchanged(None, file)
+
+@pytest.mark.asyncio
+async def test_unchanged_revisions_are_skipped(drive_sync, service):
+    await start(drive_sync, service)
+    service.add("a", md5Checksum="1", headRevisionId="1")
+    await drive_sync.sync("alice", {})
+
+    # e.g. a metadata-only change
+    service.add("a", md5Checksum="1", headRevisionId="1")
+    service.add("b", md5Checksum="1", headRevisionId="1")
+    stats = await drive_sync.sync("alice", {})
+
+    assert stats["skipped"] == 1 and stats["processed"] == 1
+    assert drive_sync.processed == ["a", "b"]
+
+@pytest.mark.asyncio
+async def test_removed_and_trashed_files_are_purged(drive_sync, service, mock_vector_store):
+    await start(drive_sync, service)
+    service.add("a", md5Checksum="1")
+    service.add("b", md5Checksum="1")
+    await drive_sync.sync("alice", {})
+    assert stored_ids(mock_vector_store, "a") and stored_ids(mock_vector_store, "b")
+
+    service.add("a", removed=True)
+    service.add("b", md5Checksum="1", trashed=True)
+    # never indexed, nothing to purge
+    service.add("c", removed=True)
+    stats = await drive_sync.sync("alice", {})
+
+    assert stats["deleted"] == 2 and stats["skipped"] == 1
+    for file_id in ("a", "b"):
+        assert stored_ids(mock_vector_store, file_id) == []
+        record = await drive_sync.metadata_store.get_by_drive_id(file_id)
+        assert record["processing"]["status"] == "deleted"
+
+@pytest.mark.asyncio
+async def test_token_is_saved_only_after_the_changes_are_handled(drive_sync, service):
+    token = await start(drive_sync, service)
+    for file_id in ("a", "b", "c"):
+        service.add(file_id, md5Checksum="1", headRevisionId="1")
+
+    # listing fails on the second page: nothing was processed
+    service.fail_at_token = 2
+    with pytest.raises(ConnectionError):
+        await drive_sync.sync("alice", {})
+    assert drive_sync.processed == []
+    assert await drive_sync.metadata_store.get_sync_token("alice") == token
+    service.fail_at_token = None
+
+    # the instance dies after the first file was indexed
+    process_file = drive_sync.document_processor.process_file
+
+    async def crash_on_b(file_id, **kwargs):
+        if file_id == "b":
+            raise Crash()
+        return await process_file(file_id=file_id, **kwargs)
+
+    drive_sync.document_processor.process_file = crash_on_b
+    with pytest.raises(Crash):
+        await drive_sync.sync("alice", {})
+    assert await drive_sync.metadata_store.get_sync_token("alice") == token
+
+    # the replay misses nothing and does not index "a" a second time
+    drive_sync.document_processor.process_file = process_file
+    stats = await drive_sync.sync("alice", {})
+    assert stats == {"changes": 3, "processed": 2, "skipped": 1, "deleted": 0, "failed": 0}
+    assert drive_sync.processed == ["a", "b", "c"]
+    assert await drive_sync.metadata_store.get_sync_token("alice") == "3"
+
+@pytest.mark.asyncio
+async def test_failed_changes_are_retried_on_the_next_pass(drive_sync, service):
+    await start(drive_sync, service)
+    for file_id in ("a", "b"):
+        service.add(file_id, md5Checksum="1", headRevisionId="1")
+    process_file = drive_sync.document_processor.process_file
+
+    async def fail_on_b(file_id, **kwargs):
+        if file_id == "b":
+            raise RuntimeError("extraction failed")
+        return await process_file(file_id=file_id, **kwargs)
+
+    drive_sync.document_processor.process_file = fail_on_b
+    stats = await drive_sync.sync("alice", {})
+    assert stats["processed"] == 1 and stats["failed"] == 1
+    # the token moves past the delta, the failed change is kept with it
+    assert await drive_sync.metadata_store.get_sync_token("alice") == "2"
+    [failed] = await drive_sync.metadata_store.get_failed_changes("alice")
+    assert failed["fileId"] == "b" and failed["attempts"] == 1
+
+    drive_sync.document_processor.process_file = process_file
+    stats = await drive_sync.sync("alice", {})
+    assert stats == {"changes": 1, "processed": 1, "skipped": 0, "deleted": 0, "failed": 0}
+    assert drive_sync.processed == ["a", "b"]
+    assert await drive_sync.metadata_store.get_failed_changes("alice") == []
+
+@pytest.mark.asyncio
+async def test_a_failed_change_is_dropped_after_max_attempts(drive_sync, service):
+    await start(drive_sync, service)
+    service.add("a", md5Checksum="1", headRevisionId="1")
+
+    async def always_fail(file_id, **kwargs):
+        raise RuntimeError("extraction failed")
+
+    drive_sync.document_processor.process_file = always_fail
+    for attempt in range(1, MAX_CHANGE_ATTEMPTS + 1):
+        stats = await drive_sync.sync("alice", {})
+        assert stats["failed"] == 1
+        failed = await drive_sync.metadata_store.get_failed_changes("alice")
+        assert [change["attempts"] for change in failed] == ([attempt] if attempt < MAX_CHANGE_ATTEMPTS else [])
+
+@pytest.mark.asyncio
+async def test_purge_deletes_from_the_namespace_the_file_was_indexed_in(drive_sync, service, mock_vector_store):
+    await start(drive_sync, service)
+    service.add("a", md5Checksum="1", headRevisionId="1")
+    await drive_sync.sync("alice", {})
+    assert stored_ids(mock_vector_store, "a")
+
+    # e.g. the namespace mode was switched to shared after "a" was indexed
+    mock_vector_store.per_user_namespaces = False
+    service.add("a", removed=True)
+    stats = await drive_sync.sync("alice", {})
+
+    assert stats["deleted"] == 1
+    assert stored_ids(mock_vector_store, "a") == []
+
+@pytest.mark.asyncio
+async def test_index_file_skips_a_revision_already_indexed(drive_sync, service):
+    service.add("a", md5Checksum="1", headRevisionId="1")
+    service.add("b", md5Checksum="1", headRevisionId="1")
+    assert await drive_sync.index_file("alice", "a", {})
+
+    # a retried job batch only processes what did not complete
+    assert not await drive_sync.index_file("alice", "a", {})
+    assert await drive_sync.index_file("alice", "b", {})
+    assert drive_sync.processed == ["a", "b"]
+
+    service.add("a", md5Checksum="2", headRevisionId="2")
+    assert await drive_sync.index_file("alice", "a", {})
+    record = await drive_sync.metadata_store.get_by_drive_id("a")
+    assert record["original_file"]["head_revision_id"] == "2"
+
+@pytest.mark.asyncio
+async def test_offboarded_files_are_indexed_again(drive_sync, service, mock_vector_store, mock_metadata_store):
+    await start(drive_sync, service)
+    service.add("a", md5Checksum="1", headRevisionId="1")
+    await drive_sync.sync("alice", {})
+    record = await mock_metadata_store.get_by_drive_id("a")
+    content_hash = record["original_file"]["content_hash"]
+
+    assert await drive_sync.delete_user("alice") == 1
+
+    assert stored_ids(mock_vector_store, "a") == []
+    record = await mock_metadata_store.get_by_drive_id("a")
+    assert record["processing"]["status"] == "deleted"
+    assert await mock_metadata_store.get_by_content_hash(content_hash, "alice") is None
+
+    # the same revision shows up again, e.g. after the user is re-onboarded
+    service.add("a", md5Checksum="1", headRevisionId="1")
+    stats = await drive_sync.sync("alice", {})
+    assert stats["processed"] == 1
+    assert stored_ids(mock_vector_store, "a")
+    record = await mock_metadata_store.get_by_drive_id("a")
+    assert record["processing"]["status"] == "completed"
+    assert record["processing"]["user_id"] == "alice"
+
+@pytest.mark.asyncio
+async def test_offboarding_from_the_shared_namespace_deletes_by_file(drive_sync, service, mock_vector_store):
+    mock_vector_store.per_user_namespaces = False
+    namespace = mock_vector_store.namespace
+    await start(drive_sync, service)
+    await drive_sync.sync("bob", {})
+    for file_id in ("a", "b"):
+        service.add(file_id, md5Checksum="1", headRevisionId="1")
+    await drive_sync.sync("alice", {})
+    service.add("c", md5Checksum="1", headRevisionId="1")
+    await drive_sync.sync("bob", {})
+
+    # serverless indexes reject deletes by metadata filter
+    delete = mock_vector_store.index.delete
+
+    def serverless_delete(**kwargs):
+        if "filter" in kwargs:
+            raise ValueError("delete by metadata filter is not supported")
+        return delete(**kwargs)
+
+    mock_vector_store.index.delete = serverless_delete
+    assert await drive_sync.delete_user("alice") == 2
+
+    assert stored_ids(mock_vector_store, "a", namespace) == []
+    assert stored_ids(mock_vector_store, "b", namespace) == []
+    assert stored_ids(mock_vector_store, "c", namespace)
+
+@pytest.mark.asyncio
+async def test_shared_namespace_delete_needs_the_users_files(mock_vector_store):
+    mock_vector_store.per_user_namespaces = False
+    with pytest.raises(ValueError):
+        await mock_vector_store.delete_user("alice")
@@ -0,0 +1,117 @@
+# tests/test_processor/test_embedding_migration.py
+
+import random
+from typing import List
+
+import pytest
+from langchain_core.documents import Document
+from app.database.checkpoint_store import LocalCheckpointStore
+from app.processor.embedding_migration import EmbeddingMigration
+from benchmarks.fakes import FakeEmbeddings
+
+WORDS = "revenue growth churn pricing roadmap hiring budget forecast launch security audit latency".split()
+
+class RandomEmbeddings(FakeEmbeddings):
+    """VECTORS UNRELATED TO THE TEXT, SO NEIGHBOURS DO NOT SURVIVE"""
+
+    def _embed(self, text: str) -> List[float]:
+        return [random.random() for _ in range(self.dimension)]
+
+class FailingEmbeddings(FakeEmbeddings):
+    def __init__(self, dimension: int, fail_on_call: int):
+        super().__init__(dimension)
+        self.fail_on_call = fail_on_call
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.calls + 1 == self.fail_on_call:
+            raise RuntimeError("embedding provider unavailable")
+        return await super().aembed_documents(texts)
+
+async def index(store, drive_id: str, count: int, user_id: str = "alice", revision: int = 0):
+    rng = random.Random(f"{drive_id}@{revision}")
+    texts = [" ".join(rng.choices(WORDS, k=6)) for _ in range(count)]
+    documents = [
+        Document(page_content=text, metadata={"drive_id": drive_id, "user_id": user_id, "processed_at": f"2024-01-0{revision + 1}T00:00:00"})
+        for text in texts
+    ]
+    await store.add_embeddings(
+        documents,
+        await store.embed_documents(texts),
+        ids=[store.chunk_id(drive_id, i) for i in range(count)],
+        namespace=store.namespace_for(user_id)
+    )
+
+def stored(binding, namespace: str):
+    return {
+        vector_id: metadata
+        for vector_id, (_, metadata) in binding.index.namespaces.get(namespace, {}).items()
+    }
+
+def migration(store, metadata_store, embeddings, **kwargs) -> EmbeddingMigration:
+    target = store.bind("test-small", "text-embedding-3-small", 32, embeddings)
+    return EmbeddingMigration(store, metadata_store, target, batch_size=4, vectors_per_minute=1e9, seed=0, **kwargs)
+
+@pytest.mark.asyncio
+async def test_copies_stored_texts_and_switches_reads(mock_vector_store, mock_metadata_store):
+    await index(mock_vector_store, "file-a", 10, user_id="alice")
+    await index(mock_vector_store, "file-b", 5, user_id="bob")
+    source = mock_vector_store.binding
+    job = migration(mock_vector_store, mock_metadata_store, FakeEmbeddings(dimension=32))
+
+    stats = await job.run()
+
+    assert stats["switched"] and stats["copied"] == 15 and stats["recall"] >= 0.9
+    for namespace in ("alice", "bob"):
+        assert stored(job.target, namespace) == stored(source, namespace)
+    assert mock_vector_store.binding is job.target
+    assert (await mock_metadata_store.get_active_index())["index_name"] == "test-small"
+    [result] = await mock_vector_store.similarity_search(stored(source, "bob")["file-b#0"]["text"], k=1, user_id="bob")
+    assert result.id == "file-b#0"
+
+@pytest.mark.asyncio
+async def test_low_recall_keeps_reads_on_source(mock_vector_store, mock_metadata_store):
+    await index(mock_vector_store, "file-a", 30)
+    source = mock_vector_store.binding
+    job = migration(mock_vector_store, mock_metadata_store, RandomEmbeddings(dimension=32))
+
+    stats = await job.run()
+
+    assert stats["copied"] == 30
+    assert stats["recall"] < 0.9 and not stats["switched"]
+    assert mock_vector_store.binding is source
+    assert await mock_metadata_store.get_active_index() is None
+
+@pytest.mark.asyncio
+async def test_resumes_after_last_checkpointed_page(mock_vector_store, mock_metadata_store, tmp_path):
+    await index(mock_vector_store, "file-a", 12)
+    checkpoints = LocalCheckpointStore(str(tmp_path))
+    failing = FailingEmbeddings(dimension=32, fail_on_call=3)
+    with pytest.raises(RuntimeError):
+        await migration(mock_vector_store, mock_metadata_store, failing, checkpoint_store=checkpoints).run()
+
+    embeddings = FakeEmbeddings(dimension=32)
+    stats = await migration(mock_vector_store, mock_metadata_store, embeddings, checkpoint_store=checkpoints).run()
+
+    # two pages of four were copied before the failure
+    assert stats["copied"] == 4 and stats["caught_up"] == 0 and stats["switched"]
+    assert len(stored(mock_vector_store.binding, "alice")) == 12
+    assert await checkpoints.load("embedding_migration_test-small", "copy_alice") == {}
+
+@pytest.mark.asyncio
+async def test_catch_up_applies_writes_made_after_the_copy(mock_vector_store, mock_metadata_store, tmp_path):
+    await index(mock_vector_store, "file-a", 6)
+    await index(mock_vector_store, "file-b", 6)
+    checkpoints = LocalCheckpointStore(str(tmp_path))
+    # copied, but held back by the recall check
+    await migration(mock_vector_store, mock_metadata_store, FakeEmbeddings(dimension=32), checkpoint_store=checkpoints, min_recall=2.0).run()
+
+    await mock_vector_store.delete_file("file-a", namespace="alice")
+    await index(mock_vector_store, "file-b", 6, revision=1)
+    await index(mock_vector_store, "file-c", 3)
+    source = mock_vector_store.binding
+    job = migration(mock_vector_store, mock_metadata_store, FakeEmbeddings(dimension=32), checkpoint_store=checkpoints)
+    stats = await job.run()
+
+    # file-c sorts after the checkpoint, the changed file-b is caught up
+    assert stats["copied"] == 3 and stats["caught_up"] == 6 and stats["deleted"] == 6 and stats["switched"]
+    assert stored(job.target, "alice") == stored(source, "alice")
@@ -0,0 +1,52 @@
+# tests/test_processor/test_extractors.py
+
+import pytest
+from app.cloud_function.utils import is_supported_file_type
+from app.processor.extractors import (
+    DOCX, GOOGLE_DOC, PDF, PLAIN_TEXT, SUPPORTED_MIME_TYPES, FileExtractor, extract_docx
+)
+from app.utils.process_pool import CpuPool
+from benchmarks.corpus import make_docx, make_pdf
+
+def test_dispatch_covers_supported_types():
+    extractor = FileExtractor()
+    assert all(is_supported_file_type(mime_type) for mime_type in SUPPORTED_MIME_TYPES)
+    assert all(extractor.supports(mime_type) for mime_type in SUPPORTED_MIME_TYPES)
+    assert not extractor.supports("image/png")
+
+def test_docx_paragraphs_and_headings():
+    text = extract_docx(make_docx("# Revenue\n\nQuarterly revenue grew.\n\nHiring & legal\nplans."))
+    assert text == "# Revenue\n\nQuarterly revenue grew.\n\nHiring & legal\nplans."
+
+@pytest.mark.asyncio
+async def test_plain_text_and_google_doc_export():
+    extractor = FileExtractor()
+    assert await extractor.extract(PLAIN_TEXT, "naïve".encode("utf-8")) == "naïve"
+    # docs export as utf-8 with a byte order mark
+    assert await extractor.extract(GOOGLE_DOC, "\ufeffTitle".encode("utf-8")) == "Title"
+    with pytest.raises(ValueError):
+        await extractor.extract("image/png", b"")
+
+@pytest.mark.asyncio
+async def test_pdf_pages_extracted_in_parallel_keep_order():
+    pages = [f"page {i} revenue report" for i in range(7)]
+    data = make_pdf(pages)
+    pool = CpuPool(max_workers=2, shared_memory_threshold=100)
+    try:
+        pooled = await FileExtractor(pool, pdf_pages_per_task=2).extract(PDF, data)
+    finally:
+        pool.shutdown()
+
+    assert pooled == await FileExtractor().extract(PDF, data)
+    assert pooled.split("\n\n") == pages
+    # page count, then four ranges of at most two pages
+    assert pool.stats()["tasks"] == 5
+
+@pytest.mark.asyncio
+async def test_docx_in_worker():
+    pool = CpuPool(max_workers=1, shared_memory_threshold=100)
+    try:
+        text = await FileExtractor(pool).extract(DOCX, make_docx("First paragraph.\n\nSecond paragraph."))
+    finally:
+        pool.shutdown()
+    assert text == "First paragraph.\n\nSecond paragraph."
@@ -0,0 +1,77 @@
+# tests/test_processor/test_near_duplicates.py
+
+import tracemalloc
+
+from app.processor.near_duplicates import NearDuplicateIndex
+
+FOOTER = (
+    "This email and any attachments are confidential and intended solely for the "
+    "addressee. If you have received it in error please notify the sender and delete it. "
+    "Any views expressed are those of the author and not necessarily of the company."
+)
+
+def test_finds_exact_and_near_duplicates():
+    index = NearDuplicateIndex(threshold=0.8)
+    index.add("tenant", "a#0", index.signature(FOOTER))
+
+    exact = index.find("tenant", index.signature(FOOTER.upper().replace(" ", "  ")))
+    near = index.find("tenant", index.signature(FOOTER + " Thank you."))
+
+    assert exact.vector_id == "a#0" and exact.similarity == 1.0
+    assert near.vector_id == "a#0" and 0.8 <= near.similarity < 1.0
+    assert index.find("tenant", index.signature("Quarterly revenue grew in every region.")) is None
+    # namespaces never share work
+    assert index.find("other", index.signature(FOOTER)) is None
+
+def test_duplicates_join_the_first_chunk_cluster():
+    index = NearDuplicateIndex()
+    signature = index.signature(FOOTER)
+    index.add("tenant", "a#0", signature)
+    match = index.find("tenant", signature)
+    index.add("tenant", "b#4", signature, cluster=match.cluster)
+
+    index.remove("tenant", "a#0")
+
+    match = index.find("tenant", signature)
+    assert (match.vector_id, match.cluster) == ("b#4", "a#0")
+
+def test_evicts_oldest_entries():
+    index = NearDuplicateIndex(max_entries=2)
+    for i, text in enumerate(["first chunk of text here", "second chunk of text here", "third chunk of text here"]):
+        index.add("tenant", f"a#{i}", index.signature(text))
+
+    assert len(index) == 2
+    assert index.find("tenant", index.signature("first chunk of text here")) is None
+
+def test_freed_slots_keep_shared_buckets_consistent():
+    index = NearDuplicateIndex(max_entries=3)
+    signature = index.signature(FOOTER)
+    # three chunks share every band
+    for i in range(3):
+        index.add("tenant", f"a#{i}", signature)
+    index.remove("tenant", "a#0")
+    assert index.find("tenant", signature).vector_id in ("a#1", "a#2")
+
+    # re-adding a chunk moves it to a new slot, evicting the oldest
+    index.add("tenant", "a#1", signature)
+    index.add("tenant", "b#0", index.signature("unrelated text about revenue growth"))
+    assert len(index) == 3
+    assert index.find("tenant", signature).vector_id in ("a#1", "a#2")
+
+    for vector_id in ("a#1", "a#2"):
+        index.remove("tenant", vector_id)
+    assert index.find("tenant", signature) is None
+    index.remove("tenant", "b#0")
+    assert len(index) == 0 and not any(index._buckets) and not index._exact
+
+def test_entries_stay_small():
+    index = NearDuplicateIndex()
+    signatures = [index.signature(f"chunk {i} " + " ".join(f"w{i * 7 + j}" for j in range(60))) for i in range(2000)]
+    tracemalloc.start()
+    try:
+        for i, signature in enumerate(signatures):
+            index.add(f"user{i % 10}", f"file{i // 40:06d}#{i % 40}", signature)
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert size / len(signatures) < 3000
@@ -0,0 +1,83 @@
+# tests/test_utils/test_http.py
+
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from app.processor.context_generator import ContextGenerator, PooledChatAnthropic
+from app.utils.http import Httplib2Adapter, HttpTransport
+from app.utils.metrics import REGISTRY
+
+class _Handler(BaseHTTPRequestHandler):
+    # keep-alive connections
+    protocol_version = "HTTP/1.1"
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.active += 1
+            cls.peak = max(cls.peak, cls.active)
+        time.sleep(0.05 if self.path == "/slow" else 0)
+        with cls.lock:
+            cls.active -= 1
+        body = b"ok"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    _Handler.peak = 0
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+def _count(name: str) -> float:
+    return REGISTRY.get_sample_value(name, {"host": "127.0.0.1"}) or 0.0
+
+def test_requests_reuse_keep_alive_connection(server):
+    transport = HttpTransport(http2=False)
+    requests, connections = _count("indexer_http_requests_total"), _count("indexer_http_connections_opened_total")
+    client = transport.sync_client()
+    for _ in range(3):
+        assert client.get(server).text == "ok"
+    assert transport.sync_client() is client
+    assert _count("indexer_http_requests_total") - requests == 3
+    assert _count("indexer_http_connections_opened_total") - connections == 1
+    asyncio.run(transport.aclose())
+
+@pytest.mark.asyncio
+async def test_per_host_limit(server):
+    transport = HttpTransport(http2=False, max_connections_per_host=2)
+    client = transport.async_client()
+    responses = await asyncio.gather(*(client.get(f"{server}/slow") for _ in range(6)))
+    assert [r.status_code for r in responses] == [200] * 6
+    assert _Handler.peak == 2
+    await transport.aclose()
+
+def test_httplib2_adapter(server):
+    transport = HttpTransport(http2=False)
+    response, content = Httplib2Adapter(transport.sync_client()).request(server)
+    assert response.status == 200
+    assert content == b"ok"
+    assert response["content-length"] == "2"
+
+def test_context_generator_uses_shared_clients(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+    transport = HttpTransport(http2=False)
+    generator = ContextGenerator(http_transport=transport)
+    assert isinstance(generator.llm, PooledChatAnthropic)
+    assert generator.llm._async_client._client is transport.async_client()
+    assert generator.small_llm._client._client is transport.sync_client()
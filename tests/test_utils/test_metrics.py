@@ -0,0 +1,38 @@
+# tests/test_utils/test_metrics.py
+
+from app.utils import metrics
+from app.utils.rate_limiter import ProviderLimiter, RateLimitScheduler
+
+def _sample(name, labels):
+    return metrics.REGISTRY.get_sample_value(name, labels) or 0
+
+def test_span_observes_stage_duration():
+    labels = {"pipeline": "test", "stage": "split"}
+    before = _sample("indexer_stage_duration_seconds_count", labels)
+
+    with metrics.span("test", "split"):
+        pass
+
+    assert _sample("indexer_stage_duration_seconds_count", labels) == before + 1
+
+def test_render_includes_scheduler_utilization():
+    scheduler = RateLimitScheduler({
+        "fake": ProviderLimiter("fake", requests_per_minute=60, tokens_per_minute=1000)
+    })
+    collector = metrics.SchedulerCollector(scheduler)
+    metrics.REGISTRY.register(collector)
+    try:
+        body, content_type = metrics.render_latest()
+    finally:
+        metrics.REGISTRY.unregister(collector)
+
+    assert content_type.startswith("text/plain")
+    assert b'indexer_provider_concurrency_limit{provider="fake"}' in body
+
+def test_record_cache_counts_hits_and_misses():
+    labels = {"cache": "test", "result": "hit"}
+    before = _sample("indexer_cache_requests_total", labels)
+
+    metrics.record_cache("test", hits=3, misses=1)
+
+    assert _sample("indexer_cache_requests_total", labels) == before + 3
\ No newline at end of file
@@ -0,0 +1,46 @@
+# tests/test_utils/test_process_pool.py
+
+import pytest
+from langchain_core.documents import Document
+from app.processor.bm25_processor import BM25Processor
+from app.processor.chunk_processor import ChunkProcessor
+from app.utils.process_pool import CpuPool, SharedText, resolve_text, resolve_texts
+
+TEXT = "\n\n".join(f"Paragraph {i} about quarterly revenue and hiring plans." for i in range(200))
+
+def test_shared_text_round_trip():
+    pool = CpuPool(max_workers=1, shared_memory_threshold=10)
+    ref = pool.share_text("naïve text ✓")
+    texts = pool.share_texts(["first", "", "sëcond ✓"])
+    try:
+        assert isinstance(ref, SharedText)
+        assert resolve_text(ref) == "naïve text ✓"
+        assert resolve_texts(texts) == ["first", "", "sëcond ✓"]
+    finally:
+        pool.release(ref)
+        pool.release(texts)
+    with pytest.raises(FileNotFoundError):
+        ref.read()
+
+def test_small_texts_are_passed_as_is():
+    pool = CpuPool(max_workers=1)
+    assert pool.share_text("short") == "short"
+    assert CpuPool(max_workers=0, shared_memory_threshold=1).share_text("inline") == "inline"
+
+@pytest.mark.asyncio
+async def test_split_and_tokenize_in_worker_match_inline():
+    chunker = ChunkProcessor(chunk_size=300, chunk_overlap=50)
+    document = Document(page_content=TEXT)
+    pool = CpuPool(max_workers=1, shared_memory_threshold=1000)
+    try:
+        offsets = await chunker.achunk_offsets(document, pool=pool)
+        chunks = [TEXT[start:end] for start, end in offsets]
+        bm25 = BM25Processor()
+        await bm25.aindex_documents(chunks, pool=pool)
+    finally:
+        pool.shutdown()
+
+    assert offsets == chunker.chunk_offsets(document)
+    assert pool.stats()["tasks"] == 2
+    assert pool.stats()["shared_bytes"] > 0
+    assert "Paragraph 7 " in chunks[bm25.search("paragraph 7", k=1)[0]["index"]]
@@ -0,0 +1,64 @@
+# tests/test_utils/test_profiling.py
+
+import time
+import tracemalloc
+
+from app.utils.profiling import Profiler, profile_request
+
+def _busy(seconds: float) -> list:
+    kept = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        kept.append(bytearray(1024))
+    return kept
+
+def test_unsampled_sessions_are_not_profiled():
+    profiler = Profiler(sample_rate=0.0)
+    with profiler.session("process_file", file_id="a"):
+        _busy(0.01)
+    assert profiler.summary() == []
+    assert not tracemalloc.is_tracing()
+
+def test_sampled_session_records_cpu_and_allocations():
+    profiler = Profiler(sample_rate=1.0, interval=0.001)
+    with profiler.session("process_file", file_id="a"):
+        kept = _busy(0.2)
+    [entry] = profiler.summary()
+    [report] = profiler.reports(entry["request_id"])
+    assert report["labels"] == {"file_id": "a"}
+    assert report["samples"] > 0
+    assert any(f["function"].startswith("_busy ") for f in report["hot_functions"])
+    assert report["top_allocations"][0]["size_diff_bytes"] >= len(kept) * 1024
+    assert not tracemalloc.is_tracing()
+    del kept
+
+def test_requested_profiles_are_kept_per_request_id():
+    profiler = Profiler(max_reports=2)
+    for request_id in ("r1", "r2", "r3"):
+        with profile_request(request_id):
+            with profiler.session("process_file"):
+                pass
+            with profiler.session("hybrid_search"):
+                pass
+    assert profiler.reports("r1") is None
+    assert [r["name"] for r in profiler.reports("r3")] == ["process_file", "hybrid_search"]
+    assert [entry["request_id"] for entry in profiler.summary()] == ["r3", "r2"]
+    with profiler.session("process_file"):
+        pass
+    assert len(profiler.summary()) == 2
+
+def test_overlapping_sessions_stop_tracing_after_the_last():
+    profiler = Profiler(sample_rate=1.0, interval=0.001)
+    first = profiler.session("process_file", file_id="a")
+    second = profiler.session("hybrid_search")
+    first.__enter__()
+    kept = _busy(0.05)
+    second.__enter__()
+    first.__exit__(None, None, None)
+    assert tracemalloc.is_tracing()
+    second.__exit__(None, None, None)
+    assert not tracemalloc.is_tracing()
+    first_report = next(r for e in profiler.summary() for r in profiler.reports(e["request_id"]) if r["name"] == "process_file")
+    # the second session starting does not wipe the first one's peak
+    assert first_report["traced_peak_bytes"] >= len(kept) * 1024
+    del kept
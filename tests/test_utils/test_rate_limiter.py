@@ -0,0 +1,155 @@
+# tests/test_utils/test_rate_limiter.py
+
+import asyncio
+import pytest
+from app.utils.metrics import REGISTRY
+from app.utils.rate_limiter import (
+    BULK,
+    INTERACTIVE,
+    ProviderLimiter,
+    RateLimitScheduler,
+    TokenBucket,
+    priority_scope,
+)
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+class FakeAPIError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = FakeResponse(status_code, headers)
+
+def _scheduler(**kwargs):
+    limiter = ProviderLimiter("test", requests_per_minute=6000, tokens_per_minute=600000, max_concurrency=8)
+    return RateLimitScheduler({"test": limiter}, base_delay=0.001, **kwargs), limiter
+
+def test_token_bucket_waits_when_empty():
+    bucket = TokenBucket(rate_per_minute=60)
+    bucket.consume(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0, abs=0.05)
+
+@pytest.mark.asyncio
+async def test_retries_rate_limited_calls_and_halves_concurrency():
+    scheduler, limiter = _scheduler()
+    limit_before = limiter.concurrency_limit
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise FakeAPIError(429, {"retry-after-ms": "10"})
+        return "ok"
+
+    assert await scheduler.run("test", call) == "ok"
+    assert len(attempts) == 2
+    assert limiter.stats["throttled"] == 1
+    assert limiter.concurrency_limit < limit_before
+    assert limiter.in_flight == 0
+
+@pytest.mark.asyncio
+async def test_non_retryable_errors_are_raised():
+    scheduler, limiter = _scheduler()
+
+    async def call():
+        raise FakeAPIError(400)
+
+    with pytest.raises(FakeAPIError):
+        await scheduler.run("test", call)
+    assert limiter.stats["failures"] == 1
+    assert limiter.in_flight == 0
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_retries():
+    scheduler, limiter = _scheduler(max_retries=2)
+
+    async def call():
+        raise FakeAPIError(503)
+
+    with pytest.raises(FakeAPIError):
+        await scheduler.run("test", call)
+    assert limiter.stats["retries"] == 2
+@pytest.mark.asyncio
+async def test_slots_are_shared_by_priority_weight():
+    scheduler, limiter = _scheduler()
+    limiter.concurrency_limit = 1
+    limiter.reserved_share = 0
+    admitted = []
+    blocker = asyncio.Event()
+
+    async def call(name):
+        admitted.append(name)
+        if name == "blocker":
+            await blocker.wait()
+        return name
+
+    async def submit(priority_class, name):
+        with priority_scope(priority_class):
+            return await scheduler.run("test", lambda: call(name))
+
+    first = asyncio.create_task(submit(INTERACTIVE, "blocker"))
+    await asyncio.sleep(0)
+    tasks = [asyncio.create_task(submit(BULK, "bulk")) for _ in range(10)]
+    tasks += [asyncio.create_task(submit(INTERACTIVE, "interactive")) for _ in range(10)]
+    await asyncio.sleep(0.01)
+    blocker.set()
+    await asyncio.gather(first, *tasks)
+
+    assert admitted[1:11].count("interactive") >= 7
+    assert limiter.in_flight == 0
+    assert limiter.in_flight_by_class == {INTERACTIVE: 0, BULK: 0}
+
+@pytest.mark.asyncio
+async def test_bulk_work_leaves_reserved_slots_to_interactive():
+    scheduler, limiter = _scheduler()
+    limiter.concurrency_limit = 4
+    release = asyncio.Event()
+    waits = REGISTRY.get_sample_value(
+        "indexer_scheduler_queue_wait_seconds_count", {"provider": "test", "priority": BULK}
+    ) or 0.0
+
+    async def bulk_call():
+        await release.wait()
+
+    with priority_scope(BULK):
+        bulk = [asyncio.create_task(scheduler.run("test", bulk_call)) for _ in range(6)]
+    await asyncio.sleep(0.01)
+    assert limiter.in_flight_by_class[BULK] == 3
+    assert limiter.waiting[BULK] == 3
+
+    async def interactive_call():
+        return "ok"
+
+    assert await asyncio.wait_for(scheduler.run("test", interactive_call), timeout=1) == "ok"
+    release.set()
+    await asyncio.gather(*bulk)
+    assert REGISTRY.get_sample_value(
+        "indexer_scheduler_queue_wait_seconds_count", {"provider": "test", "priority": BULK}
+    ) == waits + 6
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("limit", [2, 3])
+async def test_small_limits_still_reserve_a_slot(limit):
+    scheduler, limiter = _scheduler()
+    limiter.concurrency_limit = limit
+    release = asyncio.Event()
+
+    async def bulk_call():
+        await release.wait()
+
+    with priority_scope(BULK):
+        bulk = [asyncio.create_task(scheduler.run("test", bulk_call)) for _ in range(limit)]
+    await asyncio.sleep(0.01)
+    # bulk cannot take the last slot
+    assert limiter.in_flight_by_class[BULK] == limit - 1
+    assert limiter.waiting[BULK] == 1
+
+    async def interactive_call():
+        return "ok"
+
+    assert await asyncio.wait_for(scheduler.run("test", interactive_call), timeout=1) == "ok"
+    release.set()
+    await asyncio.gather(*bulk)